@@ -0,0 +1,256 @@
+"""
+ASGI (asyncio) 版のエントリーポイント
+
+main.py と同じ /webhook・/health・/ready・/stats・/metrics を提供する。外部 API の待ち時間に
+ワーカーを占有しないため、1 プロセスで数百件の Webhook を同時に処理できる。
+
+起動例:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+"""
+import asyncio
+import atexit
+import logging
+import math
+import time
+from typing import Optional, Tuple
+from quart import Quart, Response, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
+import config
+from config import setup_logging, validate_config
+from core.dead_letter import DeadLetterStore
+from core.dedup import build_seen_set
+from core.mapper import Mapper
+from core.metrics import OUTCOMES, REGISTRY, REQUEST_SECONDS, STAGE_SECONDS, record_ignored
+from core.pipeline import extract_comment_event, idempotency_key
+from core.spool import Spool
+from services.async_openproject import AsyncOpenProjectService
+from services.async_rocketchat import AsyncRocketChatService, build_async_instance_services
+from services.delivery import DeliveryWorkerPool, deliver_event_async
+from services.fanout import Fanout
+from services.health import HealthMonitor, build_probes
+from services.openproject import OpenProjectService
+from services.readiness import check_readiness
+from services.rocketchat import SHED_RESULTS, TIMEOUT_RESULT, RocketChatService
+from services.warmup import UserCacheWarmer
+
+# ロギング設定（最初に実行）
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def create_app() -> Quart:
+    """
+    Quart (ASGI) アプリケーションを作成する (Application Factory パターン)
+
+    Returns:
+        設定済みの Quart アプリケーション
+    """
+    app = Quart(__name__)
+    # Content-Length (チャンク転送の場合は読み込み量) が上限を超えるボディは読み込まずに 413 を返す
+    app.config['MAX_CONTENT_LENGTH'] = config.WEBHOOK_MAX_BODY_BYTES
+
+    # 依存性のインスタンス化
+    # ウォームアップと Spool 配送はスレッドで動くため同期版を使い、キャッシュ・サーキットブレーカー・
+    # レート制限は非同期版と共有する
+    mapper = Mapper()
+    sync_op_service = OpenProjectService()
+    op_service = AsyncOpenProjectService(
+        user_cache=sync_op_service.user_cache,
+        shared_cache=sync_op_service.shared_cache,
+        breaker=sync_op_service.breaker,
+        mention_cache=sync_op_service.mention_cache
+    )
+    rc_service = AsyncRocketChatService()
+    # 追加の Rocket.Chat インスタンス (projects.csv の rc_instance 列で指定する送信先)
+    instance_services = build_async_instance_services()
+    breakers = (op_service.breaker, rc_service.breaker) + tuple(
+        service.breaker for service in instance_services.values()
+    )
+
+    # 設定検証
+    is_valid, errors = validate_config()
+    if not is_valid:
+        logger.error("Configuration validation failed:")
+        for error in errors:
+            logger.error(f"  - {error}")
+        raise RuntimeError("Invalid configuration. Check environment variables and CSV files.")
+
+    # メトリクスのワーカー間集約 (METRICS_DIR 設定時のみ)
+    REGISTRY.configure(config.METRICS_DIR, config.METRICS_FLUSH_INTERVAL)
+    atexit.register(REGISTRY.stop)
+
+    # 重複配送の抑止 (OpenProject の再送を外部 API を呼ぶ前に検出する)
+    seen = build_seen_set(config.DEDUP_SHARED_PATH, config.DEDUP_TTL, config.DEDUP_MAXSIZE)
+
+    # CSV マッピングの自動再読み込み (変更検知と解析はバックグラウンドで行う)
+    mapper.start_auto_reload(config.MAPPING_RELOAD_INTERVAL)
+    atexit.register(mapper.stop_auto_reload)
+
+    # 配送に失敗した通知の保存先 (replay_dead_letters.py で再送する)
+    dead_letters = DeadLetterStore(config.DEAD_LETTER_PATH) if config.DEAD_LETTER_PATH else None
+
+    # 非同期配送モード: Spool と配送ワーカーを準備 (配送は同期版のサービスでスレッド実行)
+    spool: Optional[Spool] = None
+    if config.DELIVERY_MODE == "async":
+        spool = Spool(config.SPOOL_PATH)
+        sync_rc_service = RocketChatService(breaker=rc_service.breaker, limiter=rc_service.limiter)
+        fanout = Fanout({
+            name: RocketChatService(breaker=service.breaker, limiter=service.limiter, webhook_url=service.webhook_url)
+            for name, service in instance_services.items()
+        })
+        delivery_pool = DeliveryWorkerPool(
+            spool, mapper, sync_op_service, sync_rc_service, dead_letters=dead_letters, fanout=fanout
+        )
+        delivery_pool.start()
+        # atexit は登録の逆順に呼ばれるため、配送ワーカーの停止後に送信スレッドを止める
+        atexit.register(fanout.stop)
+        atexit.register(delivery_pool.stop)
+        app.extensions['delivery_pool'] = delivery_pool
+
+    # ユーザー名キャッシュのウォームアップ (バックグラウンドで実行し /health はブロックしない)
+    warmer: Optional[UserCacheWarmer] = None
+    if config.USER_CACHE_WARMUP:
+        warmer = UserCacheWarmer(sync_op_service)
+        warmer.start()
+        atexit.register(warmer.stop)
+
+    # 依存先の状態確認 (/ready はこの結果を返し、リクエストごとには確認しない)
+    monitor: Optional[HealthMonitor] = None
+    if config.HEALTH_CHECK_INTERVAL > 0:
+        monitor = HealthMonitor(build_probes(), spool=spool)
+        monitor.start()
+        atexit.register(monitor.stop)
+
+    @app.after_serving
+    async def close_clients() -> None:
+        await op_service.aclose()
+        await rc_service.aclose()
+        for service in instance_services.values():
+            await service.aclose()
+
+    async def release(key: Optional[str]) -> None:
+        if seen is not None and key is not None:
+            await asyncio.to_thread(seen.discard, key)
+
+    logger.info(f"ASGI application initialized successfully (delivery mode: {config.DELIVERY_MODE})")
+
+    # ルート定義
+    @app.route('/webhook', methods=['POST'])
+    async def webhook() -> Tuple[Response, int]:
+        """OpenProjectからのWebhookを受信・処理するエンドポイント"""
+        started = time.perf_counter()
+        key: Optional[str] = None
+        try:
+            # デコード結果をリクエストに保持しないよう、get_json ではなくボディから直接抽出する
+            body = await request.get_data(cache=False, as_text=False, parse_form_data=False)
+            if not body:
+                record_ignored("no json")
+                return jsonify({"status": "ignored", "reason": "no json"}), 400
+
+            # フィルタリングと必要項目の抽出
+            parse_started = time.perf_counter()
+            event, reason = extract_comment_event(body)
+            del body
+            STAGE_SECONDS.observe_since(parse_started, "parse")
+            if event is None:
+                record_ignored(reason)
+                return jsonify({"status": "ignored", "reason": reason}), 200
+
+            # 同じ activity の再送は配送済み (または配送中) として即座に応答する
+            if seen is not None:
+                key = idempotency_key(event)
+                if not await asyncio.to_thread(seen.add, key):
+                    logger.info("Duplicate webhook for WP #%s suppressed", event.wp_id)
+                    OUTCOMES.inc("duplicate")
+                    return jsonify({"status": "duplicate"}), 200
+
+            # 非同期配送モード: Spool に書き込んで即座に受理を返す
+            if spool is not None:
+                event_id = await asyncio.to_thread(spool.enqueue, event.to_dict())
+                logger.info("Queued webhook for WP #%s (spool id: %s)", event.wp_id, event_id)
+                OUTCOMES.inc("accepted")
+                return jsonify({"status": "accepted", "id": event_id}), 202
+
+            delivery = await deliver_event_async(
+                event, mapper, op_service, rc_service, dead_letters, instances=instance_services
+            )
+            success, result = delivery.success, delivery.result
+            if not success and result != TIMEOUT_RESULT:
+                # 確実に届いていない場合は登録を取り消し、OpenProject の再送を受け付ける
+                await release(key)
+
+            if result in SHED_RESULTS:
+                # Rocket.Chat の障害中・レート制限中は待たずに 503 を返し、OpenProject の再送に任せる
+                response = jsonify({"status": "unavailable", "message": result})
+                response.headers["Retry-After"] = str(max(1, math.ceil(rc_service.retry_after())))
+                return response, 503
+            # いずれかの送信先に届いた場合は配送済みとして 200 を返す
+            return jsonify(delivery.response_body()), 200 if success else 500
+
+        except RequestEntityTooLarge:
+            logger.warning("Webhook body exceeds %s bytes, rejected", config.WEBHOOK_MAX_BODY_BYTES)
+            record_ignored("too large")
+            return jsonify({"status": "error", "message": "Request body too large"}), 413
+
+        except ValueError as e:
+            # バリデーションエラー（入力データの問題）
+            logger.warning("Validation error processing webhook: %s", e)
+            OUTCOMES.inc("invalid")
+            return jsonify({"status": "error", "message": "Invalid request data"}), 400
+
+        except Exception:
+            # 予期しないエラー（内部エラー）
+            logger.exception("Unexpected error processing webhook")
+            OUTCOMES.inc("error")
+            await release(key)
+            # 内部エラー詳細を露出しない
+            return jsonify({"status": "error", "message": "Internal server error"}), 500
+
+        finally:
+            REQUEST_SECONDS.observe_since(started)
+
+    @app.route('/health', methods=['GET'])
+    async def health() -> Tuple[Response, int]:
+        """Liveness probe: プロセスが応答可能かのみ確認"""
+        return jsonify({"status": "ok"}), 200
+
+    @app.route('/stats', methods=['GET'])
+    async def stats() -> Tuple[Response, int]:
+        """運用確認用: 接続プールなどの内部統計を返す"""
+        return jsonify({
+            "rocketchat_transport": rc_service.transport.stats(),
+            "rocketchat_rate_limit": rc_service.limiter.stats(),
+            "logging": config.logging_stats(),
+            "openproject_transport": op_service.transport.stats(),
+            "user_cache": op_service.user_cache.stats(),
+            "shared_user_cache": op_service.shared_cache.stats() if op_service.shared_cache else None,
+            "dead_letters": await asyncio.to_thread(dead_letters.stats) if dead_letters else None
+        }), 200
+
+    @app.route('/metrics', methods=['GET'])
+    async def metrics() -> Response:
+        """Prometheus 形式のメトリクス (METRICS_DIR 設定時は全ワーカーの合算)"""
+        body = await asyncio.to_thread(REGISTRY.render)
+        return Response(body, mimetype="text/plain; version=0.0.4")
+
+    @app.route('/ready', methods=['GET'])
+    async def ready() -> Tuple[Response, int]:
+        """Readiness probe: アプリケーションがリクエストを受け付けられるかチェック"""
+        if monitor is not None:
+            # バックグラウンドで確認した結果を返すだけのため、イベントループ上で実行する
+            is_ready, checks = check_readiness(mapper, spool, warmer, breakers, monitor)
+        else:
+            # Spool 件数の取得は SQLite を読むためスレッドで実行する
+            is_ready, checks = await asyncio.to_thread(check_readiness, mapper, spool, warmer, breakers)
+
+        status_code = 200 if is_ready else 503
+        return jsonify({
+            "status": "ready" if is_ready else "not ready",
+            "checks": checks
+        }), status_code
+
+    return app
+
+
+# アプリケーションインスタンスの作成
+app = create_app()
@@ -0,0 +1,124 @@
+"""
+1 リクエストあたりのロギングのオーバーヘッドを計測するベンチマーク
+
+配送に成功した Webhook 1 件分のログ呼び出し (INFO レベルでは DEBUG は出力されない) と、
+下流の障害中に毎回エラーを出力する場合について、text / json の各形式で
+リクエストのスレッドが費やす時間を比較する。
+
+- legacy: 旧来の構成 (f-string の呼び出し、ハンドラがリクエストのスレッドで書式化・出力)
+- queue: %-形式の遅延書式化とキュー経由の出力 (LOG_RATE_LIMIT=0)
+- current: queue に加えて同じメッセージを間引く (既定の設定)
+
+標準エラー出力への書き込みに --stall 秒かかる場合 (コンテナのログ収集が詰まった状態) も計測する。
+
+使い方:
+    cd proxy
+    python benchmarks/bench_logging.py [--requests 2000] [--stall 0.0005]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+logger = logging.getLogger("services.rocketchat")
+
+URL = "http://openproject/api/v3/users/5"
+CHANNEL = "#dev-team"
+TEXT = "### [ログイン画面の改修] (#1234)\n🔗 [OpenProjectで表示](http://localhost:8080/projects/demo/work_packages/1234)\n\n" * 3
+
+
+def legacy_delivered() -> None:
+    logger.debug(f"Fetching user info from {URL}")
+    logger.debug(f"Cached user: {URL} -> Alice")
+    logger.debug(f"Sending to {CHANNEL}: {TEXT[:50]}...")
+    logger.info(f"Message sent successfully to {CHANNEL}")
+
+
+def current_delivered() -> None:
+    logger.debug("Fetching user info from %s", URL)
+    logger.debug("Cached user: %s -> %s", URL, "Alice")
+    logger.debug("Sending to %s: %.50s...", CHANNEL, TEXT)
+    logger.info("Message sent successfully to %s", CHANNEL)
+
+
+def legacy_outage() -> None:
+    logger.error(f"Connection error fetching user info: {URL}")
+    logger.warning(f"Rocket.Chat circuit open, not sending message to {CHANNEL}")
+
+
+def current_outage() -> None:
+    logger.error("Connection error fetching user info: %s", URL)
+    logger.warning("Rocket.Chat circuit open, not sending message to %s", CHANNEL)
+
+
+WORKLOADS: Dict[str, Dict[str, Callable[[], None]]] = {
+    "delivered": {"legacy": legacy_delivered, "queue": current_delivered, "current": current_delivered},
+    "outage": {"legacy": legacy_outage, "queue": current_outage, "current": current_outage},
+}
+
+
+class StalledStream:
+    """書き込みのたびに stall 秒待つ出力先 (標準出力の詰まりを再現する)"""
+
+    def __init__(self, stall: float) -> None:
+        self.stall = stall
+        self.lines = 0
+
+    def write(self, data: str) -> int:
+        if self.stall > 0:
+            time.sleep(self.stall)
+        self.lines += data.count("\n")
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+
+def run(log_format: str, pipeline: str, workload: Callable[[], None], requests: int, stall: float) -> List[float]:
+    """(リクエストあたりの秒数, 出力された行数, 全件を出力し終えるまでの秒数)"""
+    config.LOG_LEVEL = "INFO"
+    config.LOG_FORMAT = log_format
+    config.LOG_QUEUE_SIZE = 0 if pipeline == "legacy" else 10000
+    config.LOG_RATE_LIMIT = 100 if pipeline == "current" else 0
+
+    stream = StalledStream(stall)
+    stderr, sys.stderr = sys.stderr, stream  # type: ignore[assignment]
+    try:
+        config.setup_logging()
+        started = time.perf_counter()
+        for _ in range(requests):
+            workload()
+        elapsed = time.perf_counter() - started
+        config._stop_log_listener()
+        drained = time.perf_counter() - started
+    finally:
+        logging.getLogger().handlers.clear()
+        sys.stderr = stderr
+    return [elapsed / requests, float(stream.lines), drained]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--stall", type=float, default=0.0005, help="詰まった出力先の 1 書き込みあたりの秒数")
+    args = parser.parse_args()
+
+    print(f"  {'format':<6} {'stdout':<8} {'workload':<10} {'pipeline':<8} {'per request':>12} {'lines':>7} {'drained':>9}")
+    for log_format in ("text", "json"):
+        for stall in (0.0, args.stall):
+            for name, variants in WORKLOADS.items():
+                for pipeline, workload in variants.items():
+                    per_request, lines, drained = run(log_format, pipeline, workload, args.requests, stall)
+                    print(f"  {log_format:<6} {'stalled' if stall else 'ok':<8} {name:<10} {pipeline:<8} "
+                          f"{per_request * 1e6:9.1f} us {int(lines):7d} {drained:8.2f}s")
+        print()
+
+
+if __name__ == '__main__':
+    main()
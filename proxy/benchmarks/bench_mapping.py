@@ -0,0 +1,155 @@
+"""
+大規模な users.csv のユーザー対応表 (Mapper.get_rc_user) のベンチマーク
+
+次の 2 つの方式を 10,000 / 100,000 件 (--sizes) の users.csv で比較する。
+
+- dict: 各ワーカーの辞書に読み込む (USERS_SNAPSHOT_PATH が空の場合)
+- snapshot: コンパイル済みのファイルを mmap して引く (USERS_SNAPSHOT_PATH を設定した場合)
+
+計測する値:
+
+- 読み込み時間と、読み込みによる常駐メモリ (RSS) の増加 (snapshot はコンパイル済みのファイルを開く時間。
+  コンパイルの時間は別に表示する)
+- 1 件あたりの検索時間 (完全一致・表記ゆれの吸収・該当なし)
+- ワーカー 1 つあたりのメモリ: マスターで読み込んでから fork し (gunicorn の preload_app、gc.freeze 済み)、
+  全ユーザーを 1 回ずつ検索した後の Private (他のプロセスと共有していないページ) と PSS。
+  reload はワーカー内で読み込み直した場合 (users.csv の更新後、または preload_app が無効な場合)
+
+使い方:
+    cd proxy
+    python benchmarks/bench_mapping.py [--sizes 10000,100000] [--workers 4] [--repeat 200000]
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from core.mapper import Mapper, compile_users  # noqa: E402
+
+MODES = ("dict", "snapshot")
+
+
+def write_users(path: str, size: int) -> List[str]:
+    """size 人分の users.csv (1 割に別名あり) を書き、表示名の一覧を返す"""
+    names = [f"User{i:06d} Yamada" for i in range(size)]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('openproject_user,rocketchat_user,aliases\n')
+        for i, name in enumerate(names):
+            alias = f"山田 {i:06d}" if i % 10 == 0 else ""
+            f.write(f'{name},user{i:06d}.rc,{alias}\n')
+    return names
+
+
+def memory() -> Dict[str, int]:
+    """現在のプロセスの Rss・Pss・Private (kB)"""
+    values: Dict[str, int] = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "private": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def timeit(fn: Callable[[str], object], keys: List[str], repeat: int) -> float:
+    count = len(keys)
+    started = time.perf_counter()
+    for i in range(repeat):
+        fn(keys[i % count])
+    return (time.perf_counter() - started) / repeat
+
+
+def fork_workers(mapper: Mapper, names: List[str], workers: int, reload: bool) -> List[Dict[str, int]]:
+    """fork したワーカーで全ユーザーを検索し、各ワーカーのメモリを返す"""
+    gc.collect()
+    gc.freeze()
+    children = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            if reload:
+                mapper.load_mappings()
+            for name in names:
+                mapper.get_rc_user(name)
+            gc.collect()
+            os.write(write_fd, json.dumps(memory()).encode())
+            os._exit(0)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+    results = []
+    for pid, read_fd in children:
+        with os.fdopen(read_fd) as f:
+            results.append(json.loads(f.read()))
+        os.waitpid(pid, 0)
+    gc.unfreeze()
+    return results
+
+
+def run(size: int, mode: str, args: argparse.Namespace, tmpdir: str) -> None:
+    users_path = os.path.join(tmpdir, f'users-{size}.csv')
+    names = write_users(users_path, size)
+    snapshot_path = os.path.join(tmpdir, f'users-{size}.map') if mode == "snapshot" else ""
+    missing = os.path.join(tmpdir, 'missing.csv')
+    with patch.multiple(
+        config, USERS_CSV_PATH=users_path, USERS_SNAPSHOT_PATH=snapshot_path,
+        PROJECTS_CSV_PATH=missing, TEMPLATES_CSV_PATH=missing
+    ):
+        if snapshot_path:
+            started = time.perf_counter()
+            compile_users(users_path, snapshot_path)
+            print(f"  {size:>7} {mode:<9} compile {(time.perf_counter() - started) * 1e3:8.1f} ms "
+                  f"({os.path.getsize(snapshot_path) / 1024 / 1024:.1f} MB)")
+        gc.collect()
+        before = memory()["rss"]
+        started = time.perf_counter()
+        mapper = Mapper()
+        load_time = time.perf_counter() - started
+        loaded = memory()["rss"] - before
+
+        exact = names[::max(1, size // 1000)]
+        fuzzy = [f"  {name.upper()} " for name in exact]
+        misses = [f"Nobody {i}" for i in range(len(exact))]
+        assert mapper.get_rc_user(fuzzy[0]) == mapper.get_rc_user(exact[0]) is not None
+        timings = [timeit(mapper.get_rc_user, keys, args.repeat) * 1e6 for keys in (exact, fuzzy, misses)]
+
+        print(f"  {size:>7} {mode:<9} load {load_time * 1e3:8.1f} ms  +{loaded / 1024:6.1f} MB   "
+              + "  ".join(f"{t:5.2f} us" for t in timings))
+        for scenario, reload in (("preload", False), ("reload", True)):
+            results = fork_workers(mapper, names, args.workers, reload)
+            private = max(result["private"] for result in results) / 1024
+            pss = max(result["pss"] for result in results) / 1024
+            print(f"  {'':>7} {'':<9} {scenario:<8} private {private:6.1f} MB  pss {pss:6.1f} MB  (per worker)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="ユーザー数 (カンマ区切り)")
+    parser.add_argument("--workers", type=int, default=4, help="fork するワーカー数")
+    parser.add_argument("--repeat", type=int, default=200000, help="検索時間の計測回数")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"  {'users':>7} {'mode':<9} {'load':>27}          exact     fuzzy     miss")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in (int(value) for value in args.sizes.split(",")):
+            for mode in MODES:
+                run(size, mode, args, tmpdir)
+
+
+if __name__ == '__main__':
+    main()
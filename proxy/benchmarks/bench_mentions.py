@@ -0,0 +1,150 @@
+"""
+メンション変換 (core.text_processor.convert_mentions) のマイクロベンチマーク
+
+現実的なコメントと、敵対的な入力 (100 KB 超、数千件のメンション、閉じられていないタグ)
+について入力長を倍々にして処理時間を計測し、最悪ケースでも線形時間に収まっているかを
+確認する。旧実装 (正規表現 + re.sub) との比較も表示する。
+
+使い方:
+    cd proxy
+    python benchmarks/bench_mentions.py [--repeat 5] [--max-growth 2.5] [--no-legacy]
+
+1 KB あたりの処理時間が、最小の入力に比べて最大の入力で --max-growth 倍を超えて
+増えた場合 (線形なら約 1 倍、二乗時間なら入力長の比に比例して増える) は終了コード 1 を返す。
+"""
+import argparse
+import gc
+import os
+import re
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.text_processor import convert_mentions  # noqa: E402
+
+# 線形性の判定に使う最小の処理時間 (秒)
+_MIN_COMPARABLE = 0.0005
+
+_LEGACY_PATTERN = r'<mention\s+[^>]*data-text="@([^"]+)"[^>]*>.*?</mention>(?:&nbsp;|\u00a0)?'
+
+
+class _StubMapper:
+    def __init__(self) -> None:
+        self.users_map = {f"User {i}": f"user{i}.rc" for i in range(0, 200, 2)}
+
+    def get_rc_user(self, op_user: str) -> Optional[str]:
+        return self.users_map.get(op_user)
+
+
+def _mention(i: int) -> str:
+    return (f'<mention class="mention" data-id="{i}" data-type="user" '
+            f'data-text="@User {i % 200}">@User {i % 200}</mention>&nbsp;')
+
+
+def realistic(scale: int) -> str:
+    """メンションを含む通常の段落が続くコメント"""
+    paragraph = ("進捗を共有します。" + _mention(1) + " さんレビューをお願いします。"
+                 "詳細はチケットを参照してください。\n\n")
+    return paragraph * scale
+
+
+def many_mentions(scale: int) -> str:
+    """1 行に数千件のメンションが並ぶ (表の貼り付けなど)"""
+    return " | ".join(_mention(i) for i in range(scale * 4))
+
+
+def unclosed_tags(scale: int) -> str:
+    """閉じタグの無いメンションが大量に続く (旧実装では .*? が行末まで走査を繰り返す)"""
+    return ('<mention class="mention" data-text="@User 1">@User 1 ' * scale) + "end"
+
+
+def open_brackets(scale: int) -> str:
+    """'>' の無い属性が延々と続く (旧実装では [^>]* のバックトラックが発生する)"""
+    return '<mention ' + ('data-text="@x" ' * scale) + ' <mention ' * scale
+
+
+def pasted_log(scale: int) -> str:
+    """メンションを含まない長いログの貼り付け"""
+    return "2026-01-01 12:00:00 INFO <worker> processed request id=42\n" * scale
+
+
+CASES: Dict[str, Callable[[int], str]] = {
+    "realistic": realistic,
+    "many_mentions": many_mentions,
+    "unclosed_tags": unclosed_tags,
+    "open_brackets": open_brackets,
+    "pasted_log": pasted_log,
+}
+
+
+def _time(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+    finally:
+        gc.enable()
+    return best
+
+
+def run_case(name: str, builder: Callable[[int], str], scales: List[int], repeat: int,
+             legacy: bool) -> Tuple[List[str], float]:
+    mapper = _StubMapper()
+    legacy_re = re.compile(_LEGACY_PATTERN)
+
+    def legacy_convert(text: str) -> str:
+        def replace(match: "re.Match[str]") -> str:
+            op_user = match.group(1)
+            rc_user = mapper.get_rc_user(op_user)
+            return f"@{rc_user}" if rc_user else f"@{op_user}"
+        return legacy_re.sub(replace, text)
+
+    lines: List[str] = []
+    timings: List[float] = []
+    sizes: List[int] = []
+    for scale in scales:
+        text = builder(scale)
+        sizes.append(len(text))
+        elapsed = _time(lambda: convert_mentions(text, mapper), repeat)  # type: ignore[arg-type]
+        timings.append(elapsed)
+        line = f"  {name:<14} {len(text) / 1024:9.1f} KB  {elapsed * 1000:9.2f} ms"
+        # 旧実装は二乗時間になり得るため小さい入力のみ計測する
+        if legacy and len(text) <= 200 * 1024:
+            legacy_elapsed = _time(lambda: legacy_convert(text), 1)
+            assert legacy_convert(text) == convert_mentions(text, mapper), f"{name}: output mismatch"  # type: ignore[arg-type]
+            line += f"  (legacy {legacy_elapsed * 1000:9.2f} ms)"
+        lines.append(line)
+
+    # 1 KB あたりの処理時間の増加率 (線形なら ~1)。計測誤差が支配的な短時間の計測は除く
+    per_kb = [elapsed / size for elapsed, size in zip(timings, sizes) if elapsed >= _MIN_COMPARABLE]
+    growth = per_kb[-1] / per_kb[0] if len(per_kb) >= 2 else 1.0
+    return lines, growth
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-growth", type=float, default=2.5,
+                        help="1 KB あたり処理時間の増加率の上限 (線形なら約 1)")
+    parser.add_argument("--no-legacy", action="store_true", help="旧実装との比較を行わない")
+    args = parser.parse_args()
+
+    scales = [500, 1000, 2000, 4000, 8000]
+    failed = False
+    for name, builder in CASES.items():
+        lines, growth = run_case(name, builder, scales, args.repeat, not args.no_legacy)
+        print("\n".join(lines))
+        status = "ok" if growth <= args.max_growth else "NON-LINEAR"
+        print(f"  {name:<14} per-KB time growth (largest / smallest input): {growth:.2f} [{status}]\n")
+        failed = failed or growth > args.max_growth
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
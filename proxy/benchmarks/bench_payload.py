@@ -0,0 +1,124 @@
+"""
+Webhook ペイロード抽出 (core.pipeline.extract_comment_event) のマイクロベンチマーク
+
+OpenProject の Webhook には作業項目全体 (HTML の説明、カスタムフィールド、リンク) が
+埋め込まれる。実運用に近い大きさのペイロードについて、Flask のリクエスト処理を含めた
+1 リクエストあたりの処理時間・確保メモリ量 (ピーク) と、抽出後も配送の間リクエストに
+保持され続けるメモリ量を、旧実装 (request.json + parse_comment_event) と比較する。
+
+使い方:
+    cd proxy
+    python benchmarks/bench_payload.py [--repeat 200] [--sizes 10,50,200]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, request  # noqa: E402
+
+from core.pipeline import SUPPORTED_ACTION, extract_comment_event, parse_comment_event  # noqa: E402
+
+
+def webhook_payload(action: str, description_kb: int, custom_fields: int = 40, links: int = 40) -> bytes:
+    """HTML の説明・カスタムフィールド・リンクを含む作業項目を埋め込んだ Webhook ボディ"""
+    paragraph = "<p>" + "仕様の詳細を記載します。<strong>注意</strong>: 既存の画面との互換性を保つこと。" * 8 + "</p>"
+    html = paragraph * max(1, description_kb * 1024 // len(paragraph.encode()))
+    work_package: Dict[str, Any] = {
+        "_type": "WorkPackage", "id": 1234, "lockVersion": 3, "subject": "ログイン画面の改修",
+        "description": {"format": "markdown", "raw": html, "html": html},
+        "startDate": "2026-01-01", "dueDate": None, "percentageDone": 20,
+        "createdAt": "2026-01-01T00:00:00Z", "updatedAt": "2026-01-02T00:00:00Z",
+        "_links": {
+            "self": {"href": "/api/v3/work_packages/1234", "title": "ログイン画面の改修"},
+            "project": {"href": "/api/v3/projects/demo", "title": "Demo project"},
+        },
+    }
+    for i in range(custom_fields):
+        work_package[f"customField{i}"] = f"カスタムフィールドの値 {i}"
+    for i in range(links):
+        work_package["_links"][f"relation{i}"] = {"href": f"/api/v3/relations/{i}", "title": f"Relation {i}", "method": "get"}
+    activity = {
+        "_type": "Activity::Comment", "id": 9876, "version": 5, "details": [],
+        "comment": {"format": "markdown", "raw": '<mention data-id="5" data-text="@Alice">@Alice</mention> 確認をお願いします',
+                    "html": "<p>確認をお願いします</p>"},
+        "createdAt": "2026-01-02T00:00:00Z",
+        "_embedded": {"workPackage": work_package},
+        "_links": {"self": {"href": "/api/v3/activities/9876"},
+                   "user": {"href": "/api/v3/users/5", "title": "Alice"},
+                   "workPackage": {"href": "/api/v3/work_packages/1234"}},
+    }
+    return json.dumps({"action": action, "activity": activity}, ensure_ascii=False).encode("utf-8")
+
+
+app = Flask(__name__)
+
+
+def legacy(body: bytes) -> Callable[[], Any]:
+    """request.json でペイロード全体をデコードする (デコード結果はリクエストに保持される)"""
+    def run() -> Any:
+        return parse_comment_event(request.json)
+    return run
+
+
+def current(body: bytes) -> Callable[[], Any]:
+    def run() -> Any:
+        return extract_comment_event(request.get_data(cache=False))
+    return run
+
+
+def measure(builder: Callable[[bytes], Callable[[], Any]], body: bytes, repeat: int) -> Tuple[float, int, int]:
+    """(1 リクエストあたりの秒数, 確保メモリのピーク, 抽出後もリクエストに保持されるメモリ)"""
+    run = builder(body)
+
+    def request_context() -> Any:
+        return app.test_request_context('/webhook', method='POST', data=body, content_type='application/json')
+
+    best = float("inf")
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            with request_context():
+                started = time.perf_counter()
+                run()
+                best = min(best, time.perf_counter() - started)
+    finally:
+        gc.enable()
+
+    with request_context():
+        tracemalloc.start()
+        event = run()
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del event
+    return best, peak, retained
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--sizes", default="10,50,200", help="説明 (HTML) の大きさ (KB、カンマ区切り)")
+    args = parser.parse_args()
+
+    print(f"  {'case':<22} {'body':>9}  {'':<8} {'time':>10} {'peak alloc':>12} {'retained':>10}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        for label, action in (("comment", SUPPORTED_ACTION), ("ignored (updated)", "work_package:updated")):
+            body = webhook_payload(action, size)
+            results: List[Tuple[str, Tuple[float, int, int]]] = [
+                ("legacy", measure(legacy, body, args.repeat)),
+                ("current", measure(current, body, args.repeat)),
+            ]
+            for name, (elapsed, peak, retained) in results:
+                print(f"  {label:<22} {len(body) / 1024:7.1f} KB  {name:<8} {elapsed * 1e6:7.1f} us "
+                      f"{peak / 1024:9.1f} KiB {retained / 1024:7.1f} KiB")
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+同期 (Flask + gunicorn sync ワーカー) と ASGI (Quart + uvicorn) の処理能力比較
+
+応答の遅い OpenProject / Rocket.Chat のスタブを起動し、それぞれのモードで
+サーバーを立ち上げて同時に Webhook を送り、スループットと p50 / p99 レイテンシを計測する。
+両モードとも同じワーカー (プロセス) 数で比較する。
+
+使い方:
+    cd proxy
+    python benchmarks/bench_serving.py [--workers 2] [--requests 400] [--concurrency 100] [--delay 0.05]
+
+--users はユーザー名キャッシュに乗る投稿者の種類数 (requests と同じにすると毎回 API を呼ぶ)。
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import run_closed_loop, run_proxy, webhook_payload  # noqa: E402
+from benchmarks.stubs import StubConfig, StubServer  # noqa: E402
+
+APPS = {"sync": "main:app", "async": "asgi:app"}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="サーバーのワーカー (プロセス) 数")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100, help="同時に送信する Webhook 数")
+    parser.add_argument("--users", type=int, default=400, help="投稿者の種類数")
+    parser.add_argument("--delay", type=float, default=0.05, help="スタブの応答遅延 (秒)")
+    parser.add_argument("--pool-size", type=int, default=100, help="下流への接続プールサイズ")
+    parser.add_argument("--modes", default="sync,async")
+    args = parser.parse_args()
+
+    stub = StubServer(0, StubConfig(op_latency=args.delay, rc_latency=args.delay)).start_in_thread()
+    env = {"RC_POOL_SIZE": str(args.pool_size), "OP_POOL_SIZE": str(args.pool_size)}
+    payloads = [webhook_payload(i, args.users) for i in range(args.requests)]
+    try:
+        for mode in args.modes.split(","):
+            with run_proxy(APPS[mode], f"--workers {args.workers}", stub.url, env) as base_url:
+                r = asyncio.run(run_closed_loop(base_url, payloads, args.concurrency))
+            errors = sum(n for status, n in r["statuses"].items() if status != "200")
+            print(f"{mode:>6}: {r['throughput_rps']:8.1f} req/s  p50 {r['p50_ms']:8.1f} ms"
+                  f"  p99 {r['p99_ms']:8.1f} ms  errors {errors}")
+    finally:
+        stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
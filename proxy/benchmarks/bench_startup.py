@@ -0,0 +1,82 @@
+"""
+ワーカー起動コストのベンチマーク
+
+新しい Python プロセスで `main` (create_app) を読み込むまでの時間と、
+読み込み後の常駐メモリ (RSS) を計測する。gunicorn のワーカー 1 つあたりの
+コールドスタートに相当する。
+
+使い方:
+    cd proxy
+    python benchmarks/bench_startup.py [--runs 5] [--extra-import pandas]
+
+--extra-import を指定すると、そのモジュールを先に読み込んだ場合の値も
+併せて計測する (pandas 依存だった旧実装との比較用)。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+PROXY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+extra = sys.argv[1]
+if extra:
+    __import__(extra)
+import main  # noqa: F401  (create_app() まで実行される)
+elapsed = time.perf_counter() - started
+rss_kb = 0
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss_kb = int(line.split()[1])
+print(json.dumps({"import_ms": elapsed * 1000, "rss_mb": rss_kb / 1024}))
+"""
+
+
+def measure(runs: int, extra_import: Optional[str]) -> Dict[str, float]:
+    env = dict(os.environ)
+    env.setdefault("RC_WEBHOOK_URL", "http://127.0.0.1:9/hooks/bench")
+    env.setdefault("OP_API_KEY", "bench")
+    env.setdefault("LOG_LEVEL", "WARNING")
+
+    import_ms: List[float] = []
+    rss_mb: List[float] = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _CHILD, extra_import or ""],
+            cwd=PROXY_DIR, env=env, capture_output=True, text=True, check=True
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        import_ms.append(result["import_ms"])
+        rss_mb.append(result["rss_mb"])
+
+    return {
+        "import_ms_median": round(statistics.median(import_ms), 1),
+        "import_ms_min": round(min(import_ms), 1),
+        "rss_mb_median": round(statistics.median(rss_mb), 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--extra-import", default=None, help="比較用に追加で読み込むモジュール (例: pandas)")
+    args = parser.parse_args()
+
+    results = {"current": measure(args.runs, None)}
+    if args.extra_import:
+        results[f"with {args.extra_import}"] = measure(args.runs, args.extra_import)
+
+    for label, values in results.items():
+        print(f"{label:>20}: import {values['import_ms_median']:8.1f} ms (min {values['import_ms_min']:.1f})"
+              f"  RSS {values['rss_mb_median']:7.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+通知メッセージの組み立て (core.pipeline.build_message) のマイクロベンチマーク
+
+1 件あたりの組み立て時間を次の方式で比較する。
+
+- legacy: 旧実装 (リクエストごとに OP_WEB_URL の整形とプロジェクト href の分解を行う f-string)
+- format_map: テンプレート文字列をリクエストごとに str.format_map で解析・描画する素朴な実装
+- current: 起動時に解析済みのテンプレート (Mapper.get_template で選択) による描画
+
+使い方:
+    cd proxy
+    python benchmarks/bench_templates.py [--repeat 100000] [--templates 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, List, Tuple
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from core.mapper import Mapper  # noqa: E402
+from core.pipeline import CommentEvent, build_message  # noqa: E402
+
+COMMENT = "@tanaka.rc 確認をお願いします。\n\n" * 4
+CUSTOM = "#### {project} / {subject} (#{wp_id})\\n{author} がコメントしました: {url}\\n\\n> {comment}"
+
+
+def make_event() -> CommentEvent:
+    return CommentEvent(
+        wp_id=1234, wp_subject="ログイン画面の改修", comment=COMMENT,
+        project_title="デモプロジェクト", project_href="/api/v3/projects/demo"
+    )
+
+
+def legacy(event: CommentEvent, converted_notes: str) -> str:
+    base_url = config.OP_WEB_URL.rstrip('/')
+    if event.project_href:
+        project_id = event.project_href.rstrip('/').split('/')[-1]
+        wp_url = f"{base_url}/projects/{project_id}/work_packages/{event.wp_id}"
+    else:
+        wp_url = f"{base_url}/work_packages/{event.wp_id}"
+    return f"### [{event.wp_subject}] (#{event.wp_id})\n🔗 [OpenProjectで表示]({wp_url})\n\n{converted_notes}"
+
+
+def format_map(source: str) -> Callable[[CommentEvent, str], str]:
+    def render(event: CommentEvent, converted_notes: str) -> str:
+        base_url = config.OP_WEB_URL.rstrip('/')
+        project_id = (event.project_href or "").rstrip('/').split('/')[-1]
+        return source.replace("\\n", "\n").format_map({
+            "subject": event.wp_subject, "wp_id": event.wp_id, "project": event.project_title or "",
+            "author": "Tanaka Taro", "comment": converted_notes,
+            "url": f"{base_url}/projects/{project_id}/work_packages/{event.wp_id}",
+        })
+    return render
+
+
+def timeit(fn: Callable[[], str], repeat: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def load_mapper(tmpdir: str, templates: int) -> Mapper:
+    """プロジェクトごとのテンプレートを templates 件定義した Mapper"""
+    path = os.path.join(tmpdir, 'templates.csv')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('target,template\n')
+        for i in range(templates - 1):
+            f.write(f'project-{i},"[{{project}}] {{subject}} {i}"\n')
+        f.write(f'デモプロジェクト,"{CUSTOM}"\n')
+    with patch.object(config, 'TEMPLATES_CSV_PATH', path):
+        return Mapper()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=100000)
+    parser.add_argument("--templates", type=int, default=50, help="templates.csv に定義するテンプレート数")
+    args = parser.parse_args()
+
+    event = make_event()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        started = time.perf_counter()
+        mapper = load_mapper(tmpdir, args.templates)
+        load_time = time.perf_counter() - started
+
+    def current_default() -> str:
+        return build_message(event, COMMENT, mapper.get_template("other", "#general"), "Tanaka Taro")
+
+    def current_custom() -> str:
+        return build_message(event, COMMENT, mapper.get_template(event.project_title, "#general"), "Tanaka Taro")
+
+    naive_default = format_map(config.MESSAGE_TEMPLATE)
+    naive_custom = format_map(CUSTOM)
+    assert current_default() == legacy(event, COMMENT) == naive_default(event, COMMENT)
+    assert current_custom() == naive_custom(event, COMMENT)
+
+    cases: List[Tuple[str, str, Callable[[], str]]] = [
+        ("default", "legacy", lambda: legacy(event, COMMENT)),
+        ("default", "format_map", lambda: naive_default(event, COMMENT)),
+        ("default", "current", current_default),
+        ("custom", "format_map", lambda: naive_custom(event, COMMENT)),
+        ("custom", "current", current_custom),
+    ]
+    print(f"  templates.csv ({args.templates} templates) loaded and compiled in {load_time * 1e3:.2f} ms")
+    print(f"  {'template':<9} {'method':<11} {'per message':>12}")
+    for template, method, fn in cases:
+        print(f"  {template:<9} {method:<11} {timeit(fn, args.repeat) * 1e6:9.2f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""
+負荷試験の共通部品 (プロキシの起動、Webhook ペイロードの生成、負荷の送信と集計)
+
+bench_serving.py と loadtest.py から使う。
+"""
+import asyncio
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+
+PROXY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# projects.csv に定義済みのプロジェクトと、未定義 (DEFAULT_CHANNEL 宛て) のプロジェクト
+KNOWN_PROJECTS = ("デモプロジェクト", "infra-project")
+UNKNOWN_PROJECT = "unmapped-project"
+# users.csv に定義済みの OpenProject ユーザー
+KNOWN_MENTIONS = ("tanaka_op", "suzuki_op")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
+
+
+def server_command(app: str, port: int, server_args: str) -> List[str]:
+    """app が asgi:app の場合は uvicorn、それ以外は gunicorn で起動するコマンドを返す"""
+    extra = shlex.split(server_args)
+    if app.startswith("asgi:"):
+        return [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port),
+                "--log-level", "warning", "--no-access-log"] + extra
+    return [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+            "--backlog", "2048", "--timeout", "120"] + extra + [app]
+
+
+def wait_until_up(base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not start")
+
+
+@contextmanager
+def run_proxy(app: str, server_args: str, stub_url: str, env: Optional[Dict[str, str]] = None) -> Iterator[str]:
+    """スタブに接続したプロキシを起動し、ベース URL を返す"""
+    port = free_port()
+    proc_env = dict(os.environ)
+    proc_env.update({
+        "RC_WEBHOOK_URL": f"{stub_url}/hooks/loadtest",
+        "OP_API_URL": stub_url,
+        "OP_API_KEY": "loadtest",
+        "LOG_LEVEL": "WARNING",
+        "DELIVERY_MODE": "sync",
+        "MAPPING_RELOAD_INTERVAL": "0",
+        "USER_CACHE_WARMUP": "false",
+        # 既定ではプロキシ自体の処理能力を測るため、送信レート制限を外す (--env で上書き可能)
+        "RC_RATE_LIMIT": "0",
+        "RC_CHANNEL_RATE_LIMIT": "0",
+    })
+    proc_env.update(env or {})
+    proc = subprocess.Popen(server_command(app, port, server_args), cwd=PROXY_DIR, env=proc_env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_until_up(base_url)
+        yield base_url
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def webhook_payload(i: int, users: int, project: str = KNOWN_PROJECTS[1], comment: Optional[str] = None,
+                    action: str = "work_package_comment:comment") -> Dict[str, Any]:
+    return {
+        "action": action,
+        "activity": {
+            "comment": {"raw": comment if comment is not None else f"load test comment {i}"},
+            "_links": {"user": {"href": f"/api/v3/users/{i % users}"}},
+            "_embedded": {"workPackage": {
+                "id": i, "subject": f"Load test {i}",
+                "_links": {"project": {"title": project, "href": f"/api/v3/projects/p{i % 7}"}}
+            }}
+        }
+    }
+
+
+def _mention(name: str) -> str:
+    return (f'<mention class="mention" data-id="1" data-type="user" data-text="@{name}">'
+            f'@{name}</mention>&nbsp;')
+
+
+class PayloadMix:
+    """
+    実運用に近い Webhook の構成を再現する。
+
+    - ignored_ratio: コメント以外のアクション (プロキシは無視して 200 を返す)
+    - unknown_project_ratio: マッピング未定義のプロジェクト (DEFAULT_CHANNEL 宛て)
+    - mention_ratio: メンションを含むコメント (未定義ユーザーへのメンションを含む)
+    - long_comment_ratio: ログの貼り付けなどの長いコメント
+    """
+
+    def __init__(
+        self,
+        users: int = 50,
+        ignored_ratio: float = 0.1,
+        unknown_project_ratio: float = 0.1,
+        mention_ratio: float = 0.3,
+        long_comment_ratio: float = 0.05,
+        seed: int = 1
+    ) -> None:
+        self.users = users
+        self.ignored_ratio = ignored_ratio
+        self.unknown_project_ratio = unknown_project_ratio
+        self.mention_ratio = mention_ratio
+        self.long_comment_ratio = long_comment_ratio
+        self.random = random.Random(seed)
+
+    def payload(self, i: int) -> Dict[str, Any]:
+        r = self.random
+        if r.random() < self.ignored_ratio:
+            return webhook_payload(i, self.users, action="work_package:updated")
+
+        project = UNKNOWN_PROJECT if r.random() < self.unknown_project_ratio else r.choice(KNOWN_PROJECTS)
+        comment = f"load test comment {i}"
+        if r.random() < self.mention_ratio:
+            names = [r.choice(KNOWN_MENTIONS), f"Guest {r.randrange(100)}"]
+            comment = f"{_mention(names[0])} please check. cc {_mention(names[1])}"
+        if r.random() < self.long_comment_ratio:
+            comment += "\n" + "\n".join(f"[{n:05d}] INFO worker-{n % 8} processed job <id={n}>" for n in range(400))
+        return webhook_payload(i, self.users, project=project, comment=comment)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+async def run_closed_loop(base_url: str, payloads: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    """concurrency 件を常に送信中に保つ (スループットの上限を測る)"""
+    queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+    for payload in payloads:
+        queue.put_nowait(payload)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def worker() -> None:
+            while True:
+                try:
+                    payload = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                started = time.perf_counter()
+                status = await _post(client, payload)
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, statuses, elapsed)
+
+
+async def run_open_loop(base_url: str, payloads: List[Dict[str, Any]], rate: float,
+                        max_in_flight: int = 1000) -> Dict[str, Any]:
+    """
+    rate 件/秒の一定間隔で送信する。応答を待たずに次を送るため、サーバーが遅くなっても
+    送信間隔は変わらない。レイテンシは予定送信時刻から計測する (coordinated omission を避ける)。
+    """
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def send(payload: Dict[str, Any], scheduled: float) -> None:
+            status = await _post(client, payload)
+            latencies.append(time.perf_counter() - scheduled)
+            statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        tasks = []
+        for n, payload in enumerate(payloads):
+            scheduled = started + n / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(send(payload, scheduled)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, statuses, elapsed)
+
+
+async def _post(client: httpx.AsyncClient, payload: Dict[str, Any]) -> str:
+    try:
+        response = await client.post("/webhook", json=payload)
+        return str(response.status_code)
+    except httpx.HTTPError as e:
+        return type(e).__name__
+
+
+def summarize(latencies: List[float], statuses: Dict[str, int], elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "statuses": dict(sorted(statuses.items())),
+    }
@@ -0,0 +1,170 @@
+"""
+エンドツーエンド負荷試験
+
+ローカルの OpenProject / Rocket.Chat スタブ (benchmarks/stubs.py) を別プロセスで起動し、
+指定した gunicorn (または uvicorn) 構成のプロキシに実運用に近い構成の Webhook を
+一定レートで送信する。レートごとにスループット・p50/p95/p99・応答ステータス・
+下流への呼び出し回数を出力する。外部ネットワークは使用しない。
+
+使い方:
+    cd proxy
+    python benchmarks/loadtest.py --server-args "--workers 2 --threads 4" --rates 10,20,40 --duration 10
+
+    # 結果を保存し、次回以降はそれを基準に劣化を検出する (劣化時は終了コード 1)
+    python benchmarks/loadtest.py --output baseline.json
+    python benchmarks/loadtest.py --baseline baseline.json --max-regression 0.2
+
+    # 下流の障害を再現する
+    python benchmarks/loadtest.py --rc-error-rate 0.05 --missing-channels '#infra-log' --jitter 0.02
+
+    # Rocket.Chat のレート制限 (429) に対する送信レート制限の効果を確認する
+    python benchmarks/loadtest.py --rc-rate-limit 15 --env RC_RATE_LIMIT=7 --rates 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import PROXY_DIR, PayloadMix, free_port, run_closed_loop, run_open_loop, run_proxy  # noqa: E402
+from benchmarks.stubs import add_stub_arguments  # noqa: E402
+
+
+@contextmanager
+def run_stubs(args: argparse.Namespace) -> Iterator[str]:
+    """スタブを別プロセスで起動する (負荷生成側と CPU を奪い合わないようにする)"""
+    command = [sys.executable, os.path.join(PROXY_DIR, "benchmarks", "stubs.py"), "--port", str(free_port()),
+               "--op-latency", str(args.op_latency), "--rc-latency", str(args.rc_latency),
+               "--jitter", str(args.jitter), "--op-error-rate", str(args.op_error_rate),
+               "--rc-error-rate", str(args.rc_error_rate), "--missing-channels", args.missing_channels,
+               "--rc-rate-limit", str(args.rc_rate_limit)]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    try:
+        assert proc.stdout is not None
+        yield proc.stdout.readline().strip()
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def outbound_calls(stub_url: str, reset: bool = False) -> Dict[str, int]:
+    counts: Dict[str, int] = httpx.get(f"{stub_url}/__stats", timeout=5).json()
+    if reset:
+        httpx.post(f"{stub_url}/__reset", timeout=5)
+    return dict(sorted(counts.items()))
+
+
+def run_steps(args: argparse.Namespace, base_url: str, stub_url: str) -> List[Dict[str, Any]]:
+    mix = PayloadMix(
+        users=args.users,
+        ignored_ratio=args.ignored_ratio,
+        unknown_project_ratio=args.unknown_project_ratio,
+        mention_ratio=args.mention_ratio,
+        long_comment_ratio=args.long_comment_ratio
+    )
+    counter = 0
+
+    def next_payloads(n: int) -> List[Dict[str, Any]]:
+        nonlocal counter
+        payloads = [mix.payload(counter + i) for i in range(n)]
+        counter += n
+        return payloads
+
+    # ウォームアップ (接続確立・キャッシュ投入) は集計に含めない
+    if args.warmup:
+        asyncio.run(run_closed_loop(base_url, next_payloads(args.warmup), min(args.warmup, 10)))
+    outbound_calls(stub_url, reset=True)
+
+    steps: List[Dict[str, Any]] = []
+    if args.concurrency:
+        result = asyncio.run(run_closed_loop(base_url, next_payloads(args.requests), args.concurrency))
+        result["step"] = f"concurrency={args.concurrency}"
+        result["outbound"] = outbound_calls(stub_url, reset=True)
+        steps.append(result)
+    else:
+        for rate in (float(r) for r in args.rates.split(",")):
+            result = asyncio.run(run_open_loop(base_url, next_payloads(int(rate * args.duration)), rate))
+            result["step"] = f"rate={rate:g}"
+            result["outbound"] = outbound_calls(stub_url, reset=True)
+            steps.append(result)
+    return steps
+
+
+def print_report(steps: List[Dict[str, Any]]) -> None:
+    for r in steps:
+        print(f"{r['step']:>16}: {r['throughput_rps']:8.1f} req/s  p50 {r['p50_ms']:8.1f} ms"
+              f"  p95 {r['p95_ms']:8.1f} ms  p99 {r['p99_ms']:8.1f} ms  max {r['max_ms']:8.1f} ms")
+        print(f"{'':>16}  responses {r['statuses']}")
+        print(f"{'':>16}  outbound  {r['outbound']}")
+
+
+def check_regression(steps: List[Dict[str, Any]], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """基準と同じステップについて、スループットの低下と p99 の悪化を検出する"""
+    problems: List[str] = []
+    previous = {s["step"]: s for s in baseline.get("steps", [])}
+    for current in steps:
+        base = previous.get(current["step"])
+        if base is None:
+            continue
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - max_regression):
+            problems.append(f"{current['step']}: throughput {current['throughput_rps']} < "
+                            f"baseline {base['throughput_rps']}")
+        if current["p99_ms"] > base["p99_ms"] * (1 + max_regression):
+            problems.append(f"{current['step']}: p99 {current['p99_ms']} ms > baseline {base['p99_ms']} ms")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="main:app", help="main:app (gunicorn) または asgi:app (uvicorn)")
+    parser.add_argument("--server-args", default="--workers 2", help="gunicorn / uvicorn に渡す引数")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="プロキシに渡す環境変数 (例: DELIVERY_MODE=async)")
+    parser.add_argument("--rates", default="10,20,40", help="送信レート (件/秒、カンマ区切りで段階実行)")
+    parser.add_argument("--duration", type=float, default=10, help="各レートでの送信時間 (秒)")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="指定した場合はレートではなく同時送信数を固定して --requests 件送信する")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--users", type=int, default=50, help="投稿者の種類数")
+    parser.add_argument("--ignored-ratio", type=float, default=0.1)
+    parser.add_argument("--unknown-project-ratio", type=float, default=0.1)
+    parser.add_argument("--mention-ratio", type=float, default=0.3)
+    parser.add_argument("--long-comment-ratio", type=float, default=0.05)
+    parser.add_argument("--output", help="結果を JSON で保存するパス")
+    parser.add_argument("--baseline", help="比較対象の結果 JSON")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="許容する劣化の割合")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    env = dict(item.split("=", 1) for item in args.env)
+    with run_stubs(args) as stub_url:
+        with run_proxy(args.app, args.server_args, stub_url, env) as base_url:
+            steps = run_steps(args, base_url, stub_url)
+
+    print_report(steps)
+    result = {"app": args.app, "server_args": args.server_args, "env": env, "steps": steps}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = check_regression(steps, json.load(f), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
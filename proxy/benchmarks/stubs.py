@@ -0,0 +1,213 @@
+"""
+負荷試験用の OpenProject / Rocket.Chat スタブサーバー
+
+1 つのポートで以下を提供する (外部ネットワーク不要):
+    GET  /api/v3/users/{id}   OpenProject のユーザー API ({"name": "User {id}"})
+    POST /hooks/...           Rocket.Chat の Incoming Webhook
+    GET  /__stats             呼び出し回数 (種類・ステータス別) を JSON で返す
+    POST /__reset             呼び出し回数をリセットする
+
+応答遅延・エラー率・存在しないチャンネル (400)・Rocket.Chat のレート制限 (429) を指定できる。
+単体でも起動できる:
+    python benchmarks/stubs.py --port 9000 --op-latency 0.05 --rc-latency 0.05 --missing-channels '#gone'
+"""
+import argparse
+import json
+import random
+import re
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, FrozenSet, Optional
+
+_USER_PATH = re.compile(r'^/api/v3/users/(\d+)$')
+
+
+class StubConfig:
+    """スタブの振る舞い (遅延は latency ± jitter 秒の一様分布)"""
+
+    def __init__(
+        self,
+        op_latency: float = 0.05,
+        rc_latency: float = 0.05,
+        jitter: float = 0.0,
+        op_error_rate: float = 0.0,
+        rc_error_rate: float = 0.0,
+        missing_channels: FrozenSet[str] = frozenset(),
+        rc_rate_limit: float = 0.0,
+        seed: Optional[int] = None
+    ) -> None:
+        self.op_latency = op_latency
+        self.rc_latency = rc_latency
+        self.jitter = jitter
+        self.op_error_rate = op_error_rate
+        self.rc_error_rate = rc_error_rate
+        self.missing_channels = missing_channels
+        self.rc_rate_limit = rc_rate_limit  # 件/秒 (1 秒単位の固定窓、0 で制限なし)
+        self.random = random.Random(seed)
+
+    def delay(self, base: float) -> float:
+        if self.jitter <= 0:
+            return base
+        return max(0.0, base + self.random.uniform(-self.jitter, self.jitter))
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """OpenProject のユーザー API と Rocket.Chat の Incoming Webhook を模したスタブ"""
+    protocol_version = "HTTP/1.1"
+    server: "StubServer"
+
+    def setup(self) -> None:
+        super().setup()
+        # ヘッダーと本文を別々に書き込むため、Nagle と遅延 ACK による 40ms の待ちを避ける
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _reply(self, status: int, body: Any) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path == "/__stats":
+            self._reply(200, self.server.snapshot())
+            return
+        config = self.server.config
+        time.sleep(config.delay(config.op_latency))
+        match = _USER_PATH.match(self.path)
+        body: Dict[str, Any]
+        if not match:
+            status, body = 404, {}
+        elif config.random.random() < config.op_error_rate:
+            status, body = 500, {}
+        else:
+            status, body = 200, {"name": f"User {match.group(1)}"}
+        self.server.count("openproject", status)
+        self._reply(status, body)
+
+    def do_POST(self) -> None:
+        payload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/__reset":
+            self.server.reset()
+            self._reply(200, {})
+            return
+        config = self.server.config
+        time.sleep(config.delay(config.rc_latency))
+        try:
+            channel = json.loads(payload).get("channel")
+        except ValueError:
+            channel = None
+        if not self.server.within_rc_rate_limit():
+            self.server.count("rocketchat", 429)
+            data = b'{"success": false, "error": "error-too-many-requests"}'
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if channel in config.missing_channels:
+            status = 400
+        elif config.random.random() < config.rc_error_rate:
+            status = 503
+        else:
+            status = 200
+        self.server.count("rocketchat", status)
+        self._reply(status, {"success": status == 200})
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, port: int, config: StubConfig) -> None:
+        super().__init__(("127.0.0.1", port), _StubHandler)
+        self.config = config
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._rc_window = (0, 0)  # (秒, その秒の受け付け件数)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, target: str, status: int) -> None:
+        with self._lock:
+            self._counts[f"{target}:{status}"] += 1
+
+    def within_rc_rate_limit(self) -> bool:
+        if self.config.rc_rate_limit <= 0:
+            return True
+        second = int(time.monotonic())
+        with self._lock:
+            window, accepted = self._rc_window
+            if window != second:
+                window, accepted = second, 0
+            if accepted >= self.config.rc_rate_limit:
+                return False
+            self._rc_window = (window, accepted + 1)
+            return True
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+    def start_in_thread(self) -> "StubServer":
+        threading.Thread(target=self.serve_forever, name="stub-server", daemon=True).start()
+        return self
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--op-latency", type=float, default=0.05, help="OpenProject スタブの応答遅延 (秒)")
+    parser.add_argument("--rc-latency", type=float, default=0.05, help="Rocket.Chat スタブの応答遅延 (秒)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="応答遅延のばらつき (± 秒)")
+    parser.add_argument("--op-error-rate", type=float, default=0.0, help="OpenProject が 500 を返す割合")
+    parser.add_argument("--rc-error-rate", type=float, default=0.0, help="Rocket.Chat が 503 を返す割合")
+    parser.add_argument("--missing-channels", default="", help="Rocket.Chat が 400 を返すチャンネル (カンマ区切り)")
+    parser.add_argument("--rc-rate-limit", type=float, default=0.0,
+                        help="Rocket.Chat が 1 秒あたりに受け付ける件数 (超過分は 429、0 で制限なし)")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def stub_config_from_args(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(
+        op_latency=args.op_latency,
+        rc_latency=args.rc_latency,
+        jitter=args.jitter,
+        op_error_rate=args.op_error_rate,
+        rc_error_rate=args.rc_error_rate,
+        missing_channels=frozenset(c for c in args.missing_channels.split(",") if c),
+        rc_rate_limit=args.rc_rate_limit,
+        seed=args.seed
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9000)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server = StubServer(args.port, stub_config_from_args(args))
+    # 起動完了を親プロセスに伝える (loadtest.py が待ち合わせに使う)
+    print(server.url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+users.csv をワーカー間で共有するバイナリの対応表 (USERS_SNAPSHOT_PATH) にコンパイルする
+
+USERS_SNAPSHOT_PATH を設定した場合、プロキシは起動時・users.csv の更新時に自動でコンパイルするが、
+大規模なディレクトリを同期するジョブの最後に実行しておくと、起動時・再読み込み時の変換を省ける
+(users.csv を更新しない限り、各ワーカーはコンパイル済みのファイルをそのまま mmap する)。
+projects.csv は件数が少ないため、これまでどおり各ワーカーの辞書に読み込む。
+
+使い方:
+    cd proxy
+    USERS_SNAPSHOT_PATH=data/users.map python compile_mappings.py
+    python compile_mappings.py --users /path/to/users.csv --output data/users.map
+
+終了コード: コンパイルに成功すれば 0、users.csv が無いか形式が不正なら 1
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from typing import List, Optional
+
+import config
+from config import setup_logging
+from core.csv_loader import CsvFormatError
+from core.mapper import compile_users
+
+logger = logging.getLogger(__name__)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default=config.USERS_CSV_PATH, help="users.csv のパス")
+    parser.add_argument("--output", default=config.USERS_SNAPSHOT_PATH, help="出力先 (既定: USERS_SNAPSHOT_PATH)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    setup_logging()
+    if not args.output:
+        logger.error("USERS_SNAPSHOT_PATH is not set (or pass --output)")
+        return 1
+    if not os.path.exists(args.users):
+        logger.error(f"Users CSV not found: {args.users}")
+        return 1
+
+    started = time.perf_counter()
+    try:
+        compiled = compile_users(args.users, args.output)
+    except CsvFormatError as e:
+        logger.error(f"Users CSV {e}")
+        return 1
+    users_map, index = compiled.tables
+    print(
+        f"{len(users_map)} users, {compiled.meta['aliases']} aliases, {len(index)} normalized keys"
+        f" -> {args.output} ({os.path.getsize(args.output)} bytes, {time.perf_counter() - started:.2f}s)"
+    )
+    for conflict in compiled.meta["conflicts"]:
+        logger.warning(conflict)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
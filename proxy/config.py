@@ -1,27 +1,128 @@
 import os
+import atexit
 import logging
+import logging.handlers
 import json
-from typing import List, Tuple, Optional
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Tuple, Optional
 
 # Rocket.Chat 設定
 RC_WEBHOOK_URL: Optional[str] = os.environ.get("RC_WEBHOOK_URL")
 RC_WEBHOOK_TOKEN: Optional[str] = os.environ.get("RC_WEBHOOK_TOKEN")
 DEFAULT_CHANNEL: str = os.environ.get("DEFAULT_CHANNEL", "#general")
+# 追加の Rocket.Chat インスタンス ("名前=Webhook URL" のカンマ区切り。projects.csv の rc_instance 列で指定する)
+RC_INSTANCES: Dict[str, str] = {
+    name.strip(): url.strip()
+    for name, _, url in (item.partition("=") for item in os.environ.get("RC_INSTANCES", "").split(","))
+    if name.strip()
+}
+FANOUT_CONCURRENCY: int = int(os.environ.get("FANOUT_CONCURRENCY", "8"))  # 複数の送信先への同時送信数 (同期モード)
+RC_POOL_SIZE: int = int(os.environ.get("RC_POOL_SIZE", "10"))  # 同時送信数 (スレッド数 + 配送ワーカー数) に合わせる
+RC_CONNECT_TIMEOUT: float = float(os.environ.get("RC_CONNECT_TIMEOUT", "3"))
+RC_READ_TIMEOUT: float = float(os.environ.get("RC_READ_TIMEOUT", "10"))
+RC_RETRY_TOTAL: int = int(os.environ.get("RC_RETRY_TOTAL", "3"))
+# 送信レート制限 (ワーカーごと、0 で制限なし)
+RC_RATE_LIMIT: float = float(os.environ.get("RC_RATE_LIMIT", "20"))  # 件/秒 (全チャンネル合計)
+RC_RATE_BURST: float = float(os.environ.get("RC_RATE_BURST", "40"))
+RC_CHANNEL_RATE_LIMIT: float = float(os.environ.get("RC_CHANNEL_RATE_LIMIT", "5"))  # 件/秒 (チャンネルごと)
+RC_CHANNEL_RATE_BURST: float = float(os.environ.get("RC_CHANNEL_RATE_BURST", "10"))
+RC_RATE_MAX_WAIT: float = float(os.environ.get("RC_RATE_MAX_WAIT", "5"))  # 秒 (これ以上待つ場合は送信しない)
 
 # OpenProject API 設定
 OP_API_URL: str = os.environ.get("OP_API_URL", "http://openproject:80")
 OP_API_KEY: Optional[str] = os.environ.get("OP_API_KEY")
 OP_API_HOST: str = os.environ.get("OP_API_HOST", "localhost:8080")
 OP_WEB_URL: str = os.environ.get("OP_WEB_URL", "http://localhost:8080")
+OP_POOL_SIZE: int = int(os.environ.get("OP_POOL_SIZE", "20"))  # ASGI モードでの OpenProject API 同時接続数
+
+# ユーザー名キャッシュ設定
+USER_CACHE_MAXSIZE: int = int(os.environ.get("USER_CACHE_MAXSIZE", "5000"))
+USER_CACHE_TTL: float = float(os.environ.get("USER_CACHE_TTL", "3600"))  # 秒
+USER_CACHE_NEGATIVE_TTL: float = float(os.environ.get("USER_CACHE_NEGATIVE_TTL", "60"))  # 取得失敗の記憶時間 (秒)
+USER_CACHE_SHARED_PATH: str = os.environ.get("USER_CACHE_SHARED_PATH", "")  # 空の場合はワーカー間共有なし
+USER_CACHE_WARMUP: bool = os.environ.get("USER_CACHE_WARMUP", "false").lower() == "true"
+USER_CACHE_WARMUP_PAGE_SIZE: int = int(os.environ.get("USER_CACHE_WARMUP_PAGE_SIZE", "500"))
+USER_CACHE_WARMUP_TIMEOUT: float = float(os.environ.get("USER_CACHE_WARMUP_TIMEOUT", "30"))  # 秒
+USER_CACHE_REFRESH_INTERVAL: float = float(os.environ.get("USER_CACHE_REFRESH_INTERVAL", "1800"))  # 秒 (0 で定期更新なし)
+
+# メンションの解決設定 (users.csv に無いユーザーを data-id から OpenProject API で解決する)
+MENTION_RESOLVE_RULE: str = os.environ.get("MENTION_RESOLVE_RULE", "").lower()  # "" (無効) / "login" / "email"
+MENTION_RESOLVE_MAX: int = int(os.environ.get("MENTION_RESOLVE_MAX", "20"))  # 1 コメントで問い合わせるユーザー数の上限
+MENTION_RESOLVE_CONCURRENCY: int = int(os.environ.get("MENTION_RESOLVE_CONCURRENCY", "8"))  # 同期モードの同時問い合わせ数
 
 # ロギング設定
 LOG_LEVEL: str = os.environ.get("LOG_LEVEL", "INFO").upper()
 LOG_FORMAT: str = os.environ.get("LOG_FORMAT", "text")  # "text" or "json"
+LOG_QUEUE_SIZE: int = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))  # 0 でリクエストのスレッドから直接出力
+LOG_RATE_LIMIT: int = int(os.environ.get("LOG_RATE_LIMIT", "100"))  # 同じメッセージを LOG_RATE_INTERVAL 秒あたりに出力する件数 (0 で制限なし)
+LOG_RATE_INTERVAL: float = float(os.environ.get("LOG_RATE_INTERVAL", "10"))  # 秒
+LOG_SAMPLE_EVERY: int = int(os.environ.get("LOG_SAMPLE_EVERY", "100"))  # 制限を超えた後も N 件に 1 件は出力する (0 で出力しない)
 
 # パス設定
 BASE_DIR: str = os.path.dirname(os.path.abspath(__file__))
 USERS_CSV_PATH: str = os.path.join(BASE_DIR, 'users.csv')
 PROJECTS_CSV_PATH: str = os.path.join(BASE_DIR, 'projects.csv')
+TEMPLATES_CSV_PATH: str = os.path.join(BASE_DIR, 'templates.csv')  # 任意 (プロジェクト・チャンネルごとのテンプレート)
+# users.csv をコンパイルした対応表の保存先 (設定するとワーカー間で共有する mmap から引く。空の場合は辞書に読み込む)
+USERS_SNAPSHOT_PATH: str = os.environ.get("USERS_SNAPSHOT_PATH", "")
+MAPPING_RELOAD_INTERVAL: float = float(os.environ.get("MAPPING_RELOAD_INTERVAL", "30"))  # 秒 (0 で自動再読み込みなし)
+
+# 通知メッセージの既定のテンプレート (\n は改行。使用できるフィールドは core/templates.py の FIELDS)
+MESSAGE_TEMPLATE: str = os.environ.get(
+    "MESSAGE_TEMPLATE", "### [{subject}] (#{wp_id})\\n🔗 [OpenProjectで表示]({url})\\n\\n{comment}"
+)
+
+# Webhook 受信設定
+WEBHOOK_MAX_BODY_BYTES: int = int(os.environ.get("WEBHOOK_MAX_BODY_BYTES", str(1024 * 1024)))  # 超える場合は 413
+
+# 配送モード設定
+DELIVERY_MODE: str = os.environ.get("DELIVERY_MODE", "sync").lower()  # "sync" or "async"
+SPOOL_PATH: str = os.environ.get("SPOOL_PATH", os.path.join(BASE_DIR, 'data', 'spool.db'))
+DELIVERY_WORKERS: int = int(os.environ.get("DELIVERY_WORKERS", "2"))
+DELIVERY_MAX_ATTEMPTS: int = int(os.environ.get("DELIVERY_MAX_ATTEMPTS", "5"))
+DELIVERY_RETRY_BACKOFF: float = float(os.environ.get("DELIVERY_RETRY_BACKOFF", "2"))
+
+# 配送に失敗した通知の保存先 (replay_dead_letters.py で再送する。空の場合は保存しない)
+DEAD_LETTER_PATH: str = os.environ.get("DEAD_LETTER_PATH", os.path.join(BASE_DIR, 'data', 'dead_letters.db'))
+
+# チャンネル単位のメッセージ結合設定
+COALESCE_WINDOW: float = float(os.environ.get("COALESCE_WINDOW", "0"))  # 秒 (0 で結合しない)
+COALESCE_MAX_MESSAGES: int = int(os.environ.get("COALESCE_MAX_MESSAGES", "20"))
+COALESCE_MAX_CHARS: int = int(os.environ.get("COALESCE_MAX_CHARS", "8000"))
+
+# 重複配送の抑止設定
+DEDUP_TTL: float = float(os.environ.get("DEDUP_TTL", "86400"))  # 秒 (0 で重複排除なし)
+DEDUP_MAXSIZE: int = int(os.environ.get("DEDUP_MAXSIZE", "100000"))
+DEDUP_SHARED_PATH: str = os.environ.get("DEDUP_SHARED_PATH", "")  # 空の場合はワーカー単位で判定
+
+# サーキットブレーカー設定 (OpenProject / Rocket.Chat 共通)
+CIRCUIT_FAILURE_RATE: float = float(os.environ.get("CIRCUIT_FAILURE_RATE", "0.5"))  # 遮断する失敗率 (0 で遮断しない)
+CIRCUIT_MIN_CALLS: int = int(os.environ.get("CIRCUIT_MIN_CALLS", "10"))  # 失敗率を判定する最小呼び出し数
+CIRCUIT_WINDOW: int = int(os.environ.get("CIRCUIT_WINDOW", "20"))  # 失敗率を計算する直近の呼び出し数
+CIRCUIT_SLOW_CALL: float = float(os.environ.get("CIRCUIT_SLOW_CALL", "5"))  # 秒 (これより遅い呼び出しは失敗扱い、0 で無効)
+CIRCUIT_OPEN_SECONDS: float = float(os.environ.get("CIRCUIT_OPEN_SECONDS", "30"))  # 遮断してから試行を再開するまで
+CIRCUIT_HALF_OPEN_CALLS: int = int(os.environ.get("CIRCUIT_HALF_OPEN_CALLS", "1"))  # 回復確認に使う呼び出し数
+
+# gunicorn の preload_app 用 (gunicorn.conf.py が設定する。ワーカー固有の依存性を fork 後に作成する)
+DEFER_WORKER_START: bool = os.environ.get("WEBHOOK_PROXY_DEFER_START", "") == "1"
+
+# 依存先の状態確認 (/ready はバックグラウンドで確認した結果を返し、依存先へはリクエストしない)
+HEALTH_CHECK_INTERVAL: float = float(os.environ.get("HEALTH_CHECK_INTERVAL", "15"))  # 秒 (0 で無効)
+HEALTH_PROBE_TIMEOUT: float = float(os.environ.get("HEALTH_PROBE_TIMEOUT", "3"))  # 秒
+HEALTH_FAILURE_THRESHOLD: int = int(os.environ.get("HEALTH_FAILURE_THRESHOLD", "2"))  # 停止とみなす連続失敗回数
+HEALTH_ERROR_WINDOW: float = float(os.environ.get("HEALTH_ERROR_WINDOW", "300"))  # 配送の失敗率の計算期間 (秒)
+HEALTH_MAX_ERROR_RATE: float = float(os.environ.get("HEALTH_MAX_ERROR_RATE", "0.5"))  # 劣化とみなす配送の失敗率
+# 劣化した場合に /ready を 503 にする依存先 (openproject, rocketchat, rocketchat:<名前>, delivery のカンマ区切り。
+# 空の場合は表示のみ。依存先の障害は全インスタンスに共通のため、振り分け先が無くなってもよい場合だけ指定する)
+READY_SHED_DEPENDENCIES: List[str] = [
+    name.strip() for name in os.environ.get("READY_SHED_DEPENDENCIES", "").split(",") if name.strip()
+]
+
+# メトリクス設定
+METRICS_DIR: str = os.environ.get("METRICS_DIR", "")  # 空の場合はワーカー間で集約しない
+METRICS_FLUSH_INTERVAL: float = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))  # 秒
 
 
 class JsonFormatter(logging.Formatter):
@@ -41,15 +142,162 @@ class JsonFormatter(logging.Formatter):
         return json.dumps(log_data, ensure_ascii=False)
 
 
+class LogRateLimiter(logging.Filter):
+    """
+    同じメッセージ (ロガー・レベル・%-形式のテンプレートが同じもの) の出力を、interval 秒あたり
+    limit 件に制限する。制限を超えた後も sample_every 件に 1 件は出力し、見送った件数を付記する。
+    WARNING 以上のレコードは障害の調査に必要なため、制限せずに常に出力する。
+    """
+
+    def __init__(self, limit: int, interval: float, sample_every: int = 0, max_keys: int = 1000) -> None:
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self.sample_every = sample_every
+        self.max_keys = max_keys
+        # キーごとに [集計の開始時刻, 件数, 見送った件数]
+        self._windows: Dict[Tuple[str, int, Any], List[Any]] = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                if window is None and len(self._windows) >= self.max_keys:
+                    self._evict_locked(now)
+                skipped = window[2] if window is not None else 0
+                window = self._windows[key] = [now, 0, skipped]
+            window[1] += 1
+            count = window[1]
+            if count > self.limit and (self.sample_every <= 0 or (count - self.limit) % self.sample_every):
+                window[2] += 1
+                self.suppressed += 1
+                return False
+            skipped, window[2] = window[2], 0
+        if skipped:
+            record.msg = f"{record.getMessage()} ({skipped} similar messages suppressed)"
+            record.args = None
+        return True
+
+    def _evict_locked(self, now: float) -> None:
+        # 集計期間の過ぎたキーを捨てる (f-string のメッセージなどでキーが増え続けないように)
+        for key in [k for k, w in self._windows.items() if now - w[0] >= self.interval]:
+            del self._windows[key]
+        if len(self._windows) >= self.max_keys:
+            self._windows.clear()
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """
+    ログレコードをキューに入れるだけのハンドラ。書式化 (JSON 化、例外の整形) と出力は
+    QueueListener のスレッドで行い、出力先の詰まりでリクエストの処理を止めない。
+    キューが満杯の場合は待たずに捨て、件数を数える。
+    """
+
+    def __init__(self, log_queue: "queue.Queue[Any]") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._reported = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 引数のオブジェクトが後で変更されても内容が変わらないよう、%-形式の展開だけはここで行う
+        # (例外は exc_info のまま渡し、JsonFormatter が別の項目として出力できるようにする)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.dropped != self._reported:
+                dropped, self._reported = self.dropped, self.dropped
+                self.queue.put_nowait(logging.makeLogRecord({
+                    "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": f"{dropped} log records dropped so far (log queue full)",
+                }))
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogQueueListener(logging.handlers.QueueListener):
+    """キューのログを出力するスレッド"""
+
+    def __init__(self, log_queue: "queue.Queue[Any]", *handlers: logging.Handler,
+                 respect_handler_level: bool = False) -> None:
+        super().__init__(log_queue, *handlers, respect_handler_level=respect_handler_level)
+        self.log_queue = log_queue
+
+    def enqueue_sentinel(self) -> None:
+        # 停止時はキューが満杯でも待つ (出力スレッドが取り出すため、いずれ空きができる)。
+        # 終了の目印は QueueListener と同じ None
+        self.log_queue.put(None)
+
+
+_log_queue_handler: Optional[LogQueueHandler] = None
+_log_listener: Optional[LogQueueListener] = None
+_log_rate_limiter: Optional[LogRateLimiter] = None
+
+
+def _start_log_listener(log_queue: "queue.Queue[Any]", output: logging.Handler) -> None:
+    global _log_listener
+    _log_listener = LogQueueListener(log_queue, output, respect_handler_level=True)
+    _log_listener.start()
+
+
+def _stop_log_listener() -> None:
+    """キューに残ったログを出力してから出力スレッドを止める"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+def _restart_log_listener_after_fork() -> None:
+    # 出力スレッドは fork 後の子プロセスに引き継がれず、キューのロックも保持されたままの可能性があるため作り直す
+    global _log_listener
+    if _log_queue_handler is None or _log_listener is None:
+        return
+    output = _log_listener.handlers[0]
+    log_queue: "queue.Queue[Any]" = queue.Queue(LOG_QUEUE_SIZE)
+    _log_queue_handler.queue = log_queue
+    _start_log_listener(log_queue, output)
+
+
+os.register_at_fork(after_in_child=_restart_log_listener_after_fork)
+atexit.register(_stop_log_listener)
+
+
+def logging_stats() -> Dict[str, Any]:
+    """運用確認用: ログキューの滞留・破棄件数と、レート制限で見送った件数"""
+    handler = _log_queue_handler
+    return {
+        "queued": handler.queue.qsize() if handler is not None else 0,  # type: ignore[attr-defined]
+        "dropped": handler.dropped if handler is not None else 0,
+        "suppressed": _log_rate_limiter.suppressed if _log_rate_limiter is not None else 0,
+    }
+
+
 def setup_logging() -> None:
-    """ロギングを設定する"""
+    """
+    ロギングを設定する
+
+    LOG_QUEUE_SIZE > 0 の場合、ログはキューを経由してバックグラウンドのスレッドが書式化・出力する。
+    LOG_RATE_LIMIT > 0 の場合、同じメッセージが大量に出力されるときは間引く。
+    """
+    global _log_queue_handler, _log_rate_limiter
     level = getattr(logging, LOG_LEVEL, logging.INFO)
 
     # ルートロガーの設定
     root_logger = logging.getLogger()
     root_logger.setLevel(level)
 
-    # 既存のハンドラをクリア
+    # 既存のハンドラをクリア (再設定時は出力スレッドも止める)
+    _stop_log_listener()
     root_logger.handlers.clear()
 
     # コンソールハンドラの設定
@@ -64,7 +312,24 @@ def setup_logging() -> None:
         )
 
     handler.setFormatter(formatter)
-    root_logger.addHandler(handler)
+
+    # リクエストのスレッドではキューに入れるだけにする
+    entry: logging.Handler = handler
+    _log_queue_handler = None
+    if LOG_QUEUE_SIZE > 0:
+        log_queue: "queue.Queue[Any]" = queue.Queue(LOG_QUEUE_SIZE)
+        _log_queue_handler = LogQueueHandler(log_queue)
+        _log_queue_handler.setLevel(level)
+        _start_log_listener(log_queue, handler)
+        entry = _log_queue_handler
+
+    # 大量に出力されるメッセージの間引き (キューに入れる前に判定する)
+    _log_rate_limiter = None
+    if LOG_RATE_LIMIT > 0:
+        _log_rate_limiter = LogRateLimiter(LOG_RATE_LIMIT, LOG_RATE_INTERVAL, LOG_SAMPLE_EVERY)
+        entry.addFilter(_log_rate_limiter)
+
+    root_logger.addHandler(entry)
 
     # サードパーティライブラリのログレベル調整
     logging.getLogger("werkzeug").setLevel(logging.WARNING)
@@ -94,4 +359,14 @@ def validate_config() -> Tuple[bool, List[str]]:
     if not os.path.exists(PROJECTS_CSV_PATH):
         errors.append(f"Projects CSV not found: {PROJECTS_CSV_PATH}")
 
+    if DELIVERY_MODE not in ("sync", "async"):
+        errors.append(f"Invalid DELIVERY_MODE: {DELIVERY_MODE}")
+
+    if MENTION_RESOLVE_RULE not in ("", "login", "email"):
+        errors.append(f"Invalid MENTION_RESOLVE_RULE: {MENTION_RESOLVE_RULE}")
+
+    for name, url in RC_INSTANCES.items():
+        if not url:
+            errors.append(f"RC_INSTANCES: webhook URL for '{name}' is not set")
+
     return len(errors) == 0, errors
\ No newline at end of file
@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+V = TypeVar('V')
+
+
+class _InFlight(Generic[V]):
+    """同一キーに対する実行中のロード処理 (single-flight 用)"""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Optional[V] = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache(Generic[V]):
+    """
+    サイズ上限 (LRU 追い出し) と有効期限付きのスレッドセーフなキャッシュ。
+
+    - ロード結果が None の場合は negative_ttl の間だけ「見つからない」ことを記憶する
+    - get_or_load は同一キーの同時ロードを 1 回にまとめる (single-flight)
+    """
+    maxsize: int
+    ttl: float
+    negative_ttl: float
+
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data: "OrderedDict[str, Tuple[Optional[V], float]]" = OrderedDict()
+        self._inflight: Dict[str, _InFlight[V]] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._negative_hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+
+    def lookup(self, key: str) -> Tuple[bool, Optional[V]]:
+        """
+        キャッシュを参照する
+
+        Returns:
+            (found, value): negative エントリの場合は (True, None)
+        """
+        with self._lock:
+            return self._lookup_locked(key)
+
+    def _lookup_locked(self, key: str) -> Tuple[bool, Optional[V]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        if value is None:
+            self._negative_hits += 1
+        else:
+            self._hits += 1
+        return True, value
+
+    def set(self, key: str, value: Optional[V], ttl: Optional[float] = None) -> None:
+        """値を格納する。value が None の場合は negative エントリとなる"""
+        if ttl is None:
+            ttl = self.ttl if value is not None else self.negative_ttl
+        with self._lock:
+            self._set_locked(key, value, ttl)
+
+    def _set_locked(self, key: str, value: Optional[V], ttl: float) -> None:
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self._evictions += 1
+
+    def add(self, key: str, value: V, ttl: Optional[float] = None) -> bool:
+        """
+        キーが無い (または期限切れ) 場合のみ値を格納する
+
+        Returns:
+            格納した場合 True、既に有効なエントリがあった場合 False
+        """
+        with self._lock:
+            found, _ = self._lookup_locked(key)
+            if found:
+                return False
+            self._misses += 1
+            self._set_locked(key, value, self.ttl if ttl is None else ttl)
+            return True
+
+    def discard(self, key: str) -> None:
+        """エントリを削除する (無ければ何もしない)"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def get_or_load(self, key: str, loader: Callable[[], Optional[V]]) -> Optional[V]:
+        """
+        キャッシュに無ければ loader を呼んで値を取得・格納する。
+        同じキーのロードが実行中であれば、その結果を待って共有する。
+        loader が例外を送出した場合は何も格納せず、待っていた呼び出しにも同じ例外を送出する。
+        """
+        with self._lock:
+            found, value = self._lookup_locked(key)
+            if found:
+                return value
+            self._misses += 1
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self._coalesced += 1
+                leader = False
+            else:
+                inflight = _InFlight()
+                self._inflight[key] = inflight
+                leader = True
+
+        if not leader:
+            inflight.done.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.value
+
+        try:
+            inflight.value = loader()
+        except BaseException as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                if inflight.error is None:
+                    ttl = self.ttl if inflight.value is not None else self.negative_ttl
+                    self._set_locked(key, inflight.value, ttl)
+                del self._inflight[key]
+            inflight.done.set()
+        return inflight.value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット率などの統計情報を返す"""
+        with self._lock:
+            lookups = self._hits + self._negative_hits + self._misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self._hits,
+                "negative_hits": self._negative_hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "evictions": self._evictions,
+                "hit_ratio": round((self._hits + self._negative_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    # dict 互換のアクセス (テストや運用時の手動投入用)
+    def __setitem__(self, key: str, value: V) -> None:
+        self.set(key, value)
+
+    def __getitem__(self, key: str) -> V:
+        found, value = self.lookup(key)
+        if not found or value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        found, value = self.lookup(key)
+        return found and value is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict
+import config
+from .metrics import CIRCUIT_REJECTED, CIRCUIT_STATE
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATES = (CLOSED, OPEN, HALF_OPEN)
+
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いているため呼び出しを行わなかった"""
+
+    def __init__(self, name: str) -> None:
+        super().__init__(f"Circuit breaker for {name} is open")
+        self.name = name
+
+
+def is_healthy_status(status_code: int) -> bool:
+    """応答ステータスが依存先の正常動作を示すか (4xx は呼び出し側の問題として成功扱い)"""
+    return status_code < 500 and status_code != 429
+
+
+class CircuitBreaker:
+    """
+    外部 API ごとのサーキットブレーカー (closed / open / half_open)。
+
+    - closed: 直近 window 件の呼び出しの失敗率 (遅延呼び出しを含む) が failure_rate 以上になると open
+    - open: open_seconds の間は呼び出しを行わず即座に拒否する
+    - half_open: half_open_calls 件だけ試行し、すべて成功すれば closed、1 件でも失敗すれば open に戻る
+
+    allow() が True を返した呼び出しは、必ず record() で結果を記録すること。
+    """
+    name: str
+    failure_rate: float
+    minimum_calls: int
+    slow_call_seconds: float
+    open_seconds: float
+    half_open_calls: int
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        minimum_calls: int = 10,
+        window: int = 20,
+        slow_call_seconds: float = 0.0,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.name = name
+        self.failure_rate = failure_rate
+        self.minimum_calls = minimum_calls
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = max(1, half_open_calls)
+        self._clock = clock
+        # 直近の呼び出し結果 (True = 失敗)
+        self._results: Deque[bool] = deque(maxlen=max(window, minimum_calls, 1))
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._rejected = 0
+        self._opened = 0
+        self._publish_state()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open_locked()
+            return self._state
+
+    def allow(self) -> bool:
+        """呼び出してよいかを判定する (half_open では試行枠を 1 件確保する)"""
+        with self._lock:
+            self._maybe_half_open_locked()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            self._rejected += 1
+        CIRCUIT_REJECTED.inc(self.name)
+        return False
+
+    def available(self) -> bool:
+        """
+        allow() が True を返すかを、試行枠を確保せずに返す
+        (False の場合は呼び出しを見送るものとして拒否件数に数える)
+        """
+        with self._lock:
+            self._maybe_half_open_locked()
+            if self._state == CLOSED or (self._state == HALF_OPEN and self._probes < self.half_open_calls):
+                return True
+            self._rejected += 1
+        CIRCUIT_REJECTED.inc(self.name)
+        return False
+
+    def record(self, success: bool, elapsed: float = 0.0) -> None:
+        """呼び出し結果を記録する。slow_call_seconds 以上かかった呼び出しは失敗として扱う"""
+        failed = not success or (self.slow_call_seconds > 0 and elapsed >= self.slow_call_seconds)
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if failed:
+                    self._open_locked(f"probe failed ({elapsed:.2f}s)")
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._transition_locked(CLOSED)
+                        logger.info("Circuit breaker for %s closed", self.name)
+                return
+            if self._state == OPEN:
+                # 遮断前に開始した呼び出しの結果は判定に使わない
+                return
+            self._results.append(failed)
+            if self.failure_rate <= 0 or len(self._results) < self.minimum_calls:
+                return
+            rate = sum(self._results) / len(self._results)
+            if rate >= self.failure_rate:
+                self._open_locked(f"failure rate {rate:.0%} over last {len(self._results)} calls")
+
+    def retry_after(self) -> float:
+        """次に試行を再開するまでの秒数 (open 以外では 0)"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.open_seconds - self._clock())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open_locked()
+            failures = sum(self._results)
+            return {
+                "state": self._state,
+                "failure_rate": round(failures / len(self._results), 4) if self._results else 0.0,
+                "calls": len(self._results),
+                "opened": self._opened,
+                "rejected": self._rejected,
+                "retry_after": round(max(0.0, self._opened_at + self.open_seconds - self._clock()), 1)
+                if self._state == OPEN else 0.0,
+            }
+
+    def _maybe_half_open_locked(self) -> None:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._transition_locked(HALF_OPEN)
+            logger.info("Circuit breaker for %s half-open, probing", self.name)
+
+    def _open_locked(self, reason: str) -> None:
+        self._opened_at = self._clock()
+        self._opened += 1
+        self._transition_locked(OPEN)
+        logger.warning("Circuit breaker for %s opened: %s (retry in %gs)", self.name, reason, self.open_seconds)
+
+    def _transition_locked(self, state: str) -> None:
+        self._state = state
+        self._results.clear()
+        self._probes = 0
+        self._probe_successes = 0
+        self._publish_state()
+
+    def _publish_state(self) -> None:
+        for state in STATES:
+            CIRCUIT_STATE.set(1.0 if state == self._state else 0.0, self.name, state)
+
+
+def build_breaker(name: str) -> CircuitBreaker:
+    """設定値からサーキットブレーカーを構築する"""
+    return CircuitBreaker(
+        name,
+        failure_rate=config.CIRCUIT_FAILURE_RATE,
+        minimum_calls=config.CIRCUIT_MIN_CALLS,
+        window=config.CIRCUIT_WINDOW,
+        slow_call_seconds=config.CIRCUIT_SLOW_CALL,
+        open_seconds=config.CIRCUIT_OPEN_SECONDS,
+        half_open_calls=config.CIRCUIT_HALF_OPEN_CALLS
+    )
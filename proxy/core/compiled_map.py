@@ -0,0 +1,204 @@
+import fcntl
+import json
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence
+
+# ファイル形式 (ヘッダー、メタデータの JSON、対応表の並び。各区画は 4 バイト境界に揃える)
+#   ヘッダー: マジック, バイト順の確認値, メタデータの長さ, 対応表の数
+#   対応表: 件数, スロット数, 文字列領域の長さ
+#           スロット (uint32 x スロット数。crc32 で引く開番地法のハッシュ表。値は項目の番号 + 1、0 は空き)
+#           項目 (uint32 x 4 x 件数。キーの位置と長さ、値の位置と長さ。キーの UTF-8 の順に並べる)
+#           文字列領域 (キーと値の UTF-8)
+_MAGIC = b"WPXMAP01"
+_BYTE_ORDER = 0x01020304  # 作成したマシンと同じバイト順の場合だけ読み込む
+_HEADER = struct.Struct("=8sIII")
+_TABLE = struct.Struct("=III")
+_ITEM_FIELDS = 4
+
+
+class CompiledMapError(ValueError):
+    """コンパイル済みの対応表のファイルが壊れている、または形式が異なる場合の例外"""
+
+
+def _pad(size: int) -> bytes:
+    return b"\0" * (-size % 4)
+
+
+def _encode_table(mapping: Mapping[str, str]) -> bytes:
+    items = sorted((key.encode("utf-8"), value.encode("utf-8")) for key, value in mapping.items())
+    slot_count = 8
+    while slot_count < len(items) * 2:  # 負荷率を 1/2 以下に保ち、探索の平均を 1〜2 スロットにする
+        slot_count *= 2
+    mask = slot_count - 1
+
+    slots = array("I", bytes(4 * slot_count))
+    entries = array("I")
+    blob = bytearray()
+    for number, (key, value) in enumerate(items, 1):
+        entries.extend((len(blob), len(key), len(blob) + len(key), len(value)))
+        blob += key
+        blob += value
+        slot = zlib.crc32(key) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = number
+    blob += _pad(len(blob))
+    return _TABLE.pack(len(items), slot_count, len(blob)) + slots.tobytes() + entries.tobytes() + bytes(blob)
+
+
+def write_compiled(path: str, tables: Sequence[Mapping[str, str]], meta: Dict[str, Any]) -> None:
+    """
+    文字列から文字列への対応表を、mmap してそのまま引けるバイナリ形式で書き出す。
+    一時ファイルに書いてから置き換えるため、読み込み中のプロセスが途中の状態を見ることはない
+    (置き換え前のファイルを mmap しているプロセスは、閉じるまで古い内容を参照し続ける)。
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _BYTE_ORDER, len(meta_bytes), len(tables)))
+            f.write(meta_bytes + _pad(len(meta_bytes)))
+            for table in tables:
+                f.write(_encode_table(table))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class CompiledMap(Mapping[str, str]):
+    """
+    mmap したファイル上の対応表 (読み取り専用)。
+    キーと値を Python のオブジェクトとして展開しないため、fork したワーカー間でページが共有され、
+    検索しても (辞書の参照カウントの更新のように) ページが複製されることはない。
+    """
+    __slots__ = ("_data", "_slots", "_entries", "_blob", "_mask", "_count", "end")
+
+    def __init__(self, data: mmap.mmap, offset: int) -> None:
+        if len(data) < offset + _TABLE.size:
+            raise CompiledMapError("truncated table header")
+        self._count, slot_count, blob_size = _TABLE.unpack_from(data, offset)
+        if slot_count & (slot_count - 1) or slot_count < self._count:
+            raise CompiledMapError(f"invalid slot count: {slot_count}")
+        offset += _TABLE.size
+        entries_size = self._count * _ITEM_FIELDS * 4
+        self.end = offset + slot_count * 4 + entries_size + blob_size
+        if len(data) < self.end:
+            raise CompiledMapError("truncated table")
+        view = memoryview(data)
+        self._slots = view[offset:offset + slot_count * 4].cast("I")
+        offset += slot_count * 4
+        self._entries = view[offset:offset + entries_size].cast("I")
+        # 文字列は mmap から直接切り出す (memoryview の比較・変換より速い)。位置はファイルの先頭から
+        self._data = data
+        self._blob = offset + entries_size
+        self._mask = slot_count - 1
+
+    def _find(self, key: str) -> int:
+        """キーの項目の先頭位置を返す (無い場合は -1)"""
+        try:
+            encoded = key.encode("utf-8")
+        except UnicodeEncodeError:  # サロゲートを含む文字列は登録できないため一致しない
+            return -1
+        slots, entries, data, blob, mask = self._slots, self._entries, self._data, self._blob, self._mask
+        size = len(encoded)
+        slot = zlib.crc32(encoded) & mask
+        while True:
+            number = slots[slot]
+            if not number:
+                return -1
+            base = (number - 1) * _ITEM_FIELDS
+            if entries[base + 1] == size:
+                start = blob + entries[base]
+                if data[start:start + size] == encoded:
+                    return int(base)
+            slot = (slot + 1) & mask
+
+    def _value(self, base: int) -> str:
+        start = self._blob + self._entries[base + 2]
+        return self._data[start:start + self._entries[base + 3]].decode("utf-8")
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:  # type: ignore[override]
+        base = self._find(key)
+        return self._value(base) if base >= 0 else default
+
+    def __getitem__(self, key: str) -> str:
+        base = self._find(key)
+        if base < 0:
+            raise KeyError(key)
+        return self._value(base)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._find(key) >= 0
+
+    def __len__(self) -> int:
+        return int(self._count)
+
+    def __iter__(self) -> Iterator[str]:
+        entries, data = self._entries, self._data
+        for base in range(0, self._count * _ITEM_FIELDS, _ITEM_FIELDS):
+            start = self._blob + entries[base]
+            yield data[start:start + entries[base + 1]].decode("utf-8")
+
+
+class CompiledFile:
+    """コンパイル済みのファイルを mmap し、メタデータと対応表を読み出したもの"""
+    meta: Dict[str, Any]
+    tables: List[CompiledMap]
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # 空のファイル
+                raise CompiledMapError(f"invalid compiled mapping {path}: {e}") from e
+        # 対応表が mmap を参照するため、明示的には閉じない (参照が無くなれば解放される)
+        if len(buffer) < _HEADER.size:
+            raise CompiledMapError(f"invalid compiled mapping {path}: truncated header")
+        magic, byte_order, meta_size, table_count = _HEADER.unpack_from(buffer, 0)
+        if magic != _MAGIC:
+            raise CompiledMapError(f"invalid compiled mapping {path}: unknown format")
+        if byte_order != _BYTE_ORDER:
+            raise CompiledMapError(f"invalid compiled mapping {path}: built on a host with a different byte order")
+        offset = _HEADER.size
+        try:
+            self.meta = json.loads(buffer[offset:offset + meta_size].decode("utf-8"))
+        except ValueError as e:
+            raise CompiledMapError(f"invalid compiled mapping {path}: broken metadata") from e
+        offset += meta_size + len(_pad(meta_size))
+        self.tables = []
+        for _ in range(table_count):
+            try:
+                table = CompiledMap(buffer, offset)
+            except CompiledMapError as e:
+                raise CompiledMapError(f"invalid compiled mapping {path}: {e}") from e
+            self.tables.append(table)
+            offset = table.end
+
+
+@contextmanager
+def build_lock(path: str) -> Iterator[None]:
+    """
+    同じファイルをコンパイルするプロセス (ワーカー) を 1 つに絞るためのロック。
+    待っていたプロセスはロックを取得した後、他のプロセスがコンパイル済みでないかを確認し直す
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.lock", "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
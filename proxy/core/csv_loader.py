@@ -0,0 +1,54 @@
+import csv
+from typing import Dict, Iterator, List, Tuple
+
+
+class CsvFormatError(ValueError):
+    """
+    CSV の形式が不正 (空ファイル・列不足・列数不一致など) な場合の例外。
+    メッセージは「Users CSV ...」のようにファイル種別を前置して使う。
+    """
+
+
+def iter_csv_rows(path: str, required_cols: List[str]) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    CSV を 1 行ずつ読み込み、(行番号, 行データ) を返すジェネレーター。
+    ファイル全体をメモリに展開しない。
+
+    Raises:
+        CsvFormatError: ヘッダーが無い、必須列が欠けている、列数が合わない場合
+    """
+    # utf-8-sig: Excel 等で保存された BOM 付き UTF-8 にも対応する
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            raise CsvFormatError(f"file is empty: {path}")
+
+        columns = [col.strip() for col in header]
+        missing = set(required_cols) - set(columns)
+        if missing:
+            raise CsvFormatError(f"missing required columns: {missing}")
+
+        for row in reader:
+            # 空行は読み飛ばす
+            if not row or all(not cell.strip() for cell in row):
+                continue
+            if len(row) > len(columns):
+                raise CsvFormatError(
+                    f"has {len(row)} fields in line {reader.line_num}, expected {len(columns)}"
+                )
+            yield reader.line_num, dict(zip(columns, (cell.strip() for cell in row)))
+
+
+def load_csv_mapping(path: str, key_col: str, value_col: str) -> Dict[str, str]:
+    """
+    2 列の対応表を CSV から辞書として読み込む。
+    キーまたは値が空の行は無視し、キーが重複する場合は後の行を優先する。
+    """
+    mapping: Dict[str, str] = {}
+    for _, row in iter_csv_rows(path, [key_col, value_col]):
+        key = row.get(key_col, '')
+        value = row.get(value_col, '')
+        if key and value:
+            mapping[key] = value
+    return mapping
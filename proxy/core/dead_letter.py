@@ -0,0 +1,237 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    instance TEXT NOT NULL DEFAULT '',
+    project TEXT,
+    alias TEXT NOT NULL,
+    text TEXT NOT NULL,
+    error TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    locked_until REAL NOT NULL DEFAULT 0,
+    replayed_at REAL
+)
+"""
+
+_INDEX = "CREATE INDEX IF NOT EXISTS idx_dead_letters_pending ON dead_letters (replayed_at, created_at)"
+
+# 配送元 (Webhook のリクエスト内で配送した場合と、非同期配送モードの Spool から配送した場合)
+SOURCE_WEBHOOK = "webhook"
+SOURCE_SPOOL = "spool"
+# 複数の送信先のうち失敗した送信先 (送信先ごとのキーで保存し、再送時にイベント単位の重複判定を行わない)
+SOURCE_FANOUT = "fanout"
+
+_COLUMNS = "id, key, source, channel, project, alias, text, error, attempts, created_at, instance"
+
+
+class DeadLetter(NamedTuple):
+    """配送に失敗した通知 (組み立て済みのメッセージと送信先)"""
+    id: int
+    key: str
+    source: str
+    channel: str
+    project: Optional[str]
+    alias: str
+    text: str
+    error: str
+    attempts: int
+    created_at: float
+    instance: str  # 送信先の Rocket.Chat インスタンス (空の場合は RC_WEBHOOK_URL)
+
+
+class DeadLetterFilter(NamedTuple):
+    """再送する通知の条件 (指定の無い項目は絞り込まない)"""
+    since: Optional[float] = None  # 最初に失敗した時刻 (UNIX 時刻) の範囲
+    until: Optional[float] = None
+    channels: Sequence[str] = ()
+    instances: Sequence[str] = ()
+    projects: Sequence[str] = ()
+    exclude_errors: Sequence[str] = ()  # このエラーで失敗したものは除く
+
+
+def _where(filters: DeadLetterFilter, now: float) -> Tuple[str, List[Any]]:
+    """未再送かつリースされていない通知のうち、条件に一致するものを選ぶ WHERE 句"""
+    conditions = ["replayed_at IS NULL", "locked_until <= ?"]
+    params: List[Any] = [now]
+    if filters.since is not None:
+        conditions.append("created_at >= ?")
+        params.append(filters.since)
+    if filters.until is not None:
+        conditions.append("created_at < ?")
+        params.append(filters.until)
+    for clause, values in (
+        ("channel IN", filters.channels), ("instance IN", filters.instances), ("project IN", filters.projects),
+        ("error NOT IN", filters.exclude_errors)
+    ):
+        if values:
+            conditions.append(f"{clause} ({', '.join('?' * len(values))})")
+            params.extend(values)
+    return " AND ".join(conditions), params
+
+
+class DeadLetterStore:
+    """
+    配送に失敗した通知を保存する SQLite (WAL) ファイル。
+
+    同じイベント (重複判定キー) の失敗は 1 行にまとめて試行回数を加算する。
+    再送は Spool と同じリース方式で取り出すため、複数の再送処理を同時に実行しても
+    同じ通知を二重に送らない。再送済みの行は replayed_at を記録して残し、以降は取り出さない。
+    """
+    path: str
+    lease_seconds: float
+
+    def __init__(self, path: str, lease_seconds: float = 300.0) -> None:
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        conn.execute(_SCHEMA)
+        conn.execute(_INDEX)
+        # instance 列の無い (複数の送信先に対応する前の) ファイルに列を追加する
+        if "instance" not in {row[1] for row in conn.execute("PRAGMA table_info(dead_letters)")}:
+            conn.execute("ALTER TABLE dead_letters ADD COLUMN instance TEXT NOT NULL DEFAULT ''")
+
+    def _conn(self) -> sqlite3.Connection:
+        """スレッドごとの接続を返す (sqlite3 接続はスレッド間で共有しない)"""
+        conn: Optional[sqlite3.Connection] = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(
+        self,
+        key: str,
+        source: str,
+        channel: str,
+        project: Optional[str],
+        alias: str,
+        text: str,
+        error: str,
+        attempts: int = 1,
+        instance: str = ""
+    ) -> None:
+        """配送に失敗した通知を記録する (同じキーは最新のメッセージ・エラーで更新する)"""
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO dead_letters "
+            "(key, source, channel, instance, project, alias, text, error, attempts, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET channel = excluded.channel, instance = excluded.instance, "
+            "alias = excluded.alias, text = excluded.text, error = excluded.error, "
+            "attempts = attempts + excluded.attempts, updated_at = excluded.updated_at",
+            (key, source, channel, instance, project, alias, text, error, attempts, now, now)
+        )
+
+    def claim(
+        self,
+        limit: int,
+        filters: Optional[DeadLetterFilter] = None,
+        updated_before: Optional[float] = None
+    ) -> List[DeadLetter]:
+        """
+        未再送の通知を古い順に最大 limit 件リースして取り出す
+
+        Args:
+            filters: 取り出す通知の条件
+            updated_before: この時刻以降に失敗 (または再送に失敗) したものは取り出さない
+                (1 回の再送処理で同じ通知を繰り返し送らないため)
+        """
+        now = time.time()
+        where, params = _where(filters or DeadLetterFilter(), now)
+        if updated_before is not None:
+            where += " AND updated_at < ?"
+            params.append(updated_before)
+
+        conn = self._conn()
+        # BEGIN IMMEDIATE で書き込みロックを取り、再送処理間の二重取得を防ぐ
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM dead_letters WHERE {where} ORDER BY created_at, id LIMIT ?",
+                params + [limit]
+            ).fetchall()
+            conn.executemany(
+                "UPDATE dead_letters SET locked_until = ? WHERE id = ?",
+                [(now + self.lease_seconds, row[0]) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [DeadLetter(*row) for row in rows]
+
+    def count_by_channel(self, filters: Optional[DeadLetterFilter] = None) -> List[Tuple[str, int]]:
+        """
+        条件に一致する未再送の通知数を送信先ごとに返す (取り出しは行わない)。
+        追加の Rocket.Chat インスタンス宛ては「インスタンス名:チャンネル」とする
+        """
+        where, params = _where(filters or DeadLetterFilter(), time.time())
+        rows = self._conn().execute(
+            "SELECT CASE instance WHEN '' THEN channel ELSE instance || ':' || channel END AS destination, "
+            f"COUNT(*) FROM dead_letters WHERE {where} GROUP BY destination ORDER BY 2 DESC",
+            params
+        ).fetchall()
+        return [(str(channel), int(count)) for channel, count in rows]
+
+    def mark_replayed(self, letter_id: int) -> None:
+        """再送できた通知を記録し、以降は取り出さない"""
+        self._conn().execute(
+            "UPDATE dead_letters SET replayed_at = ?, locked_until = 0 WHERE id = ?",
+            (time.time(), letter_id)
+        )
+
+    def release(self, letter_id: int, error: Optional[str] = None) -> None:
+        """
+        リースを解除して再送対象に戻す。error を指定した場合は再送の失敗として試行回数を加算する。
+        いずれも更新時刻を進め、同じ再送処理 (claim の updated_before) では再び取り出さない
+        """
+        if error is None:
+            self._conn().execute(
+                "UPDATE dead_letters SET locked_until = 0, updated_at = ? WHERE id = ?", (time.time(), letter_id)
+            )
+            return
+        self._conn().execute(
+            "UPDATE dead_letters SET locked_until = 0, attempts = attempts + 1, error = ?, "
+            "updated_at = ? WHERE id = ?",
+            (error, time.time(), letter_id)
+        )
+
+    def pending_count(self) -> int:
+        """未再送の通知数を返す"""
+        row = self._conn().execute("SELECT COUNT(*) FROM dead_letters WHERE replayed_at IS NULL").fetchone()
+        return int(row[0])
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        pending, oldest = conn.execute(
+            "SELECT COUNT(*), MIN(created_at) FROM dead_letters WHERE replayed_at IS NULL"
+        ).fetchone()
+        replayed = conn.execute("SELECT COUNT(*) FROM dead_letters WHERE replayed_at IS NOT NULL").fetchone()[0]
+        return {
+            "pending": int(pending),
+            "replayed": int(replayed),
+            "oldest_pending_age": round(time.time() - oldest, 1) if oldest is not None else None,
+        }
+
+    def close(self) -> None:
+        conn: Optional[sqlite3.Connection] = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import threading
+import time
+import logging
+from typing import Optional, Protocol
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# 期限切れ・上限超過のエントリを掃除する間隔 (追加回数)
+_PURGE_EVERY = 500
+
+
+class SeenSet(Protocol):
+    """処理済み (または処理中) の Webhook を記憶する集合"""
+
+    def add(self, key: str) -> bool:
+        """未登録なら登録して True、登録済み (重複) なら False を返す"""
+        ...
+
+    def discard(self, key: str) -> None:
+        """登録を取り消す (確実に配送できなかった場合に再送を受け付けるため)"""
+        ...
+
+
+class LocalSeenSet:
+    """ワーカー内のみの SeenSet (サイズ上限付き LRU + TTL)"""
+
+    def __init__(self, ttl: float, maxsize: int) -> None:
+        self._cache: TTLCache[bool] = TTLCache(maxsize=maxsize, ttl=ttl, negative_ttl=ttl)
+
+    def add(self, key: str) -> bool:
+        return self._cache.add(key, True)
+
+    def discard(self, key: str) -> None:
+        self._cache.discard(key)
+
+
+class SharedSeenSet:
+    """
+    同一ノード上の全ワーカーで共有する SeenSet (SQLite WAL)。
+
+    登録は 1 文の UPSERT で行うため、複数のワーカーに同時に届いた再送でも
+    配送されるのは 1 件だけとなる。SQLite にアクセスできない場合は
+    メッセージを失わないよう「未登録」として扱う。
+    """
+    path: str
+    ttl: float
+    maxsize: int
+
+    def __init__(self, path: str, ttl: float, maxsize: int) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._adds = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        """スレッドごとの接続を返す (sqlite3 接続はスレッド間で共有しない)"""
+        conn: Optional[sqlite3.Connection] = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, key: str) -> bool:
+        now = time.time()
+        try:
+            conn = self._conn()
+            # 期限切れのエントリがある場合のみ上書きする (有効なエントリがあれば変更なし = 重複)
+            cursor = conn.execute(
+                """
+                INSERT INTO seen (key, expires_at) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at
+                WHERE seen.expires_at <= ?
+                """,
+                (key, now + self.ttl, now)
+            )
+            added = cursor.rowcount == 1
+            with self._lock:
+                self._adds += 1
+                purge = self._adds % _PURGE_EVERY == 0
+            if purge:
+                self._purge(conn, now)
+            return added
+        except sqlite3.Error as e:
+            logger.warning("Seen-set write failed, treating webhook as new: %s", e)
+            return True
+
+    def _purge(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM seen WHERE expires_at <= ?", (now,))
+        # 上限を超えた場合は期限の近いものから削除する
+        conn.execute(
+            "DELETE FROM seen WHERE key IN ("
+            " SELECT key FROM seen ORDER BY expires_at"
+            " LIMIT max(0, (SELECT count(*) FROM seen) - ?))",
+            (self.maxsize,)
+        )
+
+    def discard(self, key: str) -> None:
+        try:
+            self._conn().execute("DELETE FROM seen WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning("Seen-set delete failed: %s", e)
+
+    def close(self) -> None:
+        conn: Optional[sqlite3.Connection] = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def build_seen_set(path: str, ttl: float, maxsize: int) -> Optional[SeenSet]:
+    """設定に応じた SeenSet を返す (ttl が 0 以下の場合は重複排除なし)"""
+    if ttl <= 0:
+        return None
+    if path:
+        return SharedSeenSet(path, ttl, maxsize)
+    return LocalSeenSet(ttl, maxsize)
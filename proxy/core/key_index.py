@@ -0,0 +1,61 @@
+import unicodedata
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+# 別名の列の区切り文字 (例: "田中 太郎|Taro Tanaka")
+ALIAS_SEPARATOR = "|"
+
+
+def normalize_key(value: str) -> str:
+    """
+    表記ゆれを吸収した照合用のキーを返す。
+    NFKC 正規化 (全角英数字・記号・スペースを半角に、半角カナを全角に)、
+    前後の空白の除去と連続する空白の 1 つへの置き換え、大文字小文字の同一視 (casefold) を行う
+    """
+    return " ".join(unicodedata.normalize("NFKC", value).split()).casefold()
+
+
+def split_aliases(value: str) -> List[str]:
+    """別名の列を区切り文字で分割する (空の要素は除く)"""
+    return [alias.strip() for alias in value.split(ALIAS_SEPARATOR) if alias.strip()]
+
+
+class KeyIndex(NamedTuple):
+    """正規化したキーから値への索引と、読み込み時に検出した衝突の説明"""
+    keys: Mapping[str, str]
+    conflicts: Tuple[str, ...] = ()
+
+    def get(self, key: str) -> Optional[str]:
+        return self.keys.get(normalize_key(key)) if self.keys else None
+
+
+def build_index(entries: Iterable[Tuple[str, str]], label: str) -> KeyIndex:
+    """
+    (キーまたは別名, 値) の並びから、正規化したキーの索引を作る。
+
+    異なる値を指すキーが同じ正規化キーになる場合は衝突として索引から除き、内容を記録する
+    (どちらに解決すべきか決められないため。表記が完全に一致する検索には影響しない)。
+    """
+    index: Dict[str, str] = {}
+    keys: Dict[str, List[str]] = {}
+    conflicted: Dict[str, None] = {}
+    for key, value in entries:
+        normalized = normalize_key(key)
+        if not normalized:
+            continue
+        if normalized not in index:
+            index[normalized] = value
+            keys[normalized] = [key]
+            continue
+        if key not in keys[normalized]:
+            keys[normalized].append(key)
+        if index[normalized] != value:
+            conflicted[normalized] = None
+
+    for normalized in conflicted:
+        del index[normalized]
+    conflicts = tuple(
+        f"{label}: {', '.join(repr(key) for key in keys[normalized])} match each other after normalization "
+        f"('{normalized}') but map to different values; exact matches only"
+        for normalized in conflicted
+    )
+    return KeyIndex(index, conflicts)
@@ -1,62 +1,357 @@
+import csv
 import os
-import pandas as pd
 import logging
-from typing import Dict, Optional
+import threading
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
 import config
+from .compiled_map import CompiledFile, CompiledMapError, build_lock, write_compiled
+from .csv_loader import CsvFormatError, iter_csv_rows
+from .key_index import KeyIndex, build_index, split_aliases
+from .templates import MessageTemplate, TemplateSet, load_templates
 
 logger = logging.getLogger(__name__)
 
+# ファイルの変更検知に使う (inode, mtime_ns, size)。ファイルが無い場合は None
+FileSignature = Optional[Tuple[int, int, int]]
+
+# コンパイル済みのユーザー対応表の形式 (読み込み・正規化の処理を変えたら上げ、古いファイルを作り直させる)
+USERS_SNAPSHOT_VERSION = 1
+
+
+class Destination(NamedTuple):
+    """通知の送信先 (instance が空の場合は RC_WEBHOOK_URL の Rocket.Chat)"""
+    channel: str
+    instance: str = ""
+
+    @property
+    def label(self) -> str:
+        return f"{self.instance}:{self.channel}" if self.instance else self.channel
+
+
+class MappingSnapshot(NamedTuple):
+    """
+    読み込み済みマッピングの不変スナップショット (参照の差し替えで一括更新する)。
+    *_index は表記ゆれ・別名の照合用で、表記が完全に一致しなかった場合にだけ引く
+    """
+    users_map: Mapping[str, str]  # USERS_SNAPSHOT_PATH を設定した場合は mmap したコンパイル済みの対応表
+    users_index: KeyIndex
+    projects_map: Dict[str, str]  # プロジェクトごとの最初の送信先チャンネル
+    projects_index: KeyIndex  # 正規化したプロジェクト名・別名から projects.csv の識別子
+    destinations: Dict[str, Tuple[Destination, ...]]
+    templates: TemplateSet
+    signature: Tuple[FileSignature, FileSignature, FileSignature]
+
+
+def _file_signature(path: str) -> FileSignature:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def load_users(path: str) -> Tuple[Dict[str, str], List[Tuple[str, str]]]:
+    """
+    users.csv を読み込み、OpenProject の表示名から Rocket.Chat のユーザー名への対応と、
+    aliases 列 (任意、| 区切り) の (別名, Rocket.Chat のユーザー名) を返す。
+    キーが重複する場合は後の行を優先する。
+    """
+    users_map: Dict[str, str] = {}
+    aliases: List[Tuple[str, str]] = []
+    for _, row in iter_csv_rows(path, ['openproject_user', 'rocketchat_user']):
+        op_user = row.get('openproject_user', '')
+        rc_user = row.get('rocketchat_user', '')
+        if op_user and rc_user:
+            users_map[op_user] = rc_user
+            aliases.extend((alias, rc_user) for alias in split_aliases(row.get('aliases', '')))
+    return users_map, aliases
+
+
+def load_destinations(path: str) -> Tuple[Dict[str, Tuple[Destination, ...]], List[Tuple[str, str]]]:
+    """
+    projects.csv からプロジェクトごとの送信先と、aliases 列 (任意、| 区切り) の (別名, 識別子) を読み込む。
+    同じプロジェクトの行が複数ある場合はすべての送信先に配信する (同じ送信先の重複は除く)。
+    rc_instance 列 (任意) には RC_INSTANCES に定義した Rocket.Chat インスタンスの名前を指定する。
+
+    Raises:
+        CsvFormatError: CSV の形式が不正な場合、未定義のインスタンスを指定した場合
+    """
+    destinations: Dict[str, List[Destination]] = {}
+    aliases: List[Tuple[str, str]] = []
+    for line_num, row in iter_csv_rows(path, ['project_identifier', 'rc_channel']):
+        project = row.get('project_identifier', '')
+        channel = row.get('rc_channel', '')
+        if not project or not channel:
+            continue
+        aliases.extend((alias, project) for alias in split_aliases(row.get('aliases', '')))
+        instance = row.get('rc_instance', '')
+        if instance and instance not in config.RC_INSTANCES:
+            raise CsvFormatError(f"unknown rc_instance '{instance}' in line {line_num} (not in RC_INSTANCES)")
+        targets = destinations.setdefault(project, [])
+        if Destination(channel, instance) not in targets:
+            targets.append(Destination(channel, instance))
+    return {project: tuple(targets) for project, targets in destinations.items()}, aliases
+
+
+def _users_index(users_map: Dict[str, str], aliases: List[Tuple[str, str]]) -> KeyIndex:
+    return build_index(list(users_map.items()) + aliases, "Users CSV")
+
+
+def compile_users(csv_path: str, snapshot_path: str) -> CompiledFile:
+    """
+    users.csv を読み込み、完全一致の対応表と正規化した索引を snapshot_path にコンパイルして開く。
+    読み込み前の users.csv のシグネチャを記録し、以降の変更は古いファイルとして検知させる
+
+    Raises:
+        CsvFormatError: CSV の形式が不正な場合
+    """
+    signature = _file_signature(csv_path)
+    users_map, aliases = load_users(csv_path)
+    index = _users_index(users_map, aliases)
+    write_compiled(snapshot_path, [users_map, index.keys], {
+        "version": USERS_SNAPSHOT_VERSION,
+        "source": list(signature) if signature else None,
+        "aliases": len(aliases),
+        "conflicts": list(index.conflicts),
+    })
+    return CompiledFile(snapshot_path)
+
+
+def _open_users_snapshot(csv_path: str, snapshot_path: str) -> Optional[CompiledFile]:
+    """現在の users.csv からコンパイルしたファイルを開く (無い・古い・壊れている場合は None)"""
+    if not os.path.exists(snapshot_path):
+        return None
+    try:
+        compiled = CompiledFile(snapshot_path)
+    except (OSError, CompiledMapError) as e:
+        logger.warning(f"Ignoring compiled user mappings: {e}")
+        return None
+    signature = _file_signature(csv_path)
+    if compiled.meta.get("version") != USERS_SNAPSHOT_VERSION or compiled.meta.get("source") != list(signature or ()):
+        return None
+    return compiled
+
+
+def load_users_snapshot(csv_path: str, snapshot_path: str) -> Tuple[Mapping[str, str], KeyIndex, int]:
+    """
+    users.csv のコンパイル済みファイルを mmap して (対応表, 正規化した索引, 別名の数) を返す。
+    ファイルが無いか users.csv より古い場合は作り直す (複数のワーカーが同時に検知しても作り直すのは 1 つ)。
+    書き込めない場合は CSV を辞書として読み込む
+    """
+    users_map: Mapping[str, str]
+    compiled = _open_users_snapshot(csv_path, snapshot_path)
+    if compiled is None:
+        try:
+            with build_lock(snapshot_path):
+                # ロックを待つ間に他のワーカーが作り直していればそれを使う
+                compiled = _open_users_snapshot(csv_path, snapshot_path)
+                if compiled is None:
+                    compiled = compile_users(csv_path, snapshot_path)
+                    logger.info(f"Compiled user mappings to {snapshot_path}")
+        except OSError as e:
+            logger.error(f"Failed to compile user mappings to {snapshot_path}, loading them in memory: {e}")
+            users_map, aliases = load_users(csv_path)
+            return users_map, _users_index(users_map, aliases), len(aliases)
+    users_map, index = compiled.tables
+    return users_map, KeyIndex(index, tuple(compiled.meta["conflicts"])), compiled.meta["aliases"]
+
+
+def _projects_index(projects: Iterable[str], aliases: List[Tuple[str, str]]) -> KeyIndex:
+    return build_index([(project, project) for project in projects] + aliases, "Projects CSV")
+
 
 class Mapper:
-    users_map: Dict[str, str]
-    projects_map: Dict[str, str]
+    _snapshot: MappingSnapshot
+    last_reload_error: Optional[str]
 
     def __init__(self) -> None:
-        self.users_map = {}
-        self.projects_map = {}
+        self._snapshot = MappingSnapshot(
+            {}, KeyIndex({}), {}, KeyIndex({}), {},
+            load_templates(None, config.MESSAGE_TEMPLATE, config.OP_WEB_URL), (None, None, None)
+        )
+        self.last_reload_error = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
         self.load_mappings()
 
+    @property
+    def users_map(self) -> Mapping[str, str]:
+        return self._snapshot.users_map
+
+    @users_map.setter
+    def users_map(self, value: Dict[str, str]) -> None:
+        self._snapshot = self._snapshot._replace(users_map=value, users_index=_users_index(value, []))
+
+    @property
+    def projects_map(self) -> Dict[str, str]:
+        return self._snapshot.projects_map
+
+    @projects_map.setter
+    def projects_map(self, value: Dict[str, str]) -> None:
+        destinations: Dict[str, Tuple[Destination, ...]] = {
+            project: (Destination(channel),) for project, channel in value.items()
+        }
+        self._snapshot = self._snapshot._replace(
+            projects_map=value, projects_index=_projects_index(value, []), destinations=destinations
+        )
+
+    @property
+    def index_conflicts(self) -> List[str]:
+        """正規化すると一致するが対応先が異なるため、表記が完全に一致する場合にだけ使われるキー"""
+        return list(self._snapshot.users_index.conflicts + self._snapshot.projects_index.conflicts)
+
+    def _current_signature(self) -> Tuple[FileSignature, FileSignature, FileSignature]:
+        return (
+            _file_signature(config.USERS_CSV_PATH),
+            _file_signature(config.PROJECTS_CSV_PATH),
+            _file_signature(config.TEMPLATES_CSV_PATH)
+        )
+
     def load_mappings(self) -> None:
-        """CSVファイルからユーザーとプロジェクトのマッピングを読み込む"""
+        """CSVファイルからユーザーとプロジェクトのマッピング、メッセージテンプレートを読み込む"""
+        # 読み込み前にシグネチャを取得し、読み込み中の更新は次回チェックで検知させる
+        signature = self._current_signature()
+        previous = self._snapshot
+        users_map, users_index = previous.users_map, previous.users_index
+        projects_map, projects_index = previous.projects_map, previous.projects_index
+        destinations = previous.destinations
         try:
             if os.path.exists(config.USERS_CSV_PATH):
-                df_users = pd.read_csv(config.USERS_CSV_PATH)
-                # カラム検証
-                required_cols = {'openproject_user', 'rocketchat_user'}
-                if not required_cols.issubset(df_users.columns):
-                    raise ValueError(f"Users CSV missing required columns: {required_cols - set(df_users.columns)}")
-
-                self.users_map = dict(zip(df_users['openproject_user'], df_users['rocketchat_user']))
-                logger.info(f"Loaded {len(self.users_map)} user mappings.")
+                try:
+                    if config.USERS_SNAPSHOT_PATH:
+                        # 大規模なディレクトリ向け: 辞書を作らず、ワーカー間で共有される mmap から引く
+                        users_map, users_index, alias_count = load_users_snapshot(
+                            config.USERS_CSV_PATH, config.USERS_SNAPSHOT_PATH
+                        )
+                    else:
+                        users_map, user_aliases = load_users(config.USERS_CSV_PATH)
+                        # 表記ゆれ・別名の索引も読み込み時に作り、リクエストごとには探索しない
+                        users_index = _users_index(users_map, user_aliases)
+                        alias_count = len(user_aliases)
+                except CsvFormatError as e:
+                    raise ValueError(f"Users CSV {e}") from e
+                logger.info(f"Loaded {len(users_map)} user mappings ({alias_count} aliases).")
             else:
                 logger.warning(f"{config.USERS_CSV_PATH} not found. User mapping will be unavailable.")
 
             if os.path.exists(config.PROJECTS_CSV_PATH):
-                df_projects = pd.read_csv(config.PROJECTS_CSV_PATH)
-                # カラム検証
-                required_cols = {'project_identifier', 'rc_channel'}
-                if not required_cols.issubset(df_projects.columns):
-                    raise ValueError(f"Projects CSV missing required columns: {required_cols - set(df_projects.columns)}")
-
-                self.projects_map = dict(zip(df_projects['project_identifier'], df_projects['rc_channel']))
-                logger.info(f"Loaded {len(self.projects_map)} project mappings.")
+                try:
+                    destinations, project_aliases = load_destinations(config.PROJECTS_CSV_PATH)
+                except CsvFormatError as e:
+                    raise ValueError(f"Projects CSV {e}") from e
+                projects_map = {project: targets[0].channel for project, targets in destinations.items()}
+                projects_index = _projects_index(destinations, project_aliases)
+                fanout = sum(1 for targets in destinations.values() if len(targets) > 1)
+                logger.info(f"Loaded {len(projects_map)} project mappings ({fanout} with multiple destinations).")
             else:
                 logger.warning(f"{config.PROJECTS_CSV_PATH} not found. Project mapping will use default channel.")
 
-        except pd.errors.EmptyDataError:
-            logger.error("CSV file is empty")
-            raise
-        except pd.errors.ParserError as e:
+            # テンプレートはここで解析・検証し、リクエストごとには解析しない (templates.csv は任意)
+            templates_path = config.TEMPLATES_CSV_PATH if os.path.exists(config.TEMPLATES_CSV_PATH) else None
+            try:
+                templates = load_templates(templates_path, config.MESSAGE_TEMPLATE, config.OP_WEB_URL)
+            except CsvFormatError as e:
+                raise ValueError(f"Templates CSV {e}") from e
+            if templates.by_target:
+                logger.info(f"Loaded {len(templates.by_target)} message templates.")
+
+        except csv.Error as e:
             logger.error(f"CSV parsing error: {e}")
             raise
         except Exception as e:
             logger.error(f"Error loading CSVs: {e}")
             raise
 
+        # 正規化すると区別できなくなるキーは完全一致でのみ使う (読み込みは失敗させず、/ready に表示する)
+        for conflict in users_index.conflicts + projects_index.conflicts:
+            logger.warning(conflict)
+
+        # 検証済みのマッピングを一括で差し替える (リクエストが読み込み途中の状態を見ることはない)
+        self._snapshot = MappingSnapshot(
+            users_map, users_index, projects_map, projects_index, destinations, templates, signature
+        )
+
+    def reload_if_changed(self) -> bool:
+        """
+        CSV ファイルが更新されていれば再読み込みする。
+        読み込みに失敗した場合は直前のマッピングを維持し、エラーを記録する。
+
+        Returns:
+            新しいマッピングに差し替えた場合 True
+        """
+        with self._reload_lock:
+            if self._current_signature() == self._snapshot.signature:
+                return False
+            try:
+                self.load_mappings()
+            except Exception as e:
+                self.last_reload_error = str(e)
+                # 同じ壊れたファイルを繰り返し解析しないようシグネチャだけ進める
+                self._snapshot = self._snapshot._replace(signature=self._current_signature())
+                logger.error(f"Mapping reload failed, keeping previous mappings: {e}")
+                return False
+            self.last_reload_error = None
+            logger.info("Mappings reloaded")
+            return True
+
+    def start_auto_reload(self, interval: float) -> None:
+        """interval 秒ごとに CSV の更新を確認するバックグラウンドスレッドを起動する"""
+        # fork した子プロセスには親のスレッドが存在しないため、生存を確認する
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval,), name="mapping-reloader", daemon=True
+        )
+        self._watcher.start()
+
+    def stop_auto_reload(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(5)
+            self._watcher = None
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.reload_if_changed()
+            except Exception:
+                logger.exception("Unexpected error while checking mapping files")
+
     def get_rc_user(self, op_user: str) -> Optional[str]:
-        """OpenProjectのユーザー名に対応するRocket.Chatのユーザー名を取得する"""
-        return self.users_map.get(op_user)
+        """
+        OpenProjectのユーザー名に対応するRocket.Chatのユーザー名を取得する
+        (完全一致が無い場合は全角・半角、空白、大文字小文字の違いと別名を吸収して探す)
+        """
+        snapshot = self._snapshot
+        rc_user = snapshot.users_map.get(op_user)
+        return rc_user if rc_user is not None else snapshot.users_index.get(op_user)
 
     def get_channel(self, project_identifier: str) -> str:
         """プロジェクト識別子に対応するRocket.Chatのチャンネル名を取得する。未定義時はデフォルト値を返す"""
-        return self.projects_map.get(project_identifier, config.DEFAULT_CHANNEL)
\ No newline at end of file
+        snapshot = self._snapshot
+        project = _resolve_project(snapshot, project_identifier)
+        return snapshot.projects_map[project] if project is not None else config.DEFAULT_CHANNEL
+
+    def get_destinations(self, project_identifier: Optional[str]) -> Tuple[Destination, ...]:
+        """
+        プロジェクト識別子に対応する送信先をすべて取得する。
+        未定義時 (Webhook にプロジェクトが含まれない場合を含む) はデフォルトチャンネルのみを返す
+        """
+        snapshot = self._snapshot
+        project = _resolve_project(snapshot, project_identifier) if project_identifier else None
+        return snapshot.destinations[project] if project is not None else (Destination(config.DEFAULT_CHANNEL),)
+
+    def get_template(self, project_identifier: Optional[str], channel: Optional[str]) -> MessageTemplate:
+        """プロジェクト、送信先チャンネルの順に定義されたテンプレートを探し、無ければ既定のテンプレートを返す"""
+        snapshot = self._snapshot
+        project = _resolve_project(snapshot, project_identifier) if project_identifier else None
+        return snapshot.templates.select(project or project_identifier, channel)
+
+
+def _resolve_project(snapshot: MappingSnapshot, project_identifier: str) -> Optional[str]:
+    """プロジェクト名を projects.csv の識別子に解決する (表記ゆれ・別名を含む。未定義なら None)"""
+    if project_identifier in snapshot.destinations:
+        return project_identifier
+    return snapshot.projects_index.get(project_identifier)
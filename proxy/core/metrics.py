@@ -0,0 +1,363 @@
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+# 数十マイクロ秒 (メンション変換) から数秒 (外部 API) までを対象とする
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Counter:
+    """単調増加するカウンター (ラベルごとに値を持つ)"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def samples(self) -> List[List[Any]]:
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    def clear(self) -> None:
+        self._lock = threading.Lock()
+        self._values = {}
+
+
+class Gauge(Counter):
+    """任意の値を設定するゲージ (ワーカー間の集約時は合算される)"""
+    kind = "gauge"
+
+    def set(self, value: float, *labelvalues: str) -> None:
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class Histogram:
+    """累積バケット形式のヒストグラム (Prometheus の histogram と同じ集計方法)"""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとに [バケット別件数 (非累積、末尾は +Inf), 合計, 件数]
+        self._series: Dict[LabelValues, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[labelvalues] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def observe_since(self, started: float, *labelvalues: str) -> float:
+        """started (time.perf_counter の値) からの経過時間を記録し、現在時刻を返す"""
+        now = time.perf_counter()
+        self.observe(now - started, *labelvalues)
+        return now
+
+    def samples(self) -> List[List[Any]]:
+        with self._lock:
+            return [[list(labels), list(s[0]), s[1], s[2]] for labels, s in self._series.items()]
+
+    def clear(self) -> None:
+        self._lock = threading.Lock()
+        self._series = {}
+
+
+Metric = Union[Counter, Histogram]  # Gauge は Counter の派生
+M = TypeVar("M", bound=Metric)
+
+# 終了したワーカーのカウンター・ヒストグラムを合算して保持するファイル (metrics_dir 内)
+ARCHIVE_FILE = "metrics-archive.json"
+
+
+class MetricsRegistry:
+    """
+    プロセス内のメトリクスを保持し、Prometheus テキスト形式で出力する。
+
+    gunicorn の各ワーカーはメモリを共有しないため、metrics_dir を指定した場合は
+    各プロセスが定期的に自身の値を metrics-<pid>.json に書き出し、出力時に
+    全ワーカー分を合算する。記録自体はメモリ上の加算のみで、I/O を伴わない。
+    終了したワーカーの値は、マスターが mark_process_dead でアーカイブへ移す。
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self.metrics_dir = ""
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def register(self, metric: M) -> M:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> Dict[str, List[List[Any]]]:
+        """現在のプロセスの値を JSON 化できる形で返す"""
+        return {name: metric.samples() for name, metric in self._metrics.items()}
+
+    # --- ワーカー間の集約 ---
+
+    def configure(self, metrics_dir: str, flush_interval: float) -> None:
+        """metrics_dir へのスナップショット書き出しを開始する (空の場合はプロセス内のみ)"""
+        self.metrics_dir = metrics_dir
+        if not metrics_dir:
+            return
+        os.makedirs(metrics_dir, exist_ok=True)
+        if flush_interval > 0 and self._flusher is None:
+            self._stop.clear()
+            self._flusher = threading.Thread(
+                target=self._flush_loop, args=(flush_interval,), name="metrics-flusher", daemon=True
+            )
+            self._flusher.start()
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.metrics_dir, f"metrics-{pid}.json")
+
+    def flush(self) -> None:
+        """自プロセスのスナップショットを書き出す (一時ファイル経由で置き換える)"""
+        if not self.metrics_dir:
+            return
+        path = self._snapshot_path(os.getpid())
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Failed to write metrics snapshot: %s", e)
+
+    def _flush_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def reset_after_fork(self) -> None:
+        """
+        fork した子プロセスで呼び出す。親プロセスの値 (親が自身のスナップショットとして書き出す) と
+        子プロセスには存在しない書き出しスレッドの状態を破棄する。
+        """
+        for metric in self._metrics.values():
+            metric.clear()
+        self._stop = threading.Event()
+        self._flusher = None
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(5)
+            self._flusher = None
+        self.flush()
+
+    def mark_process_dead(self, pid: int, metrics_dir: Optional[str] = None) -> None:
+        """
+        終了したワーカーのスナップショットをアーカイブに合算して削除する (gunicorn の child_exit から呼び出す)。
+        カウンターとヒストグラムは累計を保つために残し、ゲージはそのワーカーの現在の状態のため捨てる。
+        アーカイブを書くのはマスターだけのため、ロックは不要。
+        """
+        metrics_dir = metrics_dir or self.metrics_dir
+        if not metrics_dir:
+            return
+        path = os.path.join(metrics_dir, f"metrics-{pid}.json")
+        if not os.path.exists(path):
+            return
+        archive = os.path.join(metrics_dir, ARCHIVE_FILE)
+        snapshots = []
+        for source in (archive, path):
+            if not os.path.exists(source):
+                continue
+            try:
+                with open(source) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping metrics snapshot %s: %s", source, e)
+        merged = _merge(snapshots)
+        gauges = {name for name, metric in self._metrics.items() if isinstance(metric, Gauge)}
+        tmp = f"{archive}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({name: samples for name, samples in merged.items() if name not in gauges}, f)
+            os.replace(tmp, archive)
+            os.unlink(path)
+        except OSError as e:
+            logger.warning("Failed to archive metrics of worker %d: %s", pid, e)
+
+    def collect(self) -> Dict[str, List[List[Any]]]:
+        """全ワーカーのスナップショットを合算する (自プロセス分は最新の値を使う)"""
+        snapshots = [self.snapshot()]
+        if self.metrics_dir:
+            own = self._snapshot_path(os.getpid())
+            for path in glob.glob(os.path.join(self.metrics_dir, "metrics-*.json")):
+                if path == own:
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError) as e:
+                    logger.debug("Skipping metrics snapshot %s: %s", path, e)
+        return _merge(snapshots)
+
+    def render(self) -> str:
+        """Prometheus テキスト形式 (version 0.0.4) で出力する"""
+        merged = self.collect()
+        lines: List[str] = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for sample in sorted(merged.get(name, []), key=lambda s: s[0]):
+                labels = list(zip(metric.labelnames, sample[0]))
+                if not isinstance(metric, Histogram):
+                    lines.append(f"{name}{_labels(labels)} {_number(sample[1])}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(metric.buckets) + [math.inf], sample[1]):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(sample[2])}")
+                lines.append(f"{name}_count{_labels(labels)} {sample[3]}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(snapshots: List[Dict[str, List[List[Any]]]]) -> Dict[str, List[List[Any]]]:
+    merged: Dict[str, Dict[LabelValues, List[Any]]] = {}
+    for snapshot in snapshots:
+        for name, samples in snapshot.items():
+            series = merged.setdefault(name, {})
+            for sample in samples:
+                key = tuple(sample[0])
+                current = series.get(key)
+                if current is None:
+                    series[key] = [sample[0]] + [list(v) if isinstance(v, list) else v for v in sample[1:]]
+                elif len(sample) == 2:
+                    current[1] += sample[1]
+                elif len(current[1]) == len(sample[1]):
+                    current[1] = [a + b for a, b in zip(current[1], sample[1])]
+                    current[2] += sample[2]
+                    current[3] += sample[3]
+    return {name: list(series.values()) for name, series in merged.items()}
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value))
+
+
+# --- Webhook プロキシのメトリクス定義 ---
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "webhook_proxy_request_duration_seconds",
+    "Time spent handling a webhook request"
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "webhook_proxy_stage_duration_seconds",
+    "Time spent in each pipeline stage",
+    ("stage",)
+)
+OUTCOMES = REGISTRY.counter(
+    "webhook_proxy_outcomes_total",
+    "Webhook and delivery outcomes (delivered, fallback, failed, accepted, duplicate, ignored, invalid, error)",
+    ("outcome",)
+)
+DEAD_LETTERS = REGISTRY.counter(
+    "webhook_proxy_dead_letters_total",
+    "Failed deliveries written to the dead-letter store by source (webhook, spool)",
+    ("source",)
+)
+IGNORED = REGISTRY.counter(
+    "webhook_proxy_ignored_total",
+    "Ignored webhooks by reason",
+    ("reason",)
+)
+USER_CACHE_LOOKUPS = REGISTRY.counter(
+    "webhook_proxy_user_cache_lookups_total",
+    "User name lookups by cache result (hit, shared_hit, miss)",
+    ("result",)
+)
+MENTION_RESOLUTIONS = REGISTRY.counter(
+    "webhook_proxy_mention_resolutions_total",
+    "Mentions missing from users.csv by resolution result (cached, resolved, unresolved)",
+    ("result",)
+)
+HTTP_RETRIES = REGISTRY.counter(
+    "webhook_proxy_http_retries_total",
+    "Retried HTTP requests to downstream services",
+    ("target",)
+)
+CIRCUIT_STATE = REGISTRY.gauge(
+    "webhook_proxy_circuit_state",
+    "Workers whose circuit breaker for the target is in the given state (closed, open, half_open)",
+    ("target", "state")
+)
+CIRCUIT_REJECTED = REGISTRY.counter(
+    "webhook_proxy_circuit_rejected_total",
+    "Downstream calls skipped because the circuit breaker was open",
+    ("target",)
+)
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.histogram(
+    "webhook_proxy_rate_limit_wait_seconds",
+    "Time spent waiting for a Rocket.Chat send slot"
+)
+RATE_LIMITED = REGISTRY.counter(
+    "webhook_proxy_rate_limited_total",
+    "Rate-limited Rocket.Chat sends (local: no slot within the maximum wait, remote: told to slow down)",
+    ("source",)
+)
+
+
+def record_ignored(reason: Optional[str]) -> None:
+    """無視した Webhook を記録する (ラベルの種類が増えないよう理由の詳細は落とす)"""
+    OUTCOMES.inc("ignored")
+    IGNORED.inc((reason or "unknown").split(":", 1)[0])
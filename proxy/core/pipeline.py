@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import re
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional, Tuple
+import config
+from .templates import MessageTemplate, compile_template
+
+logger = logging.getLogger(__name__)
+
+# 処理対象とする Webhook アクション
+SUPPORTED_ACTION = 'work_package_comment:comment'
+
+# OpenProject の Webhook は先頭のキーが action (ペイロード全体をデコードせずに判定するため)
+_LEADING_ACTION = re.compile(rb'\s*\{\s*"action"\s*:\s*"([^"\\]*)"')
+
+
+@dataclass(slots=True)
+class CommentEvent:
+    """Webhook ペイロードから抽出した、通知に必要な項目のみを保持するイベント"""
+    wp_id: Any
+    wp_subject: str
+    comment: str
+    project_title: Optional[str] = None
+    project_href: Optional[str] = None
+    user_href: Optional[str] = None
+    activity_id: Optional[str] = None  # OpenProject の activity (journal) ID。再送時も同じ値になる
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CommentEvent":
+        return cls(**data)
+
+
+def parse_comment_event(data: Dict[str, Any]) -> Tuple[Optional[CommentEvent], Optional[str]]:
+    """
+    Webhook ペイロードを正規化されたイベントに変換する。
+
+    Returns:
+        (event, reason): 処理対象外の場合は event が None となり、reason に理由が入る
+    """
+    # フィルタリング: ワークパッケージのコメント投稿アクションのみを処理
+    action = data.get('action')
+    if action != SUPPORTED_ACTION:
+        return None, f"unsupported action: {action}"
+
+    # Activity と Work Package 情報を抽出
+    activity = data.get('activity', {})
+    embedded = activity.get('_embedded', {})
+    work_package = embedded.get('workPackage', {})
+
+    # コメント本文を抽出
+    comment_body = activity.get('comment', {}).get('raw')
+    if not comment_body:
+        return None, "no comment content"
+
+    project_link = work_package.get('_links', {}).get('project', {})
+    return CommentEvent(
+        wp_id=work_package.get('id', '?'),
+        wp_subject=work_package.get('subject', 'No Subject'),
+        comment=comment_body,
+        project_title=project_link.get('title'),
+        project_href=project_link.get('href'),
+        user_href=activity.get('_links', {}).get('user', {}).get('href'),
+        activity_id=_activity_id(activity),
+    ), None
+
+
+def extract_comment_event(body: bytes) -> Tuple[Optional[CommentEvent], Optional[str]]:
+    """
+    Webhook のリクエストボディ (JSON) からイベントを抽出する。
+
+    Webhook には作業項目全体 (HTML の説明、カスタムフィールド、リンク) が埋め込まれているため、
+    対象外のアクションはボディ先頭の action だけを見てデコードせずに除外する。
+    対象のアクションもデコード結果は保持せず、必要な項目だけを CommentEvent に移す。
+
+    Raises:
+        ValueError: JSON として不正、またはオブジェクトでない場合
+    """
+    match = _LEADING_ACTION.match(body)
+    if match is not None and match.group(1) != SUPPORTED_ACTION.encode():
+        return None, f"unsupported action: {match.group(1).decode('utf-8', 'replace')}"
+
+    data = json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError("Webhook payload is not a JSON object")
+    return parse_comment_event(data)
+
+
+def _activity_id(activity: Dict[str, Any]) -> Optional[str]:
+    """activity の ID を取得する (id が無い場合は self リンクの href を使う)"""
+    activity_id = activity.get('id')
+    if activity_id is not None:
+        return str(activity_id)
+    href = activity.get('_links', {}).get('self', {}).get('href')
+    return str(href) if href else None
+
+
+def idempotency_key(event: CommentEvent) -> str:
+    """
+    重複配送の判定に使うキーを返す。
+    activity ID と内容のフィンガープリントを組み合わせ、ID が無いペイロードでも
+    同じ内容の再送を検出できるようにする。
+    """
+    fingerprint = hashlib.sha256(
+        "\x1f".join(str(v) for v in (event.wp_id, event.user_href, event.comment)).encode('utf-8')
+    ).hexdigest()[:32]
+    return f"{event.activity_id or '-'}:{fingerprint}"
+
+
+def build_message(
+    event: CommentEvent,
+    converted_notes: str,
+    template: Optional[MessageTemplate] = None,
+    author_name: str = "OpenProject"
+) -> str:
+    """
+    Rocket.Chat に投稿する通知メッセージを組み立てる
+
+    Args:
+        template: 解析済みのテンプレート (省略時は MESSAGE_TEMPLATE)
+    """
+    if template is None:
+        template = default_template()
+    return template.render(event, converted_notes, author_name)
+
+
+def default_template() -> MessageTemplate:
+    """MESSAGE_TEMPLATE を解析したテンプレート (解析は初回のみ)"""
+    return compile_template(config.MESSAGE_TEMPLATE, config.OP_WEB_URL)
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+import config
+from .metrics import RATE_LIMITED, RATE_LIMIT_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Rocket.Chat のレート制限エラー (400 で返る場合がある) から待ち時間を取り出す
+_TOO_MANY_REQUESTS = re.compile(r"too[- ]many[- ]requests", re.IGNORECASE)
+_WAIT_SECONDS = re.compile(r"wait (\d+(?:\.\d+)?) seconds?", re.IGNORECASE)
+
+
+class RateLimitedError(Exception):
+    """最大待ち時間内に送信枠を確保できなかった (または送信先から待機を指示された)"""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"Rate limited, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After ヘッダー (秒数指定のみ) を解釈する"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def rate_limit_delay(response: Any) -> Optional[float]:
+    """
+    レスポンス (requests / httpx) がレート制限を示す場合に待ち時間 (秒) を返す。
+    レート制限でなければ None。
+
+    429 の Retry-After に加え、Rocket.Chat がレート制限を 400 (error-too-many-requests) で
+    返す場合も検出する (チャンネル未検出のフォールバックと取り違えないため)。
+    """
+    if response.status_code == 429:
+        delay = parse_retry_after(response.headers.get('Retry-After'))
+        return 1.0 if delay is None else delay
+    if response.status_code == 400 and _TOO_MANY_REQUESTS.search(response.text or ""):
+        match = _WAIT_SECONDS.search(response.text)
+        return float(match.group(1)) if match else 1.0
+    return None
+
+
+class TokenBucket:
+    """
+    トークンバケット (rate 件/秒で補充、最大 burst 件)。
+
+    トークンを先に予約する方式のため、残量が負になった分だけ後続の呼び出しが待つ。
+    """
+    rate: float
+    burst: float
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """1 トークンを使えるようになるまでの秒数"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+
+class RateLimiter:
+    """
+    全体とチャンネル単位のトークンバケットで送信間隔を平滑化する。
+
+    acquire() は送信枠が空くまで最大 max_wait 秒待ち、それを超える場合は待たずに
+    RateLimitedError を送出する。送信先から 429 / Retry-After を受けた場合は
+    pause() で指定時間だけ全体の送信を止める。rate が 0 のバケットは制限しない。
+    """
+    max_wait: float
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        channel_rate: float = 0.0,
+        channel_burst: float = 1.0,
+        max_wait: float = 5.0,
+        max_channels: int = 1000,
+        clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.max_wait = max_wait
+        self.max_channels = max_channels
+        self._clock = clock
+        self._channel_rate = channel_rate
+        self._channel_burst = channel_burst
+        self._global = TokenBucket(rate, burst, clock()) if rate > 0 else None
+        self._channels: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._waited = 0
+        self._rejected = 0
+        self._pauses = 0
+
+    def reserve(self, channel: str) -> float:
+        """
+        送信枠を予約し、送信までに待つべき秒数を返す
+
+        Raises:
+            RateLimitedError: 待ち時間が max_wait を超える場合 (予約は行わない)
+        """
+        with self._lock:
+            now = self._clock()
+            buckets = [bucket for bucket in (self._global, self._channel_bucket_locked(channel, now)) if bucket]
+            wait = max([self._paused_until - now, 0.0] + [bucket.wait_time(now) for bucket in buckets])
+            if wait > self.max_wait:
+                self._rejected += 1
+                RATE_LIMITED.inc("local")
+                raise RateLimitedError(wait)
+            for bucket in buckets:
+                bucket.take()
+            if wait > 0:
+                self._waited += 1
+        return wait
+
+    def acquire(self, channel: str) -> None:
+        """送信枠を確保する (必要なら待つ)"""
+        wait = self.reserve(channel)
+        RATE_LIMIT_WAIT_SECONDS.observe(wait)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, channel: str) -> None:
+        """acquire の asyncio 版 (イベントループを止めずに待つ)"""
+        wait = self.reserve(channel)
+        RATE_LIMIT_WAIT_SECONDS.observe(wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """送信先から待機を指示された場合に、全体の送信を seconds 秒止める"""
+        RATE_LIMITED.inc("remote")
+        with self._lock:
+            until = self._clock() + seconds
+            if until > self._paused_until:
+                self._paused_until = until
+                self._pauses += 1
+        logger.warning("Rocket.Chat rate limit hit, pausing deliveries for %.1fs", seconds)
+
+    def retry_after(self) -> float:
+        """送信を再開できるまでの秒数の目安"""
+        with self._lock:
+            return max(0.0, self._paused_until - self._clock())
+
+    def _channel_bucket_locked(self, channel: str, now: float) -> Optional[TokenBucket]:
+        if self._channel_rate <= 0:
+            return None
+        bucket = self._channels.get(channel)
+        if bucket is None:
+            bucket = TokenBucket(self._channel_rate, self._channel_burst, now)
+            self._channels[channel] = bucket
+            while len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+        else:
+            self._channels.move_to_end(channel)
+        return bucket
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "channels": len(self._channels),
+                "waited": self._waited,
+                "rejected": self._rejected,
+                "pauses": self._pauses,
+                "paused_for": round(max(0.0, self._paused_until - self._clock()), 1),
+            }
+
+
+def build_rc_limiter() -> RateLimiter:
+    """Rocket.Chat 送信用のレート制限を設定値から構築する"""
+    return RateLimiter(
+        rate=config.RC_RATE_LIMIT,
+        burst=config.RC_RATE_BURST,
+        channel_rate=config.RC_CHANNEL_RATE_LIMIT,
+        channel_burst=config.RC_CHANNEL_RATE_BURST,
+        max_wait=config.RC_RATE_MAX_WAIT
+    )
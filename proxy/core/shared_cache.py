@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import threading
+import time
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS entries (
+        key TEXT PRIMARY KEY,
+        value TEXT,
+        expires_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS worker_stats (
+        pid INTEGER PRIMARY KEY,
+        hits INTEGER NOT NULL DEFAULT 0,
+        misses INTEGER NOT NULL DEFAULT 0,
+        updated_at REAL NOT NULL
+    )
+    """,
+]
+
+# 期限切れエントリを掃除する間隔 (書き込み回数)
+_PURGE_EVERY = 100
+
+
+class SharedCache:
+    """
+    同一ノード上の全 gunicorn ワーカーで共有する SQLite (WAL) キャッシュ。
+
+    ワーカーの再起動やデプロイ後も内容が残るため、ウォームなキャッシュを
+    引き継げる。値が None のエントリは negative エントリとして扱う。
+    ヒット数はワーカーごとに集計し、stats_flush_interval 秒ごとに
+    ファイルへ書き出してノード全体の集計に使う。
+    """
+    path: str
+    stats_flush_interval: float
+
+    def __init__(self, path: str, stats_flush_interval: float = 10.0) -> None:
+        self.path = path
+        self.stats_flush_interval = stats_flush_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._unflushed_hits = 0
+        self._unflushed_misses = 0
+        self._last_flush = time.monotonic()
+        self._writes = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        for statement in _SCHEMA:
+            conn.execute(statement)
+
+    def _conn(self) -> sqlite3.Connection:
+        """スレッドごとの接続を返す (sqlite3 接続はスレッド間で共有しない)"""
+        conn: Optional[sqlite3.Connection] = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Tuple[bool, Optional[str]]:
+        """
+        共有キャッシュを参照する
+
+        Returns:
+            (found, value): negative エントリの場合は (True, None)
+        """
+        try:
+            row = self._conn().execute(
+                "SELECT value FROM entries WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Shared cache read failed: %s", e)
+            row = None
+
+        self._record(hit=row is not None)
+        if row is None:
+            return False, None
+        return True, row[0]
+
+    def set(self, key: str, value: Optional[str], ttl: float) -> None:
+        """値を格納する (失敗してもリクエスト処理は継続する)"""
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl)
+            )
+            with self._lock:
+                self._writes += 1
+                purge = self._writes % _PURGE_EVERY == 0
+            if purge:
+                conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        except sqlite3.Error as e:
+            logger.warning("Shared cache write failed: %s", e)
+
+    def set_many(self, items: Dict[str, str], ttl: float) -> None:
+        """複数の値を 1 トランザクションで格納する (一括ウォームアップ用)"""
+        expires_at = time.time() + ttl
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                    [(key, value, expires_at) for key, value in items.items()]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning("Shared cache bulk write failed: %s", e)
+
+    def _record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self._hits += 1
+                self._unflushed_hits += 1
+            else:
+                self._misses += 1
+                self._unflushed_misses += 1
+            due = time.monotonic() - self._last_flush >= self.stats_flush_interval
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self) -> None:
+        """このワーカーのヒット数を共有ファイルへ書き出す"""
+        with self._lock:
+            hits, misses = self._unflushed_hits, self._unflushed_misses
+            self._unflushed_hits = 0
+            self._unflushed_misses = 0
+            self._last_flush = time.monotonic()
+        if not hits and not misses:
+            return
+        try:
+            self._conn().execute(
+                "INSERT INTO worker_stats (pid, hits, misses, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(pid) DO UPDATE SET hits = hits + excluded.hits, "
+                "misses = misses + excluded.misses, updated_at = excluded.updated_at",
+                (os.getpid(), hits, misses, time.time())
+            )
+        except sqlite3.Error as e:
+            logger.warning("Shared cache stats flush failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        """ワーカー単位とノード全体のヒット率を返す"""
+        self.flush_stats()
+        with self._lock:
+            worker_hits, worker_misses = self._hits, self._misses
+
+        node_hits = node_misses = entries = 0
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT COALESCE(SUM(hits), 0), COALESCE(SUM(misses), 0) FROM worker_stats").fetchone()
+            node_hits, node_misses = int(row[0]), int(row[1])
+            entries = int(conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0])
+        except sqlite3.Error as e:
+            logger.warning("Shared cache stats read failed: %s", e)
+
+        def ratio(hits: int, misses: int) -> float:
+            return round(hits / (hits + misses), 4) if hits + misses else 0.0
+
+        return {
+            "entries": entries,
+            "worker": {
+                "pid": os.getpid(),
+                "hits": worker_hits,
+                "misses": worker_misses,
+                "hit_ratio": ratio(worker_hits, worker_misses),
+            },
+            "node": {
+                "hits": node_hits,
+                "misses": node_misses,
+                "hit_ratio": ratio(node_hits, node_misses),
+            },
+        }
+
+    def close(self) -> None:
+        conn: Optional[sqlite3.Connection] = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,138 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    locked_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+)
+"""
+
+_INDEX = "CREATE INDEX IF NOT EXISTS idx_events_due ON events (failed, next_attempt_at)"
+
+
+class Spool:
+    """
+    SQLite (WAL) を用いた追記型の配送キュー。
+
+    複数の gunicorn ワーカーが同一ファイルを共有できるよう、取り出しは
+    リース方式で行う。リース期限内に ack/retry されなかったイベントは
+    (ワーカーのクラッシュ等とみなし) 再び取り出し対象となる。
+    """
+    path: str
+    lease_seconds: float
+
+    def __init__(self, path: str, lease_seconds: float = 60.0) -> None:
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        conn.execute(_SCHEMA)
+        conn.execute(_INDEX)
+
+    def _conn(self) -> sqlite3.Connection:
+        """スレッドごとの接続を返す (sqlite3 接続はスレッド間で共有しない)"""
+        conn: Optional[sqlite3.Connection] = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, event: Dict[str, Any]) -> int:
+        """イベントを永続化し、採番された ID を返す"""
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT INTO events (payload, next_attempt_at, created_at) VALUES (?, ?, ?)",
+            (json.dumps(event, ensure_ascii=False), now, now)
+        )
+        return int(cur.lastrowid or 0)
+
+    def claim(self) -> Optional[Tuple[int, Dict[str, Any], int]]:
+        """
+        配送期限の来たイベントを 1 件リースして取り出す
+
+        Returns:
+            (id, event, attempts) または対象が無い場合は None
+        """
+        conn = self._conn()
+        now = time.time()
+        # BEGIN IMMEDIATE で書き込みロックを取り、ワーカー間の二重取得を防ぐ
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM events "
+                "WHERE failed = 0 AND next_attempt_at <= ? AND locked_until <= ? "
+                "ORDER BY next_attempt_at, id LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE events SET locked_until = ? WHERE id = ?",
+                (now + self.lease_seconds, row[0])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return int(row[0]), json.loads(row[1]), int(row[2])
+
+    def ack(self, event_id: int) -> None:
+        """配送完了したイベントを削除する"""
+        self._conn().execute("DELETE FROM events WHERE id = ?", (event_id,))
+
+    def retry(self, event_id: int, error: str, delay: float) -> None:
+        """配送失敗したイベントを delay 秒後に再試行するよう戻す"""
+        self._conn().execute(
+            "UPDATE events SET attempts = attempts + 1, next_attempt_at = ?, "
+            "locked_until = 0, last_error = ? WHERE id = ?",
+            (time.time() + delay, error, event_id)
+        )
+
+    def park(self, event_id: int, error: str, delay: float) -> None:
+        """配送先の障害中のイベントを、試行回数を増やさずに delay 秒後まで保留する"""
+        self._conn().execute(
+            "UPDATE events SET next_attempt_at = ?, locked_until = 0, last_error = ? WHERE id = ?",
+            (time.time() + delay, error, event_id)
+        )
+
+    def fail(self, event_id: int, error: str) -> None:
+        """再試行上限に達したイベントを配送対象から外す (調査用に行は残す)"""
+        self._conn().execute(
+            "UPDATE events SET attempts = attempts + 1, failed = 1, "
+            "locked_until = 0, last_error = ? WHERE id = ?",
+            (error, event_id)
+        )
+
+    def pending_count(self) -> int:
+        """未配送のイベント数を返す"""
+        row = self._conn().execute("SELECT COUNT(*) FROM events WHERE failed = 0").fetchone()
+        return int(row[0])
+
+    def failed_count(self) -> int:
+        """配送を断念したイベント数を返す"""
+        row = self._conn().execute("SELECT COUNT(*) FROM events WHERE failed = 1").fetchone()
+        return int(row[0])
+
+    def close(self) -> None:
+        conn: Optional[sqlite3.Connection] = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
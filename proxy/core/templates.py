@@ -0,0 +1,148 @@
+import logging
+import string
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple, Optional, Tuple
+from .csv_loader import load_csv_mapping
+
+if TYPE_CHECKING:
+    from .pipeline import CommentEvent
+
+logger = logging.getLogger(__name__)
+
+# テンプレートで使用できるフィールド
+FIELDS = ("subject", "wp_id", "url", "project", "author", "comment")
+
+
+class TemplateError(ValueError):
+    """テンプレートの構文が不正、または未知のフィールドを参照している場合の例外"""
+
+
+# フィールドの値を取り出す関数 (event, comment, author, url) -> str。テンプレートの内容がコードになることはない
+_Getter = Callable[["CommentEvent", str, str, str], str]
+_FIELD_GETTERS: Dict[str, _Getter] = {
+    "subject": lambda event, comment, author, url: str(event.wp_subject),
+    "wp_id": lambda event, comment, author, url: str(event.wp_id),
+    "url": lambda event, comment, author, url: url,
+    "project": lambda event, comment, author, url: event.project_title or '',
+    "author": lambda event, comment, author, url: author,
+    "comment": lambda event, comment, author, url: comment,
+}
+
+
+class MessageTemplate:
+    """
+    起動時 (および再読み込み時) に 1 度だけ解析した通知メッセージのテンプレート。
+
+    解析結果を (固定文字列, フィールドの取り出し関数) の並びとして保持し、リクエストごとの処理は
+    値の取り出しと連結のみとする。作業項目 URL の固定部分 (OP_WEB_URL) もここで組み立てておく。
+    """
+    __slots__ = ("source", "_parts", "_tail", "_uses_url", "_project_prefix", "_plain_prefix")
+    source: str
+    _parts: Tuple[Tuple[str, _Getter], ...]
+    _tail: str
+
+    def __init__(self, source: str, base_url: str) -> None:
+        self.source = source
+        literals, fields = _parse(source)
+        self._parts = tuple((literal, _FIELD_GETTERS[field]) for literal, field in zip(literals, fields))
+        self._tail = literals[-1]
+        self._uses_url = "url" in fields
+        base = base_url.rstrip('/')
+        self._project_prefix = f"{base}/projects/"
+        self._plain_prefix = f"{base}/work_packages/"
+
+    def render(self, event: "CommentEvent", comment: str, author: str = "OpenProject") -> str:
+        url = self._url(event) if self._uses_url else ""
+        chunks = []
+        for literal, getter in self._parts:
+            chunks.append(literal)
+            chunks.append(getter(event, comment, author, url))
+        chunks.append(self._tail)
+        return "".join(chunks)
+
+    def _url(self, event: "CommentEvent") -> str:
+        href = event.project_href
+        if not href:
+            return _plain_url(self._plain_prefix, event)
+        # /api/v3/projects/demo -> demo を抽出
+        return f"{self._project_prefix}{href.rstrip('/').rsplit('/', 1)[-1]}/work_packages/{event.wp_id}"
+
+
+def _plain_url(prefix: str, event: "CommentEvent") -> str:
+    # フォールバック: プロジェクトパスなしのシンプルな形式
+    logger.warning("Project href not found in webhook payload for WP #%s, using simple URL format", event.wp_id)
+    return f"{prefix}{event.wp_id}"
+
+
+def _parse(source: str) -> Tuple[List[str], List[str]]:
+    """テンプレートを固定文字列 (フィールド数 + 1 個) とフィールド名に分解する"""
+    literals = [""]
+    fields: List[str] = []
+    try:
+        parsed = list(string.Formatter().parse(source))
+    except ValueError as e:
+        raise TemplateError(f"invalid template syntax: {e}") from e
+
+    for literal, field, format_spec, conversion in parsed:
+        literals[-1] += literal
+        if field is None:
+            continue
+        if field not in FIELDS:
+            raise TemplateError(f"unknown field {{{field}}} (available: {', '.join(FIELDS)})")
+        if format_spec or conversion:
+            raise TemplateError(f"format spec and conversion are not supported: {{{field}}}")
+        fields.append(field)
+        literals.append("")
+    return literals, fields
+
+
+@lru_cache(maxsize=64)
+def compile_template(source: str, base_url: str) -> MessageTemplate:
+    """
+    テンプレートを解析する (同じ内容は解析済みのものを再利用する)。
+    環境変数や CSV に 1 行で書けるよう、テンプレート中の `\\n` は改行として扱う。
+
+    Raises:
+        TemplateError: テンプレートが不正な場合
+    """
+    return MessageTemplate(source.replace("\\n", "\n"), base_url)
+
+
+class TemplateSet(NamedTuple):
+    """既定のテンプレートと、プロジェクト・チャンネルごとのテンプレート"""
+    default: MessageTemplate
+    by_target: Dict[str, MessageTemplate]
+
+    def select(self, project: Optional[str], channel: Optional[str]) -> MessageTemplate:
+        """プロジェクト、送信先チャンネル、既定の順にテンプレートを選ぶ"""
+        by_target = self.by_target
+        if by_target:
+            if project and project in by_target:
+                return by_target[project]
+            if channel and channel in by_target:
+                return by_target[channel]
+        return self.default
+
+
+def load_templates(path: Optional[str], default_source: str, base_url: str) -> TemplateSet:
+    """
+    既定のテンプレートと、CSV (target,template) に定義されたテンプレートを解析する。
+    target はプロジェクト名または `#` から始まるチャンネル名。
+
+    Raises:
+        TemplateError: いずれかのテンプレートが不正な場合
+        CsvFormatError: CSV の形式が不正な場合
+    """
+    try:
+        default = compile_template(default_source, base_url)
+    except TemplateError as e:
+        raise TemplateError(f"MESSAGE_TEMPLATE: {e}") from e
+    by_target: Dict[str, MessageTemplate] = {}
+    if path is not None:
+        for target, source in load_csv_mapping(path, 'target', 'template').items():
+            try:
+                by_target[target] = compile_template(source, base_url)
+            except TemplateError as e:
+                raise TemplateError(f"Templates CSV: template for {target}: {e}") from e
+    return TemplateSet(default, by_target)
+
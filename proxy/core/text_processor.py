@@ -1,38 +1,227 @@
-import re
-from typing import Optional
+import sys
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
 from .mapper import Mapper
 
+# メンションタグの構成要素
+# 形式: <mention ... data-text="@User Name" ...>...</mention>(&nbsp;)
+_OPEN = '<mention'
+_ATTR = 'data-text="@'
+_CLOSE = '</mention>'
+_NBSP_ENTITY = '&nbsp;'
+_NBSP = '\u00a0'
 
-def convert_mentions(text: Optional[str], mapper: Mapper) -> str:
+
+class _NextFinder:
+    """
+    text 内で sub が次に現れる位置を返す。
+    直前の検索結果で答えが決まる問い合わせは再検索しないため、
+    問い合わせ位置がおおむね単調増加する走査では全体で線形時間となる。
+    """
+    __slots__ = ('text', 'sub', '_from', '_found')
+
+    def __init__(self, text: str, sub: str) -> None:
+        self.text = text
+        self.sub = sub
+        self._from = sys.maxsize
+        self._found = -1
+
+    def find(self, pos: int) -> int:
+        if self._from <= pos and (self._found == -1 or pos <= self._found):
+            return self._found
+        self._from = pos
+        self._found = self.text.find(self.sub, pos)
+        return self._found
+
+
+class _MentionScanner:
+    """
+    メンションタグを 1 パスで走査する。
+
+    以下の正規表現と同一の結果を返すが、長いコメントや閉じられていないタグでも
+    バックトラックが発生せず、入力長に対して線形時間で処理する。
+        <mention\\s+[^>]*data-text="@([^"]+)"[^>]*>.*?</mention>(?:&nbsp;|\\u00a0)?
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self._gt = _NextFinder(text, '>')
+        self._close = _NextFinder(text, _CLOSE)
+        self._newline = _NextFinder(text, '\n')
+        # 同じ '>' で終わる属性領域の評価結果 (領域終端, 領域先頭, 最も後ろで成立した一致)
+        self._region_end = -1
+        self._region_start = -1
+        self._region_match: Optional[Tuple[int, int, int, str]] = None
+
+    def matches(self) -> Iterator[Tuple[int, int, int, str]]:
+        """一致したメンションを (タグ先頭, 一致終端, タグの '>' の位置, ユーザー名) として順に返す"""
+        text = self.text
+        pos = text.find(_OPEN)
+        while pos != -1:
+            match = self._match_at(pos)
+            if match is None:
+                pos = text.find(_OPEN, pos + 1)
+                continue
+            end, tag_end, op_user = match
+            yield pos, end, tag_end, op_user
+            pos = text.find(_OPEN, end)
+
+    def _match_at(self, pos: int) -> Optional[Tuple[int, int, str]]:
+        """pos から始まるメンションタグを評価し、(一致終端, タグの '>' の位置, ユーザー名) を返す"""
+        text = self.text
+        ws = pos + len(_OPEN)
+        if ws >= len(text) or not text[ws].isspace():
+            return None
+        start = ws + 1
+        # data-text より前の属性部分は '>' を含まない
+        region_end = self._gt.find(start)
+        if region_end == -1:
+            return None
+
+        if region_end != self._region_end or start < self._region_start:
+            self._region_end = region_end
+            self._region_start = start
+            self._region_match = self._evaluate_region(start, region_end)
+
+        match = self._region_match
+        # 一致が成立する data-text はタグ先頭によらず決まるため、領域内にあれば再利用できる
+        if match is None or match[0] < start:
+            return None
+        return match[1], match[2], match[3]
+
+    def _evaluate_region(self, start: int, region_end: int) -> Optional[Tuple[int, int, int, str]]:
+        """
+        属性領域 [start, region_end) 内の data-text を後ろから評価し、
+        最初に一致が成立したものを (data-text 位置, 一致終端, タグの '>' の位置, ユーザー名) として返す
+        (正規表現の貪欲な [^>]* と同じ優先順位)
+        """
+        text = self.text
+        positions: List[int] = []
+        k = text.find(_ATTR, start, region_end)
+        while k != -1:
+            positions.append(k)
+            k = text.find(_ATTR, k + 1, region_end)
+
+        next_value = -1
+        next_quote = -1
+        for k in reversed(positions):
+            value = k + len(_ATTR)
+            # 値を閉じる '"' : 直前に評価した位置までに無ければ、その結果と同じ
+            quote = text.find('"', value, next_value) if next_value != -1 else text.find('"', value)
+            if quote == -1:
+                quote = next_quote
+            next_value, next_quote = value, quote
+            if quote == -1 or quote == value:
+                continue
+
+            tag_end = self._gt.find(quote + 1)
+            if tag_end == -1:
+                continue
+            close = self._close.find(tag_end + 1)
+            if close == -1:
+                continue
+            # タグ内のコンテンツは改行を含まない (正規表現の '.' と同じ)
+            newline = self._newline.find(tag_end + 1)
+            if newline != -1 and newline < close:
+                continue
+
+            end = close + len(_CLOSE)
+            if text.startswith(_NBSP_ENTITY, end):
+                end += len(_NBSP_ENTITY)
+            elif text.startswith(_NBSP, end):
+                end += len(_NBSP)
+            return k, end, tag_end, text[value:quote]
+        return None
+
+
+def _attribute(text: str, name: str, start: int, end: int) -> Optional[str]:
+    """タグ内 [start, end) にある属性 name の値を返す"""
+    marker = f'{name}="'
+    k = text.find(marker, start, end)
+    while k != -1 and not text[k - 1].isspace():
+        k = text.find(marker, k + 1, end)
+    if k == -1:
+        return None
+    value = k + len(marker)
+    quote = text.find('"', value, end)
+    return text[value:quote] if quote != -1 else None
+
+
+def _user_id(text: str, pos: int, tag_end: int) -> Optional[str]:
+    """メンションタグの data-id (OpenProject のユーザー ID)。ユーザー以外 (グループなど) へのメンションは None"""
+    data_type = _attribute(text, 'data-type', pos, tag_end)
+    if data_type is not None and data_type != 'user':
+        return None
+    user_id = _attribute(text, 'data-id', pos, tag_end)
+    # API の URL に使うため、数値以外は受け付けない
+    return user_id if user_id and user_id.isascii() and user_id.isdigit() else None
+
+
+def unmapped_mention_ids(text: Optional[str], mapper: Mapper, limit: int) -> List[str]:
+    """
+    users.csv に対応の無いユーザーへのメンションについて、data-id を出現順に (重複を除き最大 limit 件) 返す
+    """
+    if not text or _OPEN not in text or limit <= 0:
+        return []
+    ids: Dict[str, None] = {}
+    for pos, _, tag_end, op_user in _MentionScanner(text).matches():
+        if mapper.get_rc_user(op_user):
+            continue
+        user_id = _user_id(text, pos, tag_end)
+        if user_id is not None:
+            ids[user_id] = None
+            if len(ids) >= limit:
+                break
+    return list(ids)
+
+
+def rc_username(user: Dict[str, Any], rule: str) -> Optional[str]:
+    """
+    OpenProject のユーザー情報 (/api/v3/users/{id}) から Rocket.Chat のユーザー名を決める
+
+    Args:
+        rule: "login" (ログイン名) または "email" (メールアドレスの @ より前)
+    """
+    if rule == "login":
+        value = user.get('login')
+    elif rule == "email":
+        email = user.get('email')
+        value = email.split('@', 1)[0] if isinstance(email, str) and '@' in email else None
+    else:
+        return None
+    return str(value) if value else None
+
+
+def convert_mentions(text: Optional[str], mapper: Mapper, resolved: Optional[Mapping[str, str]] = None) -> str:
     r"""
     OpenProjectのメンションタグをRocket.Chatのメンション形式に置換する。
     形式: <mention ... data-text="@User Name" ...>...</mention>
     出力: @mapped_user または @User Name
+    メンション直後のノーブレークスペース (&nbsp; または \u00a0) は除去する。
 
     Args:
         text: 変換対象のテキスト
         mapper: ユーザーマッピングを提供する Mapper インスタンス
+        resolved: users.csv に無いユーザーについて、data-id から解決した Rocket.Chat のユーザー名
     """
     if not text:
         return ""
 
-    def replace_match(match: re.Match[str]) -> str:
-        # group(1) は data-text="@..." 内のユーザー名
-        op_user = match.group(1)
+    # メンションを含まないコメントは走査せずにそのまま返す
+    if _OPEN not in text:
+        return text
+
+    out: List[str] = []
+    last = 0
+    for pos, end, tag_end, op_user in _MentionScanner(text).matches():
         rc_user = mapper.get_rc_user(op_user)
+        if not rc_user and resolved:
+            user_id = _user_id(text, pos, tag_end)
+            rc_user = resolved.get(user_id) if user_id is not None else None
 
-        if rc_user:
-            return f"@{rc_user}"
-        else:
-            return f"@{op_user}"
-
-    # 正規表現の解説:
-    # <mention\s+          : <mention と空白で開始
-    # [^>]*                : 他の属性をスキップ
-    # data-text="@([^"]+)" : data-text="@..." 内のコンテンツをキャプチャ
-    # [^>]*>               : 残りの属性をスキップしてタグを閉じる
-    # .*?                  : タグ内のコンテンツ（非強欲マッチ）
-    # </mention>           : 閉じタグ
-    # (?:&nbsp;|\u00a0)?   : メンション直後のノーブレークスペース（あれば）をマッチに含めて除去
-    pattern = r'<mention\s+[^>]*data-text="@([^"]+)"[^>]*>.*?</mention>(?:&nbsp;|\u00a0)?'
-    return re.sub(pattern, replace_match, text)
\ No newline at end of file
+        out.append(text[last:pos])
+        out.append(f"@{rc_user}" if rc_user else f"@{op_user}")
+        last = end
+    if last == 0:
+        return text
+    out.append(text[last:])
+    return ''.join(out)
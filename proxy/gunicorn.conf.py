@@ -0,0 +1,99 @@
+"""
+gunicorn のサーバー設定
+
+    gunicorn -c gunicorn.conf.py main:app
+
+- ワーカー数・スレッド数はコンテナに割り当てられた CPU 数 (cgroup の上限を考慮) から決める
+- preload_app (既定で有効) ではマスターで CSV マッピングを読み込んでから fork し、
+  全ワーカーで copy-on-write 共有する。HTTP セッション・キャッシュ・SQLite 接続・
+  バックグラウンドスレッドは post_fork でワーカーごとに作成する (services/runtime.py)
+
+環境変数 (GUNICORN_*) で個別に上書きできる。
+"""
+import gc
+import math
+import os
+import sys
+from typing import Optional
+
+
+def _available_cpus() -> int:
+    """コンテナの CPU 上限 (cgroup v2 / v1) と CPU アフィニティから使用可能な CPU 数を求める"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    quota: Optional[float] = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()[:2]
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit_us = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period_us = int(f.read())
+            if limit_us > 0:
+                quota = limit_us / period_us
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+CPUS = _available_cpus()
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+
+# 処理時間の大半は外部 API の待ち時間のため、CPU 数 + 1 のプロセスそれぞれに複数スレッドを持たせる
+# (プロセス数は上限を設けてメモリ使用量を抑える)
+workers = _env_int("GUNICORN_WORKERS", _env_int("WEB_CONCURRENCY", min(CPUS + 1, 8)))
+threads = _env_int("GUNICORN_THREADS", 4)
+worker_class = "gthread" if threads > 1 else "sync"
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+if preload_app:
+    # main.create_app() はマスターで呼ばれるため、ワーカー固有の依存性の作成を post_fork まで遅らせる
+    os.environ["WEBHOOK_PROXY_DEFER_START"] = "1"
+
+# Rocket.Chat 送信はリトライを含めて数十秒かかる場合がある
+timeout = _env_int("GUNICORN_TIMEOUT", 60)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+backlog = _env_int("GUNICORN_BACKLOG", 2048)
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 0)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 0)
+
+
+def pre_fork(server, worker):  # type: ignore[no-untyped-def]
+    # 読み込み済みのオブジェクトを GC の走査対象から外し、参照カウント以外で
+    # 共有ページが書き換わる (copy-on-write で複製される) のを防ぐ
+    gc.freeze()
+
+
+def post_fork(server, worker):  # type: ignore[no-untyped-def]
+    # preload 済みの main:app のみが対象 (asgi:app などは各ワーカーで読み込まれる)
+    main = sys.modules.get("main")
+    if preload_app and main is not None:
+        main.post_fork()
+
+
+def child_exit(server, worker):  # type: ignore[no-untyped-def]
+    # 終了したワーカー (再起動・max_requests による入れ替え) のメトリクスをアーカイブへ移す。
+    # カウンターの累計を保ち、存在しないワーカーのゲージを /metrics に残さない
+    metrics_dir = os.environ.get("METRICS_DIR", "")
+    if metrics_dir:
+        from core.metrics import REGISTRY
+        REGISTRY.mark_process_dead(worker.pid, metrics_dir)
+
+
+def when_ready(server):  # type: ignore[no-untyped-def]
+    server.log.info(
+        f"Server profile: {workers} workers x {threads} threads ({worker_class}), "
+        f"{CPUS} CPUs, preload_app={preload_app}"
+    )
@@ -1,31 +1,43 @@
 import logging
-from typing import Tuple
+import math
+import time
+from typing import Optional, Tuple
 from flask import Flask, request, jsonify, Response
+from werkzeug.exceptions import RequestEntityTooLarge
 import config
 from config import setup_logging, validate_config
 from core.mapper import Mapper
-from core.text_processor import convert_mentions
-from services.openproject import OpenProjectService
-from services.rocketchat import RocketChatService
+from core.metrics import OUTCOMES, REGISTRY, REQUEST_SECONDS, STAGE_SECONDS, record_ignored
+from core.pipeline import extract_comment_event, idempotency_key
+from services.delivery import deliver_event
+from services.readiness import check_readiness
+from services.rocketchat import SHED_RESULTS, TIMEOUT_RESULT
+from services.runtime import WorkerRuntime
 
 # ロギング設定（最初に実行）
 setup_logging()
 logger = logging.getLogger(__name__)
 
 
-def create_app() -> Flask:
+def create_app(defer_start: bool = config.DEFER_WORKER_START) -> Flask:
     """
     Flask アプリケーションを作成する (Application Factory パターン)
 
+    Args:
+        defer_start: True の場合、HTTP セッションやバックグラウンドスレッドなどのワーカー固有の
+            依存性を作成せず、fork 後の post_fork フック (または最初のリクエスト) で作成する
+            (gunicorn の preload_app 用。gunicorn.conf.py を参照)
+
     Returns:
         設定済みの Flask アプリケーション
     """
     app = Flask(__name__)
+    # Content-Length が上限を超えるボディは読み込まずに 413 を返す
+    # (チャンク転送のボディは上限で切り詰められるため、1 バイト多く読めたかで超過を判定する)
+    app.config['MAX_CONTENT_LENGTH'] = config.WEBHOOK_MAX_BODY_BYTES + 1
 
-    # 依存性のインスタンス化
+    # CSV マッピングはここで読み込み、preload 時は全ワーカーで copy-on-write 共有する
     mapper = Mapper()
-    op_service = OpenProjectService()
-    rc_service = RocketChatService()
 
     # 設定検証
     is_valid, errors = validate_config()
@@ -35,82 +47,90 @@ def create_app() -> Flask:
             logger.error(f"  - {error}")
         raise RuntimeError("Invalid configuration. Check environment variables and CSV files.")
 
-    logger.info("Application initialized successfully")
+    # ワーカーごとの依存性 (サービス、キャッシュ、Spool、バックグラウンドスレッド)
+    runtime = WorkerRuntime(mapper)
+    app.extensions['runtime'] = runtime
+    if not defer_start:
+        runtime.start()
+
+    logger.info(f"Application initialized successfully (delivery mode: {config.DELIVERY_MODE})")
 
     # ルート定義
     @app.route('/webhook', methods=['POST'])
     def webhook() -> Tuple[Response, int]:
         """OpenProjectからのWebhookを受信・処理するエンドポイント"""
+        started = time.perf_counter()
+        key: Optional[str] = None
+        rt = runtime.current()
         try:
-            data = request.json
-            if not data:
+            # デコード結果をリクエストに保持しないよう、request.json ではなくボディから直接抽出する
+            body = request.get_data(cache=False)
+            if len(body) > config.WEBHOOK_MAX_BODY_BYTES:
+                raise RequestEntityTooLarge()
+            if not body:
+                record_ignored("no json")
                 return jsonify({"status": "ignored", "reason": "no json"}), 400
 
-            # フィルタリング: ワークパッケージのコメント投稿アクションのみを処理
-            action = data.get('action')
-            if action != 'work_package_comment:comment':
-                return jsonify({"status": "ignored", "reason": f"unsupported action: {action}"}), 200
-
-            # Activity と Work Package 情報を抽出
-            activity = data.get('activity', {})
-            embedded = activity.get('_embedded', {})
-            work_package = embedded.get('workPackage', {})
-
-            # コメント本文を抽出
-            comment_body = activity.get('comment', {}).get('raw')
-            if not comment_body:
-                return jsonify({"status": "ignored", "reason": "no comment content"}), 200
-
-            # 処理開始
-            wp_id = work_package.get('id', '?')
-            logger.info(f"Processing webhook for WP #{wp_id}")
-
-            # 1. メンション変換（mapper を引数として渡す）
-            converted_notes = convert_mentions(comment_body, mapper)
-
-            # 2. 通知先チャンネルの決定 (プロジェクト名に基づく)
-            project_title = work_package.get('_links', {}).get('project', {}).get('title')
-            target_channel = mapper.get_channel(project_title)
-
-            # 3. 投稿者名の解決 (OpenProject API経由)
-            user_href = activity.get('_links', {}).get('user', {}).get('href')
-            author_name = op_service.get_user_name(user_href)
-
-            # 4. 通知メッセージの組み立て
-            wp_subject = work_package.get('subject', 'No Subject')
-
-            # プロジェクト識別子の取得を試みる
-            project_href = work_package.get('_links', {}).get('project', {}).get('href')
-            if project_href:
-                # /api/v3/projects/demo -> demo を抽出
-                project_id = project_href.rstrip('/').split('/')[-1]
-                wp_url = f"{config.OP_WEB_URL.rstrip('/')}/projects/{project_id}/work_packages/{wp_id}"
-            else:
-                # フォールバック: プロジェクトパスなしのシンプルな形式
-                logger.warning(f"Project href not found in webhook payload for WP #{wp_id}, using simple URL format")
-                wp_url = f"{config.OP_WEB_URL.rstrip('/')}/work_packages/{wp_id}"
-
-            message_text = f"### [{wp_subject}] (#{wp_id})\n🔗 [OpenProjectで表示]({wp_url})\n\n{converted_notes}"
-
-            # 5. Rocket.Chat への送信
-            success, result = rc_service.send_message(target_channel, message_text, alias=author_name)
-
-            if success:
-                return jsonify({"status": "success", "channel": result}), 200
-            else:
-                return jsonify({"status": "error", "message": result}), 500
+            # フィルタリングと必要項目の抽出
+            parse_started = time.perf_counter()
+            event, reason = extract_comment_event(body)
+            del body
+            STAGE_SECONDS.observe_since(parse_started, "parse")
+            if event is None:
+                record_ignored(reason)
+                return jsonify({"status": "ignored", "reason": reason}), 200
+
+            # 同じ activity の再送は配送済み (または配送中) として即座に応答する
+            if rt.seen is not None:
+                key = idempotency_key(event)
+                if not rt.seen.add(key):
+                    logger.info("Duplicate webhook for WP #%s suppressed", event.wp_id)
+                    OUTCOMES.inc("duplicate")
+                    return jsonify({"status": "duplicate"}), 200
+
+            # 非同期モード: Spool に書き込んで即座に受理を返す
+            if rt.spool is not None:
+                event_id = rt.spool.enqueue(event.to_dict())
+                logger.info("Queued webhook for WP #%s (spool id: %s)", event.wp_id, event_id)
+                OUTCOMES.inc("accepted")
+                return jsonify({"status": "accepted", "id": event_id}), 202
+
+            delivery = deliver_event(event, mapper, rt.op_service, rt.sender, rt.dead_letters, fanout=rt.fanout)
+            success, result = delivery.success, delivery.result
+            if not success and result != TIMEOUT_RESULT:
+                # 確実に届いていない場合は登録を取り消し、OpenProject の再送を受け付ける
+                rt.release(key)
+
+            if result in SHED_RESULTS:
+                # Rocket.Chat の障害中・レート制限中は待たずに 503 を返し、OpenProject の再送に任せる
+                response = jsonify({"status": "unavailable", "message": result})
+                response.headers["Retry-After"] = str(max(1, math.ceil(rt.rc_service.retry_after())))
+                return response, 503
+            # いずれかの送信先に届いた場合は配送済みとして 200 を返す
+            return jsonify(delivery.response_body()), 200 if success else 500
+
+        except RequestEntityTooLarge:
+            logger.warning("Webhook body exceeds %s bytes, rejected", config.WEBHOOK_MAX_BODY_BYTES)
+            record_ignored("too large")
+            return jsonify({"status": "error", "message": "Request body too large"}), 413
 
         except ValueError as e:
             # バリデーションエラー（入力データの問題）
-            logger.warning(f"Validation error processing webhook: {e}")
+            logger.warning("Validation error processing webhook: %s", e)
+            OUTCOMES.inc("invalid")
             return jsonify({"status": "error", "message": "Invalid request data"}), 400
 
         except Exception as e:
             # 予期しないエラー（内部エラー）
             logger.exception("Unexpected error processing webhook")
+            OUTCOMES.inc("error")
+            rt.release(key)
             # 内部エラー詳細を露出しない
             return jsonify({"status": "error", "message": "Internal server error"}), 500
 
+        finally:
+            REQUEST_SECONDS.observe_since(started)
+
     @app.route('/health', methods=['GET'])
     def health() -> Tuple[Response, int]:
         """
@@ -119,32 +139,34 @@ def create_app() -> Flask:
         """
         return jsonify({"status": "ok"}), 200
 
+    @app.route('/stats', methods=['GET'])
+    def stats() -> Tuple[Response, int]:
+        """運用確認用: 接続プールなどの内部統計を返す"""
+        rt = runtime.current()
+        return jsonify({
+            "pid": rt.pid,
+            "rocketchat_transport": rt.rc_service.transport.stats(),
+            "rocketchat_rate_limit": rt.rc_service.limiter.stats(),
+            "logging": config.logging_stats(),
+            "user_cache": rt.op_service.user_cache.stats(),
+            "shared_user_cache": rt.op_service.shared_cache.stats() if rt.op_service.shared_cache else None,
+            "coalescer": rt.coalescer.stats() if rt.coalescer else None,
+            "dead_letters": rt.dead_letters.stats() if rt.dead_letters else None
+        }), 200
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics() -> Response:
+        """Prometheus 形式のメトリクス (METRICS_DIR 設定時は全ワーカーの合算)"""
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
     @app.route('/ready', methods=['GET'])
     def ready() -> Tuple[Response, int]:
         """
         Readiness probe: アプリケーションがリクエストを受け付けられるかチェック
         設定の妥当性と外部依存の状態を確認
         """
-        checks = {
-            "config": False,
-            "csv_files": False,
-            "details": []
-        }
-
-        # 設定検証
-        is_valid, errors = validate_config()
-        checks["config"] = is_valid
-        if errors:
-            checks["details"].extend(errors)
-
-        # CSV マッピング確認
-        if mapper.users_map or mapper.projects_map:
-            checks["csv_files"] = True
-        else:
-            checks["details"].append("No CSV mappings loaded")
-
-        # 全体的な準備状態
-        is_ready = checks["config"] and checks["csv_files"]
+        rt = runtime.current()
+        is_ready, checks = check_readiness(mapper, rt.spool, rt.warmer, rt.breakers, rt.monitor)
 
         status_code = 200 if is_ready else 503
         return jsonify({
@@ -159,6 +181,11 @@ def create_app() -> Flask:
 app = create_app()
 
 
+def post_fork() -> None:
+    """gunicorn のワーカーで fork 直後に呼ばれ、ワーカー固有の依存性を作成する"""
+    app.extensions['runtime'].current()
+
+
 if __name__ == '__main__':
     # 開発サーバー（本番では gunicorn を使用）
     app.run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,131 @@
+"""
+配送に失敗して保存された通知 (DEAD_LETTER_PATH) を Rocket.Chat へ再送する
+
+Rocket.Chat の停止・メンテナンス後に、保存された通知を並行して再送する。
+再送済みの通知は記録されるため、途中で中断した場合や同じ条件で再実行した場合も
+二重には送られない。送信の途中でタイムアウトした通知は投稿済みの可能性があるため、
+--include-timeouts を指定しない限り再送しない。
+
+使い方:
+    cd proxy
+    python replay_dead_letters.py --dry-run
+    python replay_dead_letters.py --since 6h --channel '#dev-team' --concurrency 8 --rate 15
+
+終了コード: すべて再送 (または配送済み) なら 0、失敗・未送信が残れば 1
+"""
+import argparse
+import logging
+import re
+import sys
+import time
+from datetime import datetime
+from typing import List, Optional
+
+import config
+from config import setup_logging
+from core.circuit_breaker import build_breaker
+from core.dead_letter import DeadLetterFilter, DeadLetterStore
+from core.dedup import build_seen_set
+from core.rate_limit import RateLimiter
+from services.replay import DEFERRED, FAILED, DeadLetterReplayer
+from services.rocketchat import TIMEOUT_RESULT, RocketChatService
+
+logger = logging.getLogger(__name__)
+
+_RELATIVE = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_time(value: str) -> float:
+    """`30m`・`6h`・`2d` のような現在からの相対時間、または ISO 8601 形式の時刻を UNIX 時刻に変換する"""
+    match = _RELATIVE.match(value)
+    if match:
+        return time.time() - float(match.group(1)) * _UNITS[match.group(2)]
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time: {value} (e.g. 6h, 2026-01-13T09:00)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=parse_time, help="この時刻以降に失敗した通知のみ (例: 6h, 2026-01-13T09:00)")
+    parser.add_argument("--until", type=parse_time, help="この時刻より前に失敗した通知のみ")
+    parser.add_argument("--channel", action="append", default=[], help="送信先チャンネル (複数指定可)")
+    parser.add_argument(
+        "--instance", action="append", default=[], help="送信先の Rocket.Chat インスタンス (RC_INSTANCES の名前、複数指定可)"
+    )
+    parser.add_argument("--project", action="append", default=[], help="プロジェクト名 (複数指定可)")
+    parser.add_argument(
+        "--include-timeouts", action="store_true", help="タイムアウトした (投稿済みの可能性がある) 通知も再送する"
+    )
+    parser.add_argument("--limit", type=int, help="再送する最大件数")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時に送信する数")
+    parser.add_argument(
+        "--rate", type=float, default=config.RC_RATE_LIMIT, help="送信レートの上限 (件/秒、Rocket.Chat インスタンスごと)"
+    )
+    parser.add_argument(
+        "--channel-rate", type=float, default=config.RC_CHANNEL_RATE_LIMIT, help="チャンネルごとの送信レートの上限 (件/秒)"
+    )
+    parser.add_argument("--path", default=config.DEAD_LETTER_PATH, help="保存先 (既定: DEAD_LETTER_PATH)")
+    parser.add_argument("--dry-run", action="store_true", help="再送せず、対象の件数をチャンネルごとに表示する")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    setup_logging()
+    if not args.path:
+        logger.error("DEAD_LETTER_PATH is not set")
+        return 1
+
+    filters = DeadLetterFilter(
+        since=args.since,
+        until=args.until,
+        channels=args.channel,
+        instances=args.instance,
+        projects=args.project,
+        exclude_errors=() if args.include_timeouts else (TIMEOUT_RESULT,)
+    )
+    store = DeadLetterStore(args.path)
+
+    if args.dry_run:
+        pending = store.count_by_channel(filters)
+        for channel, count in pending:
+            print(f"{count:8d}  {channel}")
+        print(f"{sum(count for _, count in pending):8d}  total")
+        return 0
+
+    # 送信枠は待つ (ワーカーと違い打ち切らない)。稼働中のワーカーの送信と合わせて上限を決めること
+    def build_limiter() -> RateLimiter:
+        return RateLimiter(
+            rate=args.rate,
+            burst=max(1.0, args.rate),
+            channel_rate=args.channel_rate,
+            channel_burst=max(1.0, args.channel_rate),
+            max_wait=3600
+        )
+
+    instances = {
+        name: RocketChatService(breaker=build_breaker(f"rocketchat:{name}"), limiter=build_limiter(), webhook_url=url)
+        for name, url in config.RC_INSTANCES.items()
+    }
+    # ワーカーと同じ共有の重複判定を使い、OpenProject の再送で配送済みの通知を除く
+    seen = None
+    if config.DEDUP_SHARED_PATH:
+        seen = build_seen_set(config.DEDUP_SHARED_PATH, config.DEDUP_TTL, config.DEDUP_MAXSIZE)
+    replayer = DeadLetterReplayer(
+        store, RocketChatService(limiter=build_limiter()), seen=seen, concurrency=args.concurrency, instances=instances
+    )
+
+    started = time.perf_counter()
+    results = replayer.run(filters, limit=args.limit)
+    elapsed = time.perf_counter() - started
+    total = sum(results.values())
+    print(", ".join(f"{name}: {count}" for name, count in results.items())
+          + f" ({total} in {elapsed:.1f}s, {total / elapsed if elapsed > 0 else 0:.1f}/s)")
+    return 1 if results[FAILED] or results[DEFERRED] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
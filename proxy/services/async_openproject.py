@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+import httpx
+import config
+from core.cache import TTLCache
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError, build_breaker, is_healthy_status
+from core.metrics import MENTION_RESOLUTIONS, USER_CACHE_LOOKUPS
+from core.shared_cache import SharedCache
+from core.text_processor import rc_username
+from services.async_transport import AsyncHttpTransport
+
+logger = logging.getLogger(__name__)
+
+
+def build_op_transport() -> AsyncHttpTransport:
+    """OpenProject API 向けの非同期トランスポートを設定値から構築する"""
+    return AsyncHttpTransport(
+        name="openproject",
+        pool_size=config.OP_POOL_SIZE,
+        connect_timeout=5,
+        read_timeout=5,
+        retries=3,
+        backoff_factor=1,
+        allowed_methods=("GET",),
+        status_forcelist=(429, 500, 502, 503, 504)
+    )
+
+
+class AsyncOpenProjectService:
+    """
+    OpenProjectService の asyncio 版 (ASGI モード用)。
+
+    キャッシュは同期版と同じ TTLCache / SharedCache を使うため、
+    同じプロセス内の同期版 (ウォームアップや Spool 配送ワーカー) と共有できる。
+    """
+    user_cache: TTLCache[str]
+    mention_cache: TTLCache[str]
+    shared_cache: Optional[SharedCache]
+    transport: AsyncHttpTransport
+    breaker: CircuitBreaker
+
+    def __init__(
+        self,
+        user_cache: Optional[TTLCache[str]] = None,
+        shared_cache: Optional[SharedCache] = None,
+        transport: Optional[AsyncHttpTransport] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        mention_cache: Optional[TTLCache[str]] = None
+    ) -> None:
+        self.user_cache = user_cache or TTLCache(
+            maxsize=config.USER_CACHE_MAXSIZE,
+            ttl=config.USER_CACHE_TTL,
+            negative_ttl=config.USER_CACHE_NEGATIVE_TTL
+        )
+        self.mention_cache = mention_cache or TTLCache(
+            maxsize=config.USER_CACHE_MAXSIZE,
+            ttl=config.USER_CACHE_TTL,
+            negative_ttl=config.USER_CACHE_NEGATIVE_TTL
+        )
+        self.shared_cache = shared_cache
+        self.transport = transport or build_op_transport()
+        self.breaker = breaker or build_breaker("openproject")
+        # 同一ユーザーの同時問い合わせを 1 回にまとめるための実行中タスク
+        # (メンションの解決は "mention:<ID>" をキーにする)
+        self._inflight: Dict[str, "asyncio.Future[Optional[str]]"] = {}
+
+    async def get_user_name(self, user_href: Optional[str]) -> str:
+        """OpenProject APIからユーザー名を取得する (キャッシュ・同時問い合わせの集約あり)"""
+        if not user_href:
+            return "OpenProject"
+
+        found, cached = self.user_cache.lookup(user_href)
+        if found:
+            USER_CACHE_LOOKUPS.inc("hit")
+            return cached or "OpenProject"
+
+        if not config.OP_API_KEY:
+            logger.warning("OP_API_KEY not configured")
+            return "OpenProject"
+
+        if not self.breaker.available():
+            # 遮断中は API を呼ばず、共有キャッシュか既定名で即座に応答する (結果はキャッシュしない)
+            return await self._cached_or_default(user_href)
+
+        task = self._inflight.get(user_href)
+        if task is None:
+            task = asyncio.ensure_future(self._load_user_name(user_href))
+            self._inflight[user_href] = task
+            task.add_done_callback(lambda _: self._inflight.pop(user_href, None))
+        # 呼び出し元がキャンセルされても、待っている他のリクエストのために取得は続ける
+        try:
+            name = await asyncio.shield(task)
+        except CircuitOpenError:
+            # 確認後に遮断された (半開状態で試行の枠が無かった) 場合も、結果をキャッシュせず同様に応答する
+            return await self._cached_or_default(user_href)
+        return name or "OpenProject"
+
+    async def get_user_names(self, user_href: Optional[str], mention_ids: Sequence[str]) -> Tuple[str, Dict[str, str]]:
+        """
+        投稿者名と、メンションされたユーザー (data-id) の Rocket.Chat ユーザー名を並行して取得する
+
+        Returns:
+            (投稿者名, ユーザー ID -> Rocket.Chat ユーザー名)。解決できなかった ID は含まない
+        """
+        resolved: Dict[str, str] = {}
+        missing = []
+        for user_id in mention_ids:
+            found, username = self.mention_cache.lookup(user_id)
+            if not found:
+                missing.append(user_id)
+                continue
+            MENTION_RESOLUTIONS.inc("cached")
+            if username:
+                resolved[user_id] = username
+
+        if not (missing and config.OP_API_KEY and self.breaker.available()):
+            return await self.get_user_name(user_href), resolved
+
+        # 同時に問い合わせる数は共有の接続プール (OP_POOL_SIZE) で抑えられる
+        author_name, usernames = await asyncio.gather(
+            self.get_user_name(user_href), asyncio.gather(*(self._resolve_mention(user_id) for user_id in missing))
+        )
+        for user_id, username in zip(missing, usernames):
+            if username:
+                resolved[user_id] = username
+        return author_name, resolved
+
+    async def _resolve_mention(self, user_id: str) -> Optional[str]:
+        key = f"mention:{user_id}"
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load_mention(user_id))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        try:
+            return await asyncio.shield(task)
+        except CircuitOpenError:
+            return None  # 問い合わせなかったメンションはキャッシュせず、次の通知で解決する
+
+    async def _load_mention(self, user_id: str) -> Optional[str]:
+        """メンションされたユーザーを API から取得し、MENTION_RESOLVE_RULE で Rocket.Chat のユーザー名に変換する"""
+        user_href = f"/api/v3/users/{user_id}"
+        user = await self._fetch_user(user_href)
+        username = rc_username(user, config.MENTION_RESOLVE_RULE) if user is not None else None
+        MENTION_RESOLUTIONS.inc("resolved" if username else "unresolved")
+        self.mention_cache.set(user_id, username)
+        if user is not None and user.get('name'):
+            # 同じユーザーが投稿者になった場合のために表示名もキャッシュする
+            self.user_cache.set(user_href, str(user['name']))
+        return username
+
+    async def _cached_or_default(self, user_href: str) -> str:
+        if self.shared_cache is not None:
+            found, name = await asyncio.to_thread(self.shared_cache.get, user_href)
+            if found and name:
+                USER_CACHE_LOOKUPS.inc("shared_hit")
+                return name
+        return "OpenProject"
+
+    async def _load_user_name(self, user_href: str) -> Optional[str]:
+        """共有キャッシュを参照し、無ければ API から取得して両方のキャッシュへ書き込む"""
+        if self.shared_cache is not None:
+            # SQLite へのアクセスはイベントループを止めないようスレッドで行う
+            found, name = await asyncio.to_thread(self.shared_cache.get, user_href)
+            if found:
+                USER_CACHE_LOOKUPS.inc("shared_hit")
+                self.user_cache.set(user_href, name)
+                return name
+
+        USER_CACHE_LOOKUPS.inc("miss")
+        name = await self._fetch_user_name(user_href)
+        self.user_cache.set(user_href, name)
+
+        if self.shared_cache is not None:
+            ttl = config.USER_CACHE_TTL if name else config.USER_CACHE_NEGATIVE_TTL
+            await asyncio.to_thread(self.shared_cache.set, user_href, name, ttl)
+        return name
+
+    async def _fetch_user_name(self, user_href: str) -> Optional[str]:
+        """
+        OpenProject API を呼び出してユーザー名を取得する
+
+        Returns:
+            ユーザー名。取得できなかった場合は None (negative キャッシュされる)
+
+        Raises:
+            CircuitOpenError: サーキットブレーカーが呼び出しを許可しなかった場合
+        """
+        user_data = await self._fetch_user(user_href)
+        if user_data is None:
+            return None
+        name = user_data.get('name')
+        if name:
+            logger.debug("Cached user: %s -> %s", user_href, name)
+            return str(name)
+        logger.warning("User %s has no name field", user_href)
+        return None
+
+    async def _fetch_user(self, user_href: str) -> Optional[Dict[str, Any]]:
+        """
+        OpenProject API からユーザー情報を取得する (取得できなかった場合は None)
+
+        Raises:
+            CircuitOpenError: サーキットブレーカーが呼び出しを許可しなかった場合
+                (API が返した結果ではないため、呼び出し元はキャッシュしない)
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.name)
+
+        started = time.perf_counter()
+        healthy = False
+        try:
+            url = f"{config.OP_API_URL.rstrip('/')}{user_href}"
+            logger.debug("Fetching user info from %s", url)
+
+            headers = {'Host': config.OP_API_HOST}
+            response = await self.transport.get(
+                url,
+                auth=('apikey', config.OP_API_KEY or ''),
+                headers=headers
+            )
+            healthy = is_healthy_status(response.status_code)
+
+            if response.status_code == 200:
+                user_data = response.json()
+                if isinstance(user_data, dict):
+                    return user_data
+                logger.error("Invalid JSON response for user: %s", user_href)
+            else:
+                logger.warning("Failed to fetch user %s: %s", user_href, response.status_code)
+
+        except httpx.TimeoutException:
+            logger.error("Timeout fetching user info: %s", user_href)
+        except httpx.TransportError:
+            logger.error("Connection error fetching user info: %s", user_href)
+        except ValueError:
+            logger.error("Invalid JSON response for user: %s", user_href)
+        except Exception as e:
+            logger.error("Unexpected error fetching user info: %s", e)
+        finally:
+            self.breaker.record(healthy, time.perf_counter() - started)
+
+        return None
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
@@ -0,0 +1,151 @@
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+import httpx
+import config
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError, build_breaker, is_healthy_status
+from core.rate_limit import RateLimitedError, RateLimiter, build_rc_limiter, rate_limit_delay
+from services.async_transport import AsyncHttpTransport
+from services.rocketchat import CIRCUIT_OPEN_RESULT, RATE_LIMITED_RESULT, TIMEOUT_RESULT
+
+logger = logging.getLogger(__name__)
+
+
+def build_async_rc_transport() -> AsyncHttpTransport:
+    """Rocket.Chat 向けの非同期トランスポートを設定値から構築する (同期版と同じ再試行条件)"""
+    return AsyncHttpTransport(
+        name="rocketchat",
+        pool_size=config.RC_POOL_SIZE,
+        connect_timeout=config.RC_CONNECT_TIMEOUT,
+        read_timeout=config.RC_READ_TIMEOUT,
+        retries=config.RC_RETRY_TOTAL,
+        backoff_factor=1,
+        allowed_methods=("POST",),
+        # 500 は処理済みの可能性があるため再試行対象外 (400 はフォールバック処理、429 は _post で扱う)
+        status_forcelist=(502, 503, 504),
+        retry_read=False
+    )
+
+
+def build_async_instance_services() -> Dict[str, "AsyncRocketChatService"]:
+    """RC_INSTANCES に定義した追加の Rocket.Chat インスタンスごとに非同期の送信サービスを構築する"""
+    return {
+        name: AsyncRocketChatService(breaker=build_breaker(f"rocketchat:{name}"), webhook_url=url)
+        for name, url in config.RC_INSTANCES.items()
+    }
+
+
+class AsyncRocketChatService:
+    """RocketChatService の asyncio 版 (ASGI モード用)"""
+    transport: AsyncHttpTransport
+    breaker: CircuitBreaker
+    limiter: RateLimiter
+    webhook_url: Optional[str]
+
+    def __init__(
+        self,
+        transport: Optional[AsyncHttpTransport] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        limiter: Optional[RateLimiter] = None,
+        webhook_url: Optional[str] = None
+    ) -> None:
+        self.transport = transport or build_async_rc_transport()
+        self.breaker = breaker or build_breaker("rocketchat")
+        self.limiter = limiter or build_rc_limiter()
+        self.webhook_url = webhook_url  # None の場合は RC_WEBHOOK_URL
+
+    async def send_message(self, channel: str, text: str, alias: str = "OpenProject") -> Tuple[bool, str]:
+        """Rocket.Chatにメッセージを送信する"""
+        url = self.webhook_url or config.RC_WEBHOOK_URL
+        if not url:
+            logger.error("RC_WEBHOOK_URL is not set.")
+            return False, "Server misconfiguration"
+
+        payload = {
+            "channel": channel,
+            "text": text,
+            "alias": alias,
+            "icon_emoji": ":clipboard:"
+        }
+
+        try:
+            await self._post(url, payload)
+            logger.info("Message sent successfully to %s", channel)
+            return True, channel
+
+        except CircuitOpenError:
+            logger.warning("Rocket.Chat circuit open, not sending message to %s", channel)
+            return False, CIRCUIT_OPEN_RESULT
+
+        except RateLimitedError as e:
+            logger.warning("Rocket.Chat rate limit exceeded, not sending message to %s (%s)", channel, e)
+            return False, RATE_LIMITED_RESULT
+
+        except httpx.HTTPStatusError as e:
+            # フォールバック処理
+            if e.response.status_code == 400 and channel != config.DEFAULT_CHANNEL:
+                logger.warning("Channel %s not found (400). Retrying with default channel %s", channel, config.DEFAULT_CHANNEL)
+                payload["channel"] = config.DEFAULT_CHANNEL
+                try:
+                    await self._post(url, payload)
+                    logger.info("Message sent to fallback channel %s", config.DEFAULT_CHANNEL)
+                    return True, config.DEFAULT_CHANNEL
+                except Exception as retry_e:
+                    logger.error("Fallback to default channel failed: %s", retry_e)
+                    return False, "Failed to send message to both target and default channel"
+            else:
+                logger.error("HTTP error sending message: %s", e.response.status_code)
+                return False, "Failed to send message"
+
+        except httpx.TimeoutException:
+            logger.error("Timeout sending message to Rocket.Chat")
+            return False, TIMEOUT_RESULT
+
+        except httpx.TransportError:
+            logger.error("Connection error sending message to Rocket.Chat")
+            return False, "Connection error"
+
+        except Exception as e:
+            logger.error("Unexpected error sending message: %s", e)
+            return False, "Unexpected error"
+
+    async def _post(self, url: str, payload: Dict[str, Any]) -> None:
+        """実際のHTTPリクエストを実行 (同期版と同じレート制限・429 の扱い)"""
+        channel_name = payload.get('channel', 'default')
+        logger.debug("Sending to %s: %.50s...", channel_name, payload.get('text', ''))
+        if not self.breaker.available():
+            raise CircuitOpenError(self.breaker.name)
+
+        delay = 0.0  # 最後に指示された待ち時間
+        for _ in range(2):
+            await self.limiter.acquire_async(channel_name)
+            resp = await self._send(url, payload)
+            retry_delay = rate_limit_delay(resp)
+            if retry_delay is None:
+                break
+            delay = retry_delay
+            self.limiter.pause(delay)
+        else:
+            raise RateLimitedError(delay)
+
+        if resp.status_code != 200:
+            logger.error("Rocket.Chat Error: %s - %s", resp.status_code, resp.text)
+        resp.raise_for_status()
+
+    async def _send(self, url: str, payload: Dict[str, Any]) -> httpx.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.name)
+        started = time.perf_counter()
+        healthy = False
+        try:
+            resp = await self.transport.post(url, json=payload)
+            healthy = resp.status_code == 429 or is_healthy_status(resp.status_code)
+        finally:
+            self.breaker.record(healthy, time.perf_counter() - started)
+        return resp
+
+    def retry_after(self) -> float:
+        return max(self.breaker.retry_after(), self.limiter.retry_after())
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
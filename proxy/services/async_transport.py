@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+import httpx
+from core.metrics import HTTP_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# 接続が確立していないため、どのメソッドでも安全に再試行できるエラー
+_CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# 送信済みの可能性があるエラー (retry_read=True の場合のみ再試行する)
+_READ_ERRORS = (httpx.ReadError, httpx.ReadTimeout, httpx.WriteError, httpx.RemoteProtocolError)
+
+
+class AsyncHttpTransport:
+    """
+    HttpTransport の asyncio 版。
+
+    keep-alive 接続をプールして再利用し、同時実行数を pool_size で制限する。
+    再試行の条件 (対象メソッド・ステータス・読み取りエラーの扱い) は
+    urllib3 の Retry を使う同期版と揃えている。
+    """
+    client: httpx.AsyncClient
+    pool_size: int
+    retries: int
+    backoff_factor: float
+
+    def __init__(
+        self,
+        pool_size: int,
+        connect_timeout: float,
+        read_timeout: float,
+        retries: int = 3,
+        backoff_factor: float = 1,
+        allowed_methods: Tuple[str, ...] = ("GET",),
+        status_forcelist: Tuple[int, ...] = (429, 500, 502, 503, 504),
+        retry_read: bool = True,
+        client: Optional[httpx.AsyncClient] = None,
+        name: str = "http"
+    ) -> None:
+        self.name = name  # メトリクスのラベル (送信先の識別子)
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.allowed_methods = frozenset(allowed_methods)
+        self.status_forcelist = frozenset(status_forcelist)
+        self.retry_read = retry_read
+        self.client = client or httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+        # Semaphore はイベントループに紐づくため、最初のリクエスト時に作成する
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._requests = 0
+        self._in_flight = 0
+        self._retried = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """プール済み接続でリクエストを送信し、必要に応じて再試行する"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+
+        started = time.monotonic()
+        async with self._slots:
+            waited = time.monotonic() - started
+            self._requests += 1
+            self._in_flight += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            try:
+                return await self._request_with_retry(method, url, **kwargs)
+            finally:
+                self._in_flight -= 1
+
+    async def _request_with_retry(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except _CONNECT_ERRORS:
+                if attempt >= self.retries:
+                    raise
+                delay = self._backoff(attempt)
+            except _READ_ERRORS:
+                if not self.retry_read or method not in self.allowed_methods or attempt >= self.retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                if (
+                    response.status_code not in self.status_forcelist
+                    or method not in self.allowed_methods
+                    or attempt >= self.retries
+                ):
+                    return response
+                delay = self._retry_after(response) or self._backoff(attempt)
+                await response.aclose()
+
+            attempt += 1
+            self._retried += 1
+            HTTP_RETRIES.inc(self.name)
+            logger.debug("Retrying %s %s in %.1fs (attempt %s/%s)", method, url, delay, attempt, self.retries)
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        """1秒、2秒、4秒と再試行間隔を増やす (backoff_factor=1 の場合)"""
+        return float(self.backoff_factor * (2 ** attempt))
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> Optional[float]:
+        """429/503 の Retry-After (秒数指定のみ) を尊重する"""
+        value = response.headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return None
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """同時実行数・再試行回数・接続待ち時間の統計情報を返す"""
+        return {
+            "pool_size": self.pool_size,
+            "requests": self._requests,
+            "in_flight": self._in_flight,
+            "retries": self._retried,
+            "wait_avg_ms": round(self._wait_total / self._requests * 1000, 3) if self._requests else 0.0,
+            "wait_max_ms": round(self._wait_max * 1000, 3),
+        }
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,123 @@
+import logging
+import threading
+from typing import Any, Dict, List, Tuple
+import config
+from services.rocketchat import MessageSender
+
+logger = logging.getLogger(__name__)
+
+# 結合したメッセージ間の区切り
+SEPARATOR = "\n\n---\n\n"
+
+
+class _Batch:
+    """同一チャンネル宛てに蓄積中のメッセージ群"""
+
+    def __init__(self) -> None:
+        self.items: List[Tuple[str, str]] = []  # (alias, text)
+        self.chars = 0
+        self.closed = threading.Event()  # 件数・サイズ上限に達した
+        self.done = threading.Event()    # 送信完了
+        self.result: Tuple[bool, str] = (False, "Not sent")
+
+
+class MessageCoalescer:
+    """
+    チャンネルごとにメッセージを短時間まとめて 1 件の投稿として送信する。
+
+    最初に到着したメッセージの呼び出し元が「リーダー」となり、window 秒待つか
+    件数・サイズ上限に達した時点でまとめて送信する。後続の呼び出し元は
+    その送信結果を待って共有するため、追加の待ち時間は最大でも window 秒となる。
+    RocketChatService.send_message と同じインターフェースを持つ。
+    """
+    sender: MessageSender
+    window: float
+    max_messages: int
+    max_chars: int
+
+    def __init__(
+        self,
+        sender: MessageSender,
+        window: float = config.COALESCE_WINDOW,
+        max_messages: int = config.COALESCE_MAX_MESSAGES,
+        max_chars: int = config.COALESCE_MAX_CHARS
+    ) -> None:
+        self.sender = sender
+        self.window = window
+        self.max_messages = max_messages
+        self.max_chars = max_chars
+        self._batches: Dict[str, _Batch] = {}
+        self._lock = threading.Lock()
+        self._messages_in = 0
+        self._posts_out = 0
+
+    def send_message(self, channel: str, text: str, alias: str = "OpenProject") -> Tuple[bool, str]:
+        """メッセージをバッチに追加し、まとめて送信された結果を返す"""
+        with self._lock:
+            self._messages_in += 1
+            batch = self._batches.get(channel)
+            if batch is not None and batch.items and batch.chars + len(text) > self.max_chars:
+                # サイズ上限を超える場合は現在のバッチを締め切り、新しいバッチを開始する
+                self._close_locked(channel, batch)
+                batch = None
+
+            leader = batch is None
+            if batch is None:
+                batch = _Batch()
+                self._batches[channel] = batch
+
+            batch.items.append((alias, text))
+            batch.chars += len(text) + len(SEPARATOR)
+            if len(batch.items) >= self.max_messages:
+                self._close_locked(channel, batch)
+
+        if not leader:
+            batch.done.wait()
+            return batch.result
+
+        # リーダー: 締め切りまで待ってからまとめて送信する
+        batch.closed.wait(self.window)
+        with self._lock:
+            if self._batches.get(channel) is batch:
+                del self._batches[channel]
+            items = list(batch.items)
+            self._posts_out += 1
+
+        try:
+            combined_alias, combined_text = self._combine(items)
+            if len(items) > 1:
+                logger.info("Coalesced %s messages for %s", len(items), channel)
+            batch.result = self.sender.send_message(channel, combined_text, alias=combined_alias)
+        except Exception as e:
+            logger.error("Unexpected error sending coalesced message: %s", e)
+            batch.result = (False, "Unexpected error")
+        finally:
+            batch.done.set()
+        return batch.result
+
+    def _close_locked(self, channel: str, batch: _Batch) -> None:
+        """バッチを締め切り、以降のメッセージが新しいバッチに入るようにする"""
+        if self._batches.get(channel) is batch:
+            del self._batches[channel]
+        batch.closed.set()
+
+    @staticmethod
+    def _combine(items: List[Tuple[str, str]]) -> Tuple[str, str]:
+        """
+        メッセージを 1 件に結合する。
+        投稿者が複数の場合は alias を既定値とし、各コメントに投稿者名を付ける。
+        """
+        aliases = {alias for alias, _ in items}
+        if len(aliases) == 1:
+            return items[0][0], SEPARATOR.join(text for _, text in items)
+        return "OpenProject", SEPARATOR.join(f"👤 **{alias}**\n{text}" for alias, text in items)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            messages_in, posts_out = self._messages_in, self._posts_out
+        return {
+            "window_seconds": self.window,
+            "messages": messages_in,
+            "posts": posts_out,
+            "coalesce_ratio": round(messages_in / posts_out, 2) if posts_out else 0.0,
+        }
@@ -0,0 +1,418 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+import config
+from core.dead_letter import SOURCE_FANOUT, SOURCE_SPOOL, SOURCE_WEBHOOK, DeadLetterStore
+from core.mapper import Destination, Mapper
+from core.metrics import DEAD_LETTERS, OUTCOMES, STAGE_SECONDS
+from core.pipeline import CommentEvent, build_message, idempotency_key
+from core.spool import Spool
+from core.text_processor import convert_mentions, unmapped_mention_ids
+from services.fanout import UNKNOWN_INSTANCE_RESULT, Fanout
+from services.openproject import OpenProjectService
+from services.rocketchat import CIRCUIT_OPEN_RESULT, SHED_RESULTS, TIMEOUT_RESULT, MessageSender
+
+if TYPE_CHECKING:
+    # 同期モードで httpx を読み込まないよう、型チェック時のみ参照する
+    from services.async_openproject import AsyncOpenProjectService
+    from services.async_rocketchat import AsyncRocketChatService
+
+logger = logging.getLogger(__name__)
+
+
+class DestinationResult(NamedTuple):
+    """送信先ごとの配送結果"""
+    destination: Destination
+    success: bool
+    result: str  # 投稿したチャンネル、または失敗の理由
+
+    @property
+    def outcome(self) -> str:
+        """配送結果の分類 (delivered・fallback・failed・shed)"""
+        if self.result in SHED_RESULTS:
+            return "shed"
+        if not self.success:
+            return "failed"
+        return "fallback" if self.result != self.destination.channel else "delivered"
+
+
+class Delivery(NamedTuple):
+    """
+    イベントの配送結果。いずれかの送信先に届いた場合は配送済み (success) とし、
+    result には最初に届いたチャンネル、すべて失敗した場合は代表する失敗の理由を持つ
+    """
+    success: bool
+    result: str
+    destinations: Tuple[DestinationResult, ...]
+
+    @property
+    def partial(self) -> bool:
+        """一部の送信先にだけ届いたか"""
+        return self.success and not all(sent.success for sent in self.destinations)
+
+    def response_body(self) -> Dict[str, Any]:
+        """
+        /webhook の応答ボディ。送信先が複数の場合は送信先ごとの結果を含め、
+        一部の送信先にだけ届いた場合は partial とする (失敗した送信先は dead letter から再送する)
+        """
+        body: Dict[str, Any]
+        if self.success:
+            body = {"status": "partial" if self.partial else "success", "channel": self.result}
+        else:
+            body = {"status": "error", "message": self.result}
+        if len(self.destinations) > 1:
+            body["destinations"] = [
+                {
+                    "channel": sent.destination.channel,
+                    "instance": sent.destination.instance or None,
+                    "status": sent.outcome,
+                    "result": sent.result
+                }
+                for sent in self.destinations
+            ]
+        return body
+
+
+# 送信先ごとの送信を呼び出し元のスレッドで順に行う (fanout を渡さない呼び出し用)
+_SERIAL = Fanout(concurrency=1)
+
+
+def deliver_event(
+    event: CommentEvent,
+    mapper: Mapper,
+    op_service: OpenProjectService,
+    rc_service: MessageSender,
+    dead_letters: Optional[DeadLetterStore] = None,
+    source: str = SOURCE_WEBHOOK,
+    attempts: int = 1,
+    final: bool = True,
+    fanout: Optional[Fanout] = None
+) -> Delivery:
+    """
+    正規化済みイベントを Rocket.Chat へ配送する。
+    同期モード (リクエスト内) と非同期モード (配送ワーカー) の両方から呼ばれる。
+    プロジェクトに複数の送信先がある場合は fanout で並行して送信する。
+
+    Args:
+        dead_letters: 送信に失敗した場合に組み立て済みのメッセージを保存する先
+        source, attempts: 保存時に記録する配送元と試行回数
+        final: これ以上再試行しないか (False の場合、すべての送信先に失敗したイベントは保存しない)
+    """
+    logger.info("Processing webhook for WP #%s", event.wp_id)
+
+    # 1. 通知先の決定 (プロジェクト名に基づく)
+    started = time.perf_counter()
+    destinations = mapper.get_destinations(event.project_title)
+    started = STAGE_SECONDS.observe_since(started, "get_channel")
+
+    # 2. 投稿者名と、users.csv に無いメンション先の解決 (OpenProject API経由、並行して問い合わせる)
+    mention_ids = _unmapped_mentions(event, mapper)
+    if mention_ids:
+        author_name, mention_names = op_service.get_user_names(event.user_href, mention_ids)
+    else:
+        author_name, mention_names = op_service.get_user_name(event.user_href), {}
+    started = STAGE_SECONDS.observe_since(started, "get_user_name")
+
+    # 3. メンション変換
+    converted_notes = convert_mentions(event.comment, mapper, mention_names)
+    started = STAGE_SECONDS.observe_since(started, "convert_mentions")
+
+    # 4. 通知メッセージの組み立て (プロジェクト・送信先チャンネルごとの解析済みテンプレートを使用)
+    messages = _build_messages(event, mapper, destinations, converted_notes, author_name)
+    started = STAGE_SECONDS.observe_since(started, "build_message")
+
+    # 5. Rocket.Chat への送信 (複数の送信先へは並行して送信する)
+    sent = (fanout or _SERIAL).send(rc_service, messages, author_name)
+    STAGE_SECONDS.observe_since(started, "send_message")
+    delivery = _aggregate(messages, sent)
+    if dead_letters is not None:
+        _dead_letter_failures(dead_letters, event, messages, delivery, author_name, source, attempts, final)
+    return _record_outcome(delivery)
+
+
+async def deliver_event_async(
+    event: CommentEvent,
+    mapper: Mapper,
+    op_service: "AsyncOpenProjectService",
+    rc_service: "AsyncRocketChatService",
+    dead_letters: Optional[DeadLetterStore] = None,
+    instances: Optional[Mapping[str, "AsyncRocketChatService"]] = None
+) -> Delivery:
+    """
+    deliver_event の asyncio 版 (ASGI モード用)。
+    変換・メッセージ組み立ては同期版と同じ core の処理を使い、外部 API の待ち時間だけを非同期にする。
+    複数の送信先へは asyncio.gather で同時に送信する。
+    """
+    logger.info("Processing webhook for WP #%s", event.wp_id)
+
+    started = time.perf_counter()
+    destinations = mapper.get_destinations(event.project_title)
+    started = STAGE_SECONDS.observe_since(started, "get_channel")
+    mention_ids = _unmapped_mentions(event, mapper)
+    if mention_ids:
+        author_name, mention_names = await op_service.get_user_names(event.user_href, mention_ids)
+    else:
+        author_name, mention_names = await op_service.get_user_name(event.user_href), {}
+    started = STAGE_SECONDS.observe_since(started, "get_user_name")
+    converted_notes = convert_mentions(event.comment, mapper, mention_names)
+    started = STAGE_SECONDS.observe_since(started, "convert_mentions")
+    messages = _build_messages(event, mapper, destinations, converted_notes, author_name)
+    started = STAGE_SECONDS.observe_since(started, "build_message")
+    sent = await asyncio.gather(*(
+        _send_async(rc_service, instances or {}, destination, text, author_name) for destination, text in messages
+    ))
+    STAGE_SECONDS.observe_since(started, "send_message")
+    delivery = _aggregate(messages, sent)
+    if dead_letters is not None and (not delivery.success or delivery.partial):
+        # SQLite への書き込みはイベントループを止めないようスレッドで行う
+        await asyncio.to_thread(
+            _dead_letter_failures, dead_letters, event, messages, delivery, author_name, SOURCE_WEBHOOK, 1, True
+        )
+    return _record_outcome(delivery)
+
+
+async def _send_async(
+    rc_service: "AsyncRocketChatService",
+    instances: Mapping[str, "AsyncRocketChatService"],
+    destination: Destination,
+    text: str,
+    alias: str
+) -> Tuple[bool, str]:
+    sender = instances.get(destination.instance) if destination.instance else rc_service
+    if sender is None:
+        logger.error("Rocket.Chat instance %s is not defined in RC_INSTANCES", destination.instance)
+        return False, UNKNOWN_INSTANCE_RESULT
+    return await sender.send_message(destination.channel, text, alias=alias)
+
+
+def _unmapped_mentions(event: CommentEvent, mapper: Mapper) -> List[str]:
+    """API で解決するメンション先のユーザー ID (MENTION_RESOLVE_RULE 未設定なら解決しない)"""
+    if not config.MENTION_RESOLVE_RULE:
+        return []
+    return unmapped_mention_ids(event.comment, mapper, config.MENTION_RESOLVE_MAX)
+
+
+def _build_messages(
+    event: CommentEvent,
+    mapper: Mapper,
+    destinations: Sequence[Destination],
+    converted_notes: str,
+    author_name: str
+) -> List[Tuple[Destination, str]]:
+    """送信先ごとのテンプレートでメッセージを組み立てる"""
+    return [
+        (destination, build_message(
+            event, converted_notes, mapper.get_template(event.project_title, destination.channel), author_name
+        ))
+        for destination in destinations
+    ]
+
+
+def _aggregate(messages: Sequence[Tuple[Destination, str]], sent: Sequence[Tuple[bool, str]]) -> Delivery:
+    """
+    送信先ごとの結果をまとめる。すべて失敗した場合は、投稿済みの可能性があるタイムアウト、
+    送信見送り以外の失敗、送信見送りの順に代表する結果を選ぶ (送信先が 1 件ならその結果のまま)
+    """
+    results = tuple(
+        DestinationResult(destination, success, result) for (destination, _), (success, result) in zip(messages, sent)
+    )
+    for item in results:
+        if item.success:
+            return Delivery(True, item.result, results)
+    failures = [item.result for item in results]
+    if TIMEOUT_RESULT in failures:
+        return Delivery(False, TIMEOUT_RESULT, results)
+    return Delivery(False, next((f for f in failures if f not in SHED_RESULTS), failures[0]), results)
+
+
+def _dead_letter_failures(
+    dead_letters: DeadLetterStore,
+    event: CommentEvent,
+    messages: Sequence[Tuple[Destination, str]],
+    delivery: Delivery,
+    alias: str,
+    source: str,
+    attempts: int,
+    final: bool
+) -> None:
+    """
+    送信に失敗した送信先のメッセージを保存する。
+
+    一部の送信先に届いたイベントは再試行しない (届いた送信先へ重複して投稿しない) ため、
+    失敗した送信先を常に保存する。すべて失敗した場合は final の場合だけ保存し、
+    Spool で保留して再送する送信見送り (遮断中・レート制限) は保存しない。
+    """
+    if not delivery.success and not final:
+        return
+    key = idempotency_key(event)
+    multiple = len(messages) > 1
+    for (destination, text), sent in zip(messages, delivery.destinations):
+        if sent.success or (not delivery.success and source == SOURCE_SPOOL and sent.result in SHED_RESULTS):
+            continue
+        if multiple:
+            # 送信先ごとに保存する (再送時の重複判定はイベント単位のため行わない)
+            _dead_letter(
+                dead_letters, event, f"{key}>{destination.label}", SOURCE_FANOUT, destination, alias, text,
+                sent.result, attempts
+            )
+        else:
+            _dead_letter(dead_letters, event, key, source, destination, alias, text, sent.result, attempts)
+
+
+def _dead_letter(
+    dead_letters: DeadLetterStore,
+    event: CommentEvent,
+    key: str,
+    source: str,
+    destination: Destination,
+    alias: str,
+    text: str,
+    error: str,
+    attempts: int
+) -> None:
+    """送信に失敗した通知を保存する (保存の失敗で配送結果の処理を妨げない)"""
+    try:
+        dead_letters.add(
+            key, source, destination.channel, event.project_title, alias, text, error, attempts, destination.instance
+        )
+    except Exception:
+        logger.exception("Failed to write dead letter for WP #%s", event.wp_id)
+        return
+    DEAD_LETTERS.inc(source)
+    logger.warning(
+        "Delivery of WP #%s to %s failed (%s), saved as dead letter", event.wp_id, destination.label, error
+    )
+
+
+def _record_outcome(delivery: Delivery) -> Delivery:
+    """
+    送信先ごとの配送結果を記録する。送信先がデフォルトチャンネルに切り替わった場合は fallback、
+    サーキットブレーカーやレート制限により送信しなかった場合は shed とする
+    """
+    for sent in delivery.destinations:
+        OUTCOMES.inc(sent.outcome)
+    return delivery
+
+
+class DeliveryWorkerPool:
+    """
+    Spool に積まれたイベントをバックグラウンドで配送するワーカー群。
+    失敗時は指数バックオフで再試行し、上限に達したものは failed として残す
+    (dead_letters を指定した場合は組み立て済みのメッセージを保存し、再送できるようにする)。
+    複数の送信先のうち一部に届いたイベントは配送済みとし、失敗した送信先だけを dead_letters に保存する。
+    Rocket.Chat のサーキットブレーカーやレート制限により送信を見送ったイベントは、試行回数に数えずに保留する。
+    """
+    spool: Spool
+    mapper: Mapper
+    op_service: OpenProjectService
+    rc_service: MessageSender
+    workers: int
+    max_attempts: int
+    retry_backoff: float
+    park_delay: float
+    poll_interval: float
+    dead_letters: Optional[DeadLetterStore]
+    fanout: Optional[Fanout]
+
+    def __init__(
+        self,
+        spool: Spool,
+        mapper: Mapper,
+        op_service: OpenProjectService,
+        rc_service: MessageSender,
+        workers: int = config.DELIVERY_WORKERS,
+        max_attempts: int = config.DELIVERY_MAX_ATTEMPTS,
+        retry_backoff: float = config.DELIVERY_RETRY_BACKOFF,
+        park_delay: float = config.CIRCUIT_OPEN_SECONDS,
+        poll_interval: float = 0.5,
+        dead_letters: Optional[DeadLetterStore] = None,
+        fanout: Optional[Fanout] = None
+    ) -> None:
+        self.spool = spool
+        self.mapper = mapper
+        self.op_service = op_service
+        self.rc_service = rc_service
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.park_delay = park_delay
+        self.poll_interval = poll_interval
+        self.dead_letters = dead_letters
+        self.fanout = fanout
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """配送ワーカースレッドを起動する"""
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"delivery-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Started %s delivery workers (spool: %s)", self.workers, self.spool.path)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """ワーカーを停止する。処理中のイベントは完了を待つ"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                processed = self.process_one()
+            except Exception:
+                logger.exception("Unexpected error in delivery worker")
+                processed = False
+            if not processed:
+                self._stop.wait(self.poll_interval)
+
+    def process_one(self) -> bool:
+        """
+        Spool からイベントを 1 件取り出して配送する
+
+        Returns:
+            イベントを処理した場合 True、キューが空だった場合 False
+        """
+        claimed = self.spool.claim()
+        if claimed is None:
+            return False
+
+        event_id, payload, attempts = claimed
+        # すべての送信先に失敗したメッセージは、再試行の上限に達する場合だけ保存する
+        last_attempt = attempts + 1 >= self.max_attempts
+        try:
+            event = CommentEvent.from_dict(payload)
+            success, result, _ = deliver_event(
+                event, self.mapper, self.op_service, self.rc_service,
+                dead_letters=self.dead_letters, source=SOURCE_SPOOL, attempts=attempts + 1, final=last_attempt,
+                fanout=self.fanout
+            )
+        except Exception as e:
+            logger.exception("Error delivering spooled event %s", event_id)
+            success, result = False, f"Unexpected error: {e}"
+
+        if success:
+            self.spool.ack(event_id)
+            return True
+
+        if result in SHED_RESULTS:
+            delay = self.park_delay if result == CIRCUIT_OPEN_RESULT else self.retry_backoff
+            logger.info("Parking spooled event %s for %gs: %s", event_id, delay, result)
+            self.spool.park(event_id, result, delay)
+            return True
+
+        attempts += 1
+        if attempts >= self.max_attempts:
+            logger.error("Giving up spooled event %s after %s attempts: %s", event_id, attempts, result)
+            self.spool.fail(event_id, result)
+        else:
+            delay = self.retry_backoff * (2 ** (attempts - 1))
+            logger.warning("Delivery of spooled event %s failed (%s), retrying in %.1fs", event_id, result, delay)
+            self.spool.retry(event_id, result, delay)
+        return True
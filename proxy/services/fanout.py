@@ -0,0 +1,83 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+import config
+from core.mapper import Destination
+from services.rocketchat import MessageSender
+
+logger = logging.getLogger(__name__)
+
+# 送信先の Rocket.Chat インスタンスが定義されていない場合の結果 (未送信が確実)
+UNKNOWN_INSTANCE_RESULT = "Unknown Rocket.Chat instance"
+
+
+class Fanout:
+    """
+    複数の送信先 (チャンネル・Rocket.Chat インスタンス) へメッセージを並行して送信する。
+
+    最初の送信先へは呼び出し元のスレッドで送り、残りをスレッドプール (最大 concurrency スレッド、
+    プロセス内の全リクエストで共有) で同時に送るため、所要時間は送信先の合計ではなく最も遅い送信先で決まる。
+    スレッドプールは最初に複数の送信先へ送るときに作成する (fork 後のワーカーで作成されるように)。
+    """
+    instances: Dict[str, MessageSender]
+    concurrency: int
+
+    def __init__(
+        self,
+        instances: Optional[Mapping[str, MessageSender]] = None,
+        concurrency: int = config.FANOUT_CONCURRENCY
+    ) -> None:
+        self.instances = dict(instances or {})
+        self.concurrency = concurrency
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def sender(self, default: MessageSender, instance: str) -> Optional[MessageSender]:
+        """送信先のインスタンスに送信するサービスを返す (空の場合は default)"""
+        return self.instances.get(instance) if instance else default
+
+    def send(
+        self,
+        default: MessageSender,
+        messages: Sequence[Tuple[Destination, str]],
+        alias: str
+    ) -> List[Tuple[bool, str]]:
+        """
+        送信先ごとのメッセージを送信する
+
+        Args:
+            default: RC_WEBHOOK_URL の Rocket.Chat へ送信するサービス
+            messages: (送信先, メッセージ) のリスト
+
+        Returns:
+            送信先と同じ順の (success, result)
+        """
+        if len(messages) == 1 or self.concurrency <= 1:
+            return [self._send_one(default, destination, text, alias) for destination, text in messages]
+
+        executor = self._get_executor()
+        futures = [
+            executor.submit(self._send_one, default, destination, text, alias) for destination, text in messages[1:]
+        ]
+        first = self._send_one(default, messages[0][0], messages[0][1], alias)
+        return [first] + [future.result() for future in futures]
+
+    def _send_one(self, default: MessageSender, destination: Destination, text: str, alias: str) -> Tuple[bool, str]:
+        sender = self.sender(default, destination.instance)
+        if sender is None:
+            logger.error("Rocket.Chat instance %s is not defined in RC_INSTANCES", destination.instance)
+            return False, UNKNOWN_INSTANCE_RESULT
+        return sender.send_message(destination.channel, text, alias=alias)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="fanout")
+            return self._executor
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
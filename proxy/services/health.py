@@ -0,0 +1,212 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+import requests
+import config
+from config import validate_config
+from core.circuit_breaker import is_healthy_status
+from core.metrics import OUTCOMES
+from core.spool import Spool
+
+logger = logging.getLogger(__name__)
+
+# /ready の依存先の名前 (READY_SHED_DEPENDENCIES で指定する。追加の Rocket.Chat インスタンスは "rocketchat:<名前>")
+OPENPROJECT = "openproject"
+ROCKETCHAT = "rocketchat"
+DELIVERY = "delivery"
+
+# 配送の失敗率を判定する最小の配送数 (少数の失敗で劣化と判定しない)
+_MIN_DELIVERIES = 10
+# 配送の失敗として数える結果 (shed はサーキットブレーカー・レート制限により送信しなかったもの)
+_ERROR_OUTCOMES = ("failed", "shed")
+_DELIVERY_OUTCOMES = ("delivered", "fallback") + _ERROR_OUTCOMES
+
+
+class Probe(NamedTuple):
+    """依存先の疎通確認に使う、副作用が無く応答の小さいリクエスト"""
+    name: str
+    url: str
+    headers: Dict[str, str] = {}
+    auth: Optional[Tuple[str, str]] = None
+    healthy: Callable[[int], bool] = is_healthy_status
+
+
+def rocketchat_info_url(webhook_url: str) -> str:
+    """Webhook URL と同じ Rocket.Chat の /api/info (認証不要でバージョンだけを返す) の URL"""
+    parts = urlsplit(webhook_url)
+    prefix = parts.path.split("/hooks/")[0].rstrip("/")  # サブパスで公開している場合を考慮する
+    return f"{parts.scheme}://{parts.netloc}{prefix}/api/info"
+
+
+def build_probes() -> List[Probe]:
+    """設定された依存先ごとの疎通確認を構築する"""
+    probes = [
+        # API のルートリソース。API キーが無効な場合 (401・403) も通知を処理できないため停止とみなす
+        Probe(
+            OPENPROJECT, f"{config.OP_API_URL.rstrip('/')}/api/v3", {'Host': config.OP_API_HOST},
+            ('apikey', config.OP_API_KEY) if config.OP_API_KEY else None, lambda status: status < 400
+        )
+    ]
+    if config.RC_WEBHOOK_URL:
+        probes.append(Probe(ROCKETCHAT, rocketchat_info_url(config.RC_WEBHOOK_URL)))
+    for name, url in config.RC_INSTANCES.items():
+        if url:
+            probes.append(Probe(f"{ROCKETCHAT}:{name}", rocketchat_info_url(url)))
+    return probes
+
+
+class HealthSnapshot(NamedTuple):
+    """HealthMonitor が最後に確認した結果 (参照の差し替えで一括更新する)"""
+    checked_at: Optional[float]  # time.monotonic()。未確認の場合は None
+    config_valid: bool
+    config_errors: Tuple[str, ...]
+    spool: Optional[Dict[str, int]]
+    dependencies: Dict[str, Dict[str, Any]]
+    delivery: Dict[str, Any]
+    degraded: Tuple[str, ...]  # 停止・劣化とみなした依存先
+
+
+class HealthMonitor:
+    """
+    依存先の状態を interval 秒ごとに確認し、/ready が参照するスナップショットを保持するバックグラウンドスレッド。
+
+    - OpenProject・Rocket.Chat へ軽いリクエスト (再試行なし) を送り、failure_threshold 回続けて失敗したら停止とみなす
+    - 設定の検証 (CSV の存在確認) と配送キューの件数の取得もここで行う
+    - 直近 error_window 秒の配送の失敗率を配送結果のメトリクスから計算する
+
+    /ready は I/O を行わずにスナップショットを返すため、オーケストレーターの確認頻度によらず
+    依存先への負荷は interval ごとの確認だけになる。
+    """
+    probes: List[Probe]
+    spool: Optional[Spool]
+    interval: float
+    timeout: float
+    failure_threshold: int
+    error_window: float
+    max_error_rate: float
+
+    def __init__(
+        self,
+        probes: Sequence[Probe],
+        spool: Optional[Spool] = None,
+        interval: float = config.HEALTH_CHECK_INTERVAL,
+        timeout: float = config.HEALTH_PROBE_TIMEOUT,
+        failure_threshold: int = config.HEALTH_FAILURE_THRESHOLD,
+        error_window: float = config.HEALTH_ERROR_WINDOW,
+        max_error_rate: float = config.HEALTH_MAX_ERROR_RATE,
+        session: Optional[requests.Session] = None,
+        clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.probes = list(probes)
+        self.spool = spool
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = max(1, failure_threshold)
+        self.error_window = error_window
+        self.max_error_rate = max_error_rate
+        # 疎通確認は再試行しない (失敗は連続回数で判定する)
+        self.session = session or requests.Session()
+        self._clock = clock
+        self._failures: Dict[str, int] = {probe.name: 0 for probe in self.probes}
+        # (時刻, 配送数, 失敗数) の累計の履歴
+        self._deliveries: Deque[Tuple[float, float, float]] = deque()
+        self.snapshot = HealthSnapshot(None, False, (), None, {}, {}, ())
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_stale(self) -> bool:
+        """確認が止まっている (確認に要する時間を含めて interval の 3 倍以上更新していない) か"""
+        checked_at = self.snapshot.checked_at
+        limit = self.interval * 3 + self.timeout * len(self.probes)
+        return checked_at is not None and self._clock() - checked_at > limit
+
+    def _run(self) -> None:
+        self.check()
+        while not self._stop.wait(self.interval * random.uniform(0.9, 1.1)):  # ワーカー間で確認の時刻をずらす
+            self.check()
+
+    def check(self) -> HealthSnapshot:
+        """依存先の状態を 1 回確認し、スナップショットを更新する (例外は記録のみ)"""
+        try:
+            config_valid, config_errors = validate_config()
+            spool = None
+            if self.spool is not None:
+                spool = {"pending": self.spool.pending_count(), "failed": self.spool.failed_count()}
+            dependencies = {probe.name: self._probe(probe) for probe in self.probes}
+            delivery = self._delivery_errors()
+        except Exception:
+            logger.exception("Unexpected error while checking health")
+            return self.snapshot
+
+        degraded = [name for name, status in dependencies.items() if status["status"] == "down"]
+        if delivery["degraded"]:
+            degraded.append(DELIVERY)
+        self.snapshot = HealthSnapshot(
+            self._clock(), config_valid, tuple(config_errors), spool, dependencies, delivery, tuple(degraded)
+        )
+        return self.snapshot
+
+    def _probe(self, probe: Probe) -> Dict[str, Any]:
+        started = time.perf_counter()
+        error: Optional[str] = None
+        try:
+            response = self.session.get(probe.url, headers=probe.headers, auth=probe.auth, timeout=self.timeout)
+            response.close()
+            if not probe.healthy(response.status_code):
+                error = f"HTTP {response.status_code}"
+        except Exception as e:  # 接続エラー・タイムアウト
+            error = type(e).__name__
+        elapsed = time.perf_counter() - started
+
+        failures = self._failures[probe.name] + 1 if error else 0
+        self._failures[probe.name] = failures
+        if error and failures == self.failure_threshold:
+            logger.warning("Health probe for %s failed %d times in a row: %s", probe.name, failures, error)
+        elif not error and self.snapshot.dependencies.get(probe.name, {}).get("status") == "down":
+            logger.info("Health probe for %s recovered", probe.name)
+        return {
+            "status": "down" if failures >= self.failure_threshold else "up",
+            "consecutive_failures": failures,
+            "last_error": error,
+            "latency_ms": round(elapsed * 1000, 1),
+        }
+
+    def _delivery_errors(self) -> Dict[str, Any]:
+        """直近 error_window 秒の配送数と失敗率 (このワーカーの配送結果から計算する)"""
+        counts = {labels[0]: value for labels, value in OUTCOMES.samples() if labels}
+        now = self._clock()
+        total = sum(counts.get(outcome, 0.0) for outcome in _DELIVERY_OUTCOMES)
+        errors = sum(counts.get(outcome, 0.0) for outcome in _ERROR_OUTCOMES)
+        if self._deliveries and total < self._deliveries[-1][1]:  # メトリクスが初期化された場合
+            self._deliveries.clear()
+        self._deliveries.append((now, total, errors))
+        while len(self._deliveries) > 1 and self._deliveries[1][0] <= now - self.error_window:
+            self._deliveries.popleft()
+
+        _, first_total, first_errors = self._deliveries[0]
+        attempts = int(total - first_total)
+        failures = int(errors - first_errors)
+        rate = failures / attempts if attempts else 0.0
+        return {
+            "window": self.error_window,
+            "deliveries": attempts,
+            "failures": failures,
+            "error_rate": round(rate, 4),
+            "degraded": self.max_error_rate > 0 and attempts >= _MIN_DELIVERIES and rate >= self.max_error_rate,
+        }
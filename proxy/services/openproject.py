@@ -2,18 +2,54 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import logging
-from typing import Dict
+import threading
+import time
+from functools import partial
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Sequence, Tuple
 import config
+from core.cache import TTLCache
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError, build_breaker, is_healthy_status
+from core.metrics import HTTP_RETRIES, MENTION_RESOLUTIONS, USER_CACHE_LOOKUPS
+from core.shared_cache import SharedCache
+from core.text_processor import rc_username
+from services.transport import retry_count
 
 logger = logging.getLogger(__name__)
 
 
 class OpenProjectService:
-    user_cache: Dict[str, str]
+    user_cache: TTLCache[str]
+    mention_cache: TTLCache[str]
+    shared_cache: Optional[SharedCache]
+    breaker: CircuitBreaker
     session: requests.Session
 
-    def __init__(self) -> None:
-        self.user_cache = {}
+    def __init__(
+        self,
+        shared_cache: Optional[SharedCache] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ) -> None:
+        # LRU + TTL キャッシュ (取得失敗も短時間だけ記憶して再問い合わせを抑える)
+        self.user_cache = TTLCache(
+            maxsize=config.USER_CACHE_MAXSIZE,
+            ttl=config.USER_CACHE_TTL,
+            negative_ttl=config.USER_CACHE_NEGATIVE_TTL
+        )
+        # メンションされたユーザー ID -> Rocket.Chat のユーザー名 (MENTION_RESOLVE_RULE 設定時のみ使用)
+        self.mention_cache = TTLCache(
+            maxsize=config.USER_CACHE_MAXSIZE,
+            ttl=config.USER_CACHE_TTL,
+            negative_ttl=config.USER_CACHE_NEGATIVE_TTL
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # ノード内の全ワーカーで共有するキャッシュ (設定時のみ)
+        if shared_cache is None and config.USER_CACHE_SHARED_PATH:
+            shared_cache = SharedCache(config.USER_CACHE_SHARED_PATH)
+        self.shared_cache = shared_cache
+        # OpenProject の障害中はリトライ込みで 20 秒以上待たされるため、呼び出し自体を止める
+        self.breaker = breaker or build_breaker("openproject")
         # リトライ設定付きセッション
         self.session = requests.Session()
         retry_strategy = Retry(
@@ -26,52 +62,238 @@ class OpenProjectService:
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
 
-    def get_user_name(self, user_href: str) -> str:
+    def get_user_name(self, user_href: Optional[str]) -> str:
         """
         OpenProject APIからユーザー名を取得する。
-        API負荷軽減のためキャッシュを使用する。
+        API負荷軽減のためキャッシュを使用し、同一ユーザーの同時問い合わせは1回にまとめる。
+        user_href が無い (投稿者が不明な) 場合は "OpenProject" とする。
         """
         if not user_href:
             return "OpenProject"
 
-        if user_href in self.user_cache:
-            return self.user_cache[user_href]
+        found, cached = self.user_cache.lookup(user_href)
+        if found:
+            USER_CACHE_LOOKUPS.inc("hit")
+            return cached or "OpenProject"
 
         if not config.OP_API_KEY:
             logger.warning("OP_API_KEY not configured")
             return "OpenProject"
 
+        if not self.breaker.available():
+            # 遮断中は API を呼ばず、共有キャッシュか既定名で即座に応答する (結果はキャッシュしない)
+            return self._cached_or_default(user_href)
+
+        try:
+            name = self.user_cache.get_or_load(user_href, lambda: self._load_user_name(user_href))
+        except CircuitOpenError:
+            # 確認後に遮断された (半開状態で試行の枠が無かった) 場合も、結果をキャッシュせず同様に応答する
+            return self._cached_or_default(user_href)
+        return name or "OpenProject"
+
+    def get_user_names(self, user_href: Optional[str], mention_ids: Sequence[str]) -> Tuple[str, Dict[str, str]]:
+        """
+        投稿者名と、メンションされたユーザー (data-id) の Rocket.Chat ユーザー名を取得する。
+        キャッシュに無いメンションは投稿者名の取得と並行して問い合わせるため、
+        メンションの数によらず待ち時間は API 呼び出し 1 回分となる。
+
+        Returns:
+            (投稿者名, ユーザー ID -> Rocket.Chat ユーザー名)。解決できなかった ID は含まない
+        """
+        resolved: Dict[str, str] = {}
+        missing = []
+        for user_id in mention_ids:
+            found, username = self.mention_cache.lookup(user_id)
+            if not found:
+                missing.append(user_id)
+                continue
+            MENTION_RESOLUTIONS.inc("cached")
+            if username:
+                resolved[user_id] = username
+
+        pending: Dict[str, "Future[Optional[str]]"] = {}
+        if missing and config.OP_API_KEY and self.breaker.available():
+            executor = self._mention_executor()
+            for user_id in missing:
+                pending[user_id] = executor.submit(
+                    self.mention_cache.get_or_load, user_id, partial(self._fetch_mention, user_id)
+                )
+
+        author_name = self.get_user_name(user_href)
+        for user_id, future in pending.items():
+            try:
+                username = future.result()
+            except CircuitOpenError:
+                continue  # 問い合わせなかったメンションはキャッシュせず、次の通知で解決する
+            if username:
+                resolved[user_id] = username
+        return author_name, resolved
+
+    def _mention_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=config.MENTION_RESOLVE_CONCURRENCY, thread_name_prefix="mention-resolver"
+                )
+            return self._executor
+
+    def _fetch_mention(self, user_id: str) -> Optional[str]:
+        """メンションされたユーザーを API から取得し、MENTION_RESOLVE_RULE で Rocket.Chat のユーザー名に変換する"""
+        user_href = f"/api/v3/users/{user_id}"
+        user = self._fetch_user(user_href)
+        username = rc_username(user, config.MENTION_RESOLVE_RULE) if user is not None else None
+        MENTION_RESOLUTIONS.inc("resolved" if username else "unresolved")
+        if user is not None and user.get('name'):
+            # 同じユーザーが投稿者になった場合のために表示名もキャッシュする
+            self.user_cache.set(user_href, str(user['name']))
+        return username
+
+    def _cached_or_default(self, user_href: str) -> str:
+        if self.shared_cache is not None:
+            found, name = self.shared_cache.get(user_href)
+            if found and name:
+                USER_CACHE_LOOKUPS.inc("shared_hit")
+                return name
+        return "OpenProject"
+
+    def _load_user_name(self, user_href: str) -> Optional[str]:
+        """共有キャッシュを参照し、無ければ API から取得して共有キャッシュへ書き込む"""
+        if self.shared_cache is not None:
+            found, name = self.shared_cache.get(user_href)
+            if found:
+                USER_CACHE_LOOKUPS.inc("shared_hit")
+                return name
+
+        USER_CACHE_LOOKUPS.inc("miss")
+        name = self._fetch_user_name(user_href)
+
+        if self.shared_cache is not None:
+            ttl = config.USER_CACHE_TTL if name else config.USER_CACHE_NEGATIVE_TTL
+            self.shared_cache.set(user_href, name, ttl)
+        return name
+
+    def _fetch_user_name(self, user_href: str) -> Optional[str]:
+        """
+        OpenProject API を呼び出してユーザー名を取得する
+
+        Returns:
+            ユーザー名。取得できなかった場合は None (negative キャッシュされる)
+
+        Raises:
+            CircuitOpenError: サーキットブレーカーが呼び出しを許可しなかった場合
+        """
+        user_data = self._fetch_user(user_href)
+        if user_data is None:
+            return None
+        name = user_data.get('name')
+        if name:
+            logger.debug("Cached user: %s -> %s", user_href, name)
+            return str(name)
+        logger.warning("User %s has no name field", user_href)
+        return None
+
+    def _fetch_user(self, user_href: str) -> Optional[Dict[str, Any]]:
+        """
+        OpenProject API からユーザー情報を取得する (取得できなかった場合は None)
+
+        Raises:
+            CircuitOpenError: サーキットブレーカーが呼び出しを許可しなかった場合
+                (API が返した結果ではないため、呼び出し元はキャッシュしない)
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.name)
+
+        started = time.perf_counter()
+        healthy = False
         try:
             url = f"{config.OP_API_URL.rstrip('/')}{user_href}"
-            logger.debug(f"Fetching user info from {url}")
+            logger.debug("Fetching user info from %s", url)
 
             headers = {'Host': config.OP_API_HOST}
             response = self.session.get(
                 url,
-                auth=('apikey', config.OP_API_KEY),
+                auth=('apikey', config.OP_API_KEY or ''),
                 headers=headers,
                 timeout=5
             )
+            healthy = is_healthy_status(response.status_code)
+            retries = retry_count(response)
+            if retries:
+                HTTP_RETRIES.inc("openproject", amount=retries)
 
             if response.status_code == 200:
                 user_data = response.json()
-                name = user_data.get('name')
-                if name:
-                    self.user_cache[user_href] = name
-                    logger.debug(f"Cached user: {user_href} -> {name}")
-                    return name
-                else:
-                    logger.warning(f"User {user_href} has no name field")
+                if isinstance(user_data, dict):
+                    return user_data
+                logger.error("Invalid JSON response for user: %s", user_href)
             else:
-                logger.warning(f"Failed to fetch user {user_href}: {response.status_code}")
+                logger.warning("Failed to fetch user %s: %s", user_href, response.status_code)
 
         except requests.exceptions.Timeout:
-            logger.error(f"Timeout fetching user info: {user_href}")
+            logger.error("Timeout fetching user info: %s", user_href)
         except requests.exceptions.ConnectionError:
-            logger.error(f"Connection error fetching user info: {user_href}")
+            logger.error("Connection error fetching user info: %s", user_href)
         except requests.exceptions.JSONDecodeError:
-            logger.error(f"Invalid JSON response for user: {user_href}")
+            logger.error("Invalid JSON response for user: %s", user_href)
         except Exception as e:
-            logger.error(f"Unexpected error fetching user info: {e}")
+            logger.error("Unexpected error fetching user info: %s", e)
+        finally:
+            self.breaker.record(healthy, time.perf_counter() - started)
+
+        return None
+
+    def warm_user_cache(self, page_size: int, timeout: float) -> int:
+        """
+        /api/v3/users を大きなページ単位で取得し、ユーザー名キャッシュを一括で埋める。
+        timeout 秒を超えた場合はその時点までの結果で打ち切る。
+
+        Returns:
+            キャッシュに格納したユーザー数
+        """
+        if not config.OP_API_KEY:
+            logger.warning("OP_API_KEY not configured, skipping user cache warm-up")
+            return 0
+
+        deadline = time.monotonic() + timeout
+        url = f"{config.OP_API_URL.rstrip('/')}/api/v3/users"
+        headers = {'Host': config.OP_API_HOST}
+        loaded = 0
+        offset = 1  # OpenProject のページ番号は 1 始まり
+
+        while time.monotonic() < deadline:
+            remaining = max(0.1, deadline - time.monotonic())
+            response = self.session.get(
+                url,
+                params={'offset': offset, 'pageSize': page_size},
+                auth=('apikey', config.OP_API_KEY),
+                headers=headers,
+                timeout=min(30.0, remaining)
+            )
+            if response.status_code != 200:
+                logger.warning("User cache warm-up stopped: %s", response.status_code)
+                break
+
+            data = response.json()
+            elements = data.get('_embedded', {}).get('elements', [])
+            names: Dict[str, str] = {}
+            for user in elements:
+                href = user.get('_links', {}).get('self', {}).get('href')
+                name = user.get('name')
+                if href and name:
+                    names[href] = name
+
+            for href, name in names.items():
+                self.user_cache.set(href, name)
+            if self.shared_cache is not None and names:
+                self.shared_cache.set_many(names, config.USER_CACHE_TTL)
+            loaded += len(names)
+
+            total = int(data.get('total', 0))
+            if not elements or offset * page_size >= total:
+                break
+            offset += 1
+        else:
+            logger.warning("User cache warm-up timed out after %ss (%s users loaded)", timeout, loaded)
 
-        return "OpenProject"
\ No newline at end of file
+        logger.info("User cache warmed up with %s users", loaded)
+        return loaded
@@ -0,0 +1,102 @@
+from typing import Any, Dict, Optional, Sequence, Tuple
+import config
+from config import validate_config
+from core.circuit_breaker import CLOSED, CircuitBreaker
+from core.mapper import Mapper
+from core.spool import Spool
+from services.health import HealthMonitor
+from services.warmup import UserCacheWarmer
+
+
+def check_readiness(
+    mapper: Mapper,
+    spool: Optional[Spool] = None,
+    warmer: Optional[UserCacheWarmer] = None,
+    breakers: Sequence[CircuitBreaker] = (),
+    monitor: Optional[HealthMonitor] = None
+) -> Tuple[bool, Dict[str, Any]]:
+    """
+    リクエストを受け付けられるかを判定する (Flask / ASGI の /ready で共通)
+
+    monitor を渡した場合は、設定の検証・配送キューの件数・依存先の状態をバックグラウンドで確認した結果から判定し、
+    ファイルや依存先へのアクセスを行わない (オーケストレーターの確認が依存先の負荷にならないように)。
+
+    外部 API のサーキットブレーカーと依存先の状態は表示のみで、判定には使わない
+    (依存先の障害は全インスタンスに共通のため、振り分けから外しても解消しない)。
+    READY_SHED_DEPENDENCIES に指定した依存先が停止・劣化している場合だけ準備未完了とする。
+
+    Returns:
+        (is_ready, checks): 判定結果と各チェックの詳細
+    """
+    checks: Dict[str, Any] = {
+        "config": False,
+        "csv_files": False,
+        "details": []
+    }
+
+    # 設定検証 (初回の確認が終わるまでは直接確認する)
+    snapshot = monitor.snapshot if monitor is not None else None
+    if snapshot is not None and snapshot.checked_at is None:
+        snapshot = None
+    if snapshot is not None:
+        is_valid, errors = snapshot.config_valid, list(snapshot.config_errors)
+    else:
+        is_valid, errors = validate_config()
+    checks["config"] = is_valid
+    if errors:
+        checks["details"].extend(errors)
+
+    # CSV マッピング確認
+    if mapper.users_map or mapper.projects_map:
+        checks["csv_files"] = True
+    else:
+        checks["details"].append("No CSV mappings loaded")
+    if mapper.last_reload_error:
+        checks["details"].append(f"Mapping reload failed (serving previous mappings): {mapper.last_reload_error}")
+    # 正規化すると区別できないキー (判定には使わない)
+    checks["details"].extend(mapper.index_conflicts)
+
+    # 配送キューの状態 (非同期配送モードのみ)
+    if snapshot is not None:
+        if snapshot.spool is not None:
+            checks["spool"] = snapshot.spool
+    elif spool is not None:
+        checks["spool"] = {
+            "pending": spool.pending_count(),
+            "failed": spool.failed_count()
+        }
+
+    # ユーザー名キャッシュのウォームアップ状態
+    warm = True
+    if warmer is not None:
+        checks["user_cache_warmup"] = warmer.status()
+        warm = warmer.is_warm
+        if not warm:
+            checks["details"].append("User cache warm-up in progress")
+
+    # 外部 API のサーキットブレーカー
+    if breakers:
+        checks["circuit_breakers"] = {breaker.name: breaker.stats() for breaker in breakers}
+        for breaker in breakers:
+            if breaker.state != CLOSED:
+                checks["details"].append(f"Circuit breaker for {breaker.name} is {breaker.state}")
+
+    # 依存先の状態 (バックグラウンドでの確認結果)
+    healthy = True
+    if monitor is not None and snapshot is None:
+        checks["details"].append("Health check in progress")
+        healthy = False
+    elif monitor is not None and snapshot is not None:
+        checks["dependencies"] = snapshot.dependencies
+        checks["delivery"] = snapshot.delivery
+        if monitor.is_stale():
+            checks["details"].append("Health monitor has stopped updating")
+            healthy = False
+        for name in snapshot.degraded:
+            shed = name in config.READY_SHED_DEPENDENCIES
+            checks["details"].append(f"Dependency {name} is degraded" + (" (shedding traffic)" if shed else ""))
+            healthy = healthy and not shed
+
+    # 全体的な準備状態
+    is_ready = checks["config"] and checks["csv_files"] and warm and healthy
+    return is_ready, checks
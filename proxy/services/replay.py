@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Mapping, Optional, Set
+from core.dead_letter import SOURCE_WEBHOOK, DeadLetter, DeadLetterFilter, DeadLetterStore
+from core.dedup import SeenSet
+from services.fanout import UNKNOWN_INSTANCE_RESULT
+from services.rocketchat import CIRCUIT_OPEN_RESULT, SHED_RESULTS, TIMEOUT_RESULT, MessageSender
+
+logger = logging.getLogger(__name__)
+
+# 再送結果の分類
+REPLAYED = "replayed"      # 再送できた
+SKIPPED = "skipped"        # OpenProject の再送により配送済みだった
+FAILED = "failed"          # 再送に失敗した (次回の実行で再び対象となる)
+DEFERRED = "deferred"      # Rocket.Chat の障害・レート制限のため送らなかった
+
+
+class DeadLetterReplayer:
+    """
+    DeadLetterStore に保存された通知を並行して Rocket.Chat へ再送する。
+
+    送信間隔は sender のレート制限に従う。通知はリースして取り出し、再送できたものは
+    再送済みとして記録するため、途中で中断しても再実行すれば残りだけが送られる。
+    サーキットブレーカーが開いた (Rocket.Chat が再び停止した) 場合は新たな取り出しを止める。
+
+    seen にワーカー間で共有する重複判定 (DEDUP_SHARED_PATH) を渡すと、同期モードで失敗した後に
+    OpenProject の再送で配送済みとなった通知は送らずに再送済みとする。
+    追加の Rocket.Chat インスタンス宛ての通知は instances のうち同じ名前のサービスで送信する。
+    """
+    store: DeadLetterStore
+    sender: MessageSender
+    seen: Optional[SeenSet]
+    concurrency: int
+    instances: Dict[str, MessageSender]
+
+    def __init__(
+        self,
+        store: DeadLetterStore,
+        sender: MessageSender,
+        seen: Optional[SeenSet] = None,
+        concurrency: int = 8,
+        instances: Optional[Mapping[str, MessageSender]] = None
+    ) -> None:
+        self.store = store
+        self.sender = sender
+        self.seen = seen
+        self.concurrency = max(1, concurrency)
+        self.instances = dict(instances or {})
+        self._halted = threading.Event()
+
+    def run(self, filters: Optional[DeadLetterFilter] = None, limit: Optional[int] = None) -> Dict[str, int]:
+        """
+        条件に一致する未再送の通知を古い順に再送する
+
+        Args:
+            limit: 再送を試みる最大件数 (None の場合はすべて)
+
+        Returns:
+            再送結果ごとの件数
+        """
+        counts = {REPLAYED: 0, SKIPPED: 0, FAILED: 0, DEFERRED: 0}
+        started = time.time()
+        remaining = limit
+        inflight: Set["Future[str]"] = set()
+        self._halted.clear()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="replay") as executor:
+            exhausted = False
+            while True:
+                # 取り出しは送信待ちが並行数の 2 倍を切ったときに行い、送信スレッドを遊ばせない
+                room = self.concurrency * 2 - len(inflight)
+                if not exhausted and not self._halted.is_set() and room >= self.concurrency:
+                    batch_size = room if remaining is None else min(room, remaining)
+                    letters = self.store.claim(batch_size, filters, updated_before=started) if batch_size > 0 else []
+                    if remaining is not None:
+                        remaining -= len(letters)
+                    exhausted = len(letters) < batch_size or batch_size == 0
+                    inflight.update(executor.submit(self._replay, letter) for letter in letters)
+
+                if not inflight:
+                    break
+                done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    counts[future.result()] += 1
+
+        if self._halted.is_set():
+            logger.warning("Replay stopped: Rocket.Chat is unavailable (circuit open)")
+        logger.info("Replay finished: %s", counts)
+        return counts
+
+    @property
+    def halted(self) -> bool:
+        """Rocket.Chat の停止により途中で打ち切ったか"""
+        return self._halted.is_set()
+
+    def _replay(self, letter: DeadLetter) -> str:
+        try:
+            return self._replay_one(letter)
+        except Exception as e:
+            logger.exception("Unexpected error replaying dead letter %s", letter.id)
+            self.store.release(letter.id, f"Unexpected error: {e}")
+            return FAILED
+
+    def _replay_one(self, letter: DeadLetter) -> str:
+        if self._halted.is_set():
+            self.store.release(letter.id)
+            return DEFERRED
+
+        # 同期モードの失敗は重複判定の登録を取り消してあるため、登録済みなら OpenProject の再送で配送されている
+        # (タイムアウトは投稿済みの可能性があるため登録を残している)
+        dedup = self.seen if letter.source == SOURCE_WEBHOOK and letter.error != TIMEOUT_RESULT else None
+        if dedup is not None and not dedup.add(letter.key):
+            logger.info("Dead letter %s was delivered by a webhook redelivery, skipping", letter.id)
+            self.store.mark_replayed(letter.id)
+            return SKIPPED
+
+        sender = self.instances.get(letter.instance) if letter.instance else self.sender
+        if sender is None:
+            success, result = False, UNKNOWN_INSTANCE_RESULT
+        else:
+            success, result = sender.send_message(letter.channel, letter.text, alias=letter.alias)
+        if success:
+            self.store.mark_replayed(letter.id)
+            return REPLAYED
+
+        if dedup is not None and result != TIMEOUT_RESULT:
+            dedup.discard(letter.key)
+        if result in SHED_RESULTS:
+            if result == CIRCUIT_OPEN_RESULT:
+                self._halted.set()
+            self.store.release(letter.id)
+            return DEFERRED
+        logger.warning("Replay of dead letter %s to %s failed: %s", letter.id, letter.channel, result)
+        self.store.release(letter.id, result)
+        return FAILED
@@ -1,15 +1,77 @@
 import requests
 import logging
-from typing import Tuple, Dict, Any
+import time
+from typing import Tuple, Dict, Any, Optional, Protocol
 import config
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError, build_breaker, is_healthy_status
+from core.rate_limit import RateLimitedError, RateLimiter, build_rc_limiter, rate_limit_delay
+from services.transport import HttpTransport
 
 logger = logging.getLogger(__name__)
 
+# 送信がタイムアウトした場合の結果 (Rocket.Chat 側では投稿済みの可能性がある)
+TIMEOUT_RESULT = "Timeout sending message"
+# サーキットブレーカーが開いているため送信しなかった場合の結果 (未送信が確実)
+CIRCUIT_OPEN_RESULT = "Rocket.Chat unavailable (circuit open)"
+# レート制限により送信しなかった場合の結果 (未送信が確実)
+RATE_LIMITED_RESULT = "Rocket.Chat rate limit exceeded"
+# 送信を見送った (Rocket.Chat の回復を待って再送すべき) 結果
+SHED_RESULTS = (CIRCUIT_OPEN_RESULT, RATE_LIMITED_RESULT)
+
+
+def build_rc_transport() -> HttpTransport:
+    """Rocket.Chat 向けの keep-alive トランスポートを設定値から構築する"""
+    return HttpTransport(
+        name="rocketchat",
+        pool_size=config.RC_POOL_SIZE,
+        connect_timeout=config.RC_CONNECT_TIMEOUT,
+        read_timeout=config.RC_READ_TIMEOUT,
+        retries=config.RC_RETRY_TOTAL,
+        backoff_factor=1,  # 1秒、2秒、4秒とリトライ間隔を増やす
+        allowed_methods=("POST",),
+        # 500 は処理済みの可能性があるため再試行対象外 (400 はフォールバック処理、429 は _post で扱う)
+        status_forcelist=(502, 503, 504),
+        retry_read=False
+    )
+
+
+class MessageSender(Protocol):
+    """Rocket.Chat へのメッセージ送信インターフェース (RocketChatService やそのラッパー)"""
+
+    def send_message(self, channel: str, text: str, alias: str = "OpenProject") -> Tuple[bool, str]:
+        ...
+
+
+def build_instance_services() -> Dict[str, "RocketChatService"]:
+    """RC_INSTANCES に定義した追加の Rocket.Chat インスタンスごとに送信サービスを構築する"""
+    return {
+        name: RocketChatService(breaker=build_breaker(f"rocketchat:{name}"), webhook_url=url)
+        for name, url in config.RC_INSTANCES.items()
+    }
+
 
 class RocketChatService:
+    transport: HttpTransport
+    breaker: CircuitBreaker
+    limiter: RateLimiter
+    webhook_url: Optional[str]
+
+    def __init__(
+        self,
+        transport: Optional[HttpTransport] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        limiter: Optional[RateLimiter] = None,
+        webhook_url: Optional[str] = None
+    ) -> None:
+        self.transport = transport or build_rc_transport()
+        self.breaker = breaker or build_breaker("rocketchat")
+        self.limiter = limiter or build_rc_limiter()
+        self.webhook_url = webhook_url  # None の場合は RC_WEBHOOK_URL
+
     def send_message(self, channel: str, text: str, alias: str = "OpenProject") -> Tuple[bool, str]:
         """Rocket.Chatにメッセージを送信する"""
-        if not config.RC_WEBHOOK_URL:
+        url = self.webhook_url or config.RC_WEBHOOK_URL
+        if not url:
             logger.error("RC_WEBHOOK_URL is not set.")
             return False, "Server misconfiguration"
 
@@ -21,43 +83,88 @@ class RocketChatService:
         }
 
         try:
-            self._post(payload)
-            logger.info(f"Message sent successfully to {channel}")
+            self._post(url, payload)
+            logger.info("Message sent successfully to %s", channel)
             return True, channel
 
+        except CircuitOpenError:
+            logger.warning("Rocket.Chat circuit open, not sending message to %s", channel)
+            return False, CIRCUIT_OPEN_RESULT
+
+        except RateLimitedError as e:
+            logger.warning("Rocket.Chat rate limit exceeded, not sending message to %s (%s)", channel, e)
+            return False, RATE_LIMITED_RESULT
+
         except requests.exceptions.HTTPError as e:
             # フォールバック処理
             if e.response.status_code == 400 and channel != config.DEFAULT_CHANNEL:
-                logger.warning(f"Channel {channel} not found (400). Retrying with default channel {config.DEFAULT_CHANNEL}")
+                logger.warning("Channel %s not found (400). Retrying with default channel %s", channel, config.DEFAULT_CHANNEL)
                 payload["channel"] = config.DEFAULT_CHANNEL
                 try:
-                    self._post(payload)
-                    logger.info(f"Message sent to fallback channel {config.DEFAULT_CHANNEL}")
+                    self._post(url, payload)
+                    logger.info("Message sent to fallback channel %s", config.DEFAULT_CHANNEL)
                     return True, config.DEFAULT_CHANNEL
                 except Exception as retry_e:
-                    logger.error(f"Fallback to default channel failed: {retry_e}")
+                    logger.error("Fallback to default channel failed: %s", retry_e)
                     return False, "Failed to send message to both target and default channel"
             else:
-                logger.error(f"HTTP error sending message: {e.response.status_code}")
+                logger.error("HTTP error sending message: %s", e.response.status_code)
                 return False, "Failed to send message"
 
         except requests.exceptions.Timeout:
             logger.error("Timeout sending message to Rocket.Chat")
-            return False, "Timeout sending message"
+            return False, TIMEOUT_RESULT
 
         except requests.exceptions.ConnectionError:
             logger.error("Connection error sending message to Rocket.Chat")
             return False, "Connection error"
 
         except Exception as e:
-            logger.error(f"Unexpected error sending message: {e}")
+            logger.error("Unexpected error sending message: %s", e)
             return False, "Unexpected error"
 
-    def _post(self, payload: Dict[str, Any]) -> None:
-        """実際のHTTPリクエストを実行"""
+    def _post(self, url: str, payload: Dict[str, Any]) -> None:
+        """
+        実際のHTTPリクエストを実行 (レート制限の枠を確保してから送信する)
+
+        Rocket.Chat から 429 / too-many-requests を受けた場合は全体の送信を止め、
+        最大待ち時間内であれば 1 回だけ再送する。
+        """
         channel_name = payload.get('channel', 'default')
-        logger.debug(f"Sending to {channel_name}: {payload.get('text')[:50]}...")
-        resp = requests.post(config.RC_WEBHOOK_URL, json=payload)
+        logger.debug("Sending to %s: %.50s...", channel_name, payload.get('text'))
+        # 遮断中はレート制限の枠を待たずに打ち切る
+        if not self.breaker.available():
+            raise CircuitOpenError(self.breaker.name)
+
+        delay = 0.0  # 最後に指示された待ち時間
+        for _ in range(2):
+            self.limiter.acquire(channel_name)
+            resp = self._send(url, payload)
+            retry_delay = rate_limit_delay(resp)
+            if retry_delay is None:
+                break
+            delay = retry_delay
+            self.limiter.pause(delay)
+        else:
+            raise RateLimitedError(delay)
+
         if resp.status_code != 200:
-            logger.error(f"Rocket.Chat Error: {resp.status_code} - {resp.text}")
-        resp.raise_for_status()
\ No newline at end of file
+            logger.error("Rocket.Chat Error: %s - %s", resp.status_code, resp.text)
+        resp.raise_for_status()
+
+    def _send(self, url: str, payload: Dict[str, Any]) -> requests.Response:
+        """サーキットブレーカーを通して 1 回送信する (レート制限の応答は正常な応答として数える)"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.name)
+        started = time.perf_counter()
+        healthy = False
+        try:
+            resp = self.transport.post(url, json=payload)
+            healthy = resp.status_code == 429 or is_healthy_status(resp.status_code)
+        finally:
+            self.breaker.record(healthy, time.perf_counter() - started)
+        return resp
+
+    def retry_after(self) -> float:
+        """送信を再開できるまでの秒数の目安 (遮断中またはレート制限による待機中)"""
+        return max(self.breaker.retry_after(), self.limiter.retry_after())
@@ -0,0 +1,148 @@
+import atexit
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+import config
+from core.circuit_breaker import CircuitBreaker
+from core.dead_letter import DeadLetterStore
+from core.dedup import SeenSet, build_seen_set
+from core.mapper import Mapper
+from core.metrics import REGISTRY
+from core.spool import Spool
+from services.coalescer import MessageCoalescer
+from services.delivery import DeliveryWorkerPool
+from services.fanout import Fanout
+from services.health import HealthMonitor, build_probes
+from services.openproject import OpenProjectService
+from services.rocketchat import MessageSender, RocketChatService, build_instance_services
+from services.warmup import UserCacheWarmer
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerRuntime:
+    """
+    ワーカープロセスごとに持つ依存性 (HTTP セッション、キャッシュ、SQLite 接続、バックグラウンドスレッド)。
+
+    gunicorn の preload_app ではアプリケーションをマスターで読み込んでから fork するため、
+    読み取り専用の Mapper だけをマスターで構築して copy-on-write で共有し、
+    fork 後に引き継ぐと壊れるもの (接続・ロック・スレッド) はワーカー内で start() して作り直す。
+    current() は fork を検出した場合 (プロセス ID が変わった場合) にも作り直す。
+    """
+    mapper: Mapper
+    op_service: OpenProjectService
+    rc_service: RocketChatService
+    sender: MessageSender
+    coalescer: Optional[MessageCoalescer]
+    instance_services: Dict[str, RocketChatService]
+    fanout: Fanout
+    seen: Optional[SeenSet]
+    spool: Optional[Spool]
+    dead_letters: Optional[DeadLetterStore]
+    delivery_pool: Optional[DeliveryWorkerPool]
+    warmer: Optional[UserCacheWarmer]
+    monitor: Optional[HealthMonitor]
+
+    def __init__(self, mapper: Mapper) -> None:
+        self.mapper = mapper
+        self.pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._atexit_pid: Optional[int] = None
+
+    @property
+    def breakers(self) -> Tuple[CircuitBreaker, ...]:
+        instance_breakers = tuple(service.breaker for service in self.instance_services.values())
+        return (self.op_service.breaker, self.rc_service.breaker) + instance_breakers
+
+    def current(self) -> "WorkerRuntime":
+        """このプロセス用に初期化済みの状態を返す (未初期化・fork 直後なら初期化する)"""
+        if self.pid != os.getpid():
+            with self._lock:
+                if self.pid != os.getpid():
+                    self.start()
+        return self
+
+    def start(self) -> None:
+        """サービスを構築し、バックグラウンドスレッドを起動する"""
+        pid = os.getpid()
+        if self.pid is not None:
+            # fork 元のメトリクスやスレッドの状態を引き継がない
+            logger.info(f"Re-initializing worker runtime after fork (pid {self.pid} -> {pid})")
+            REGISTRY.reset_after_fork()
+        self.pid = pid
+
+        self.op_service = OpenProjectService()
+        self.rc_service = RocketChatService()
+
+        # チャンネル単位のメッセージ結合 (COALESCE_WINDOW > 0 の場合のみ)
+        self.sender = self.rc_service
+        self.coalescer = None
+        if config.COALESCE_WINDOW > 0:
+            self.coalescer = MessageCoalescer(self.rc_service)
+            self.sender = self.coalescer
+
+        # 追加の Rocket.Chat インスタンスと、複数の送信先への並行送信
+        self.instance_services = build_instance_services()
+        instance_senders: Dict[str, MessageSender] = dict(self.instance_services)
+        if config.COALESCE_WINDOW > 0:
+            instance_senders = {name: MessageCoalescer(service) for name, service in self.instance_services.items()}
+        self.fanout = Fanout(instance_senders)
+
+        # メトリクスのワーカー間集約 (METRICS_DIR 設定時のみ)
+        REGISTRY.configure(config.METRICS_DIR, config.METRICS_FLUSH_INTERVAL)
+
+        # 重複配送の抑止 (OpenProject の再送を外部 API を呼ぶ前に検出する)
+        self.seen = build_seen_set(config.DEDUP_SHARED_PATH, config.DEDUP_TTL, config.DEDUP_MAXSIZE)
+
+        # CSV マッピングの自動再読み込み (変更検知と解析はバックグラウンドで行う)
+        self.mapper.start_auto_reload(config.MAPPING_RELOAD_INTERVAL)
+
+        # 配送に失敗した通知の保存先 (replay_dead_letters.py で再送する)
+        self.dead_letters = DeadLetterStore(config.DEAD_LETTER_PATH) if config.DEAD_LETTER_PATH else None
+
+        # 非同期配送モード: Spool と配送ワーカーを準備
+        self.spool = None
+        self.delivery_pool = None
+        if config.DELIVERY_MODE == "async":
+            self.spool = Spool(config.SPOOL_PATH)
+            self.delivery_pool = DeliveryWorkerPool(
+                self.spool, self.mapper, self.op_service, self.sender,
+                dead_letters=self.dead_letters, fanout=self.fanout
+            )
+            self.delivery_pool.start()
+
+        # ユーザー名キャッシュのウォームアップ (バックグラウンドで実行し /health はブロックしない)
+        self.warmer = None
+        if config.USER_CACHE_WARMUP:
+            self.warmer = UserCacheWarmer(self.op_service)
+            self.warmer.start()
+
+        # 依存先の状態確認 (/ready はこの結果を返し、リクエストごとには確認しない)
+        self.monitor = None
+        if config.HEALTH_CHECK_INTERVAL > 0:
+            self.monitor = HealthMonitor(build_probes(), spool=self.spool)
+            self.monitor.start()
+
+        if self._atexit_pid != pid:
+            atexit.register(self.stop)
+            self._atexit_pid = pid
+
+    def stop(self) -> None:
+        """バックグラウンドスレッドを停止し、メトリクスを書き出す"""
+        if self.pid != os.getpid():
+            return
+        if self.monitor is not None:
+            self.monitor.stop()
+        if self.warmer is not None:
+            self.warmer.stop()
+        if self.delivery_pool is not None:
+            self.delivery_pool.stop()
+        self.fanout.stop()
+        self.mapper.stop_auto_reload()
+        REGISTRY.stop()
+
+    def release(self, key: Optional[str]) -> None:
+        """重複判定の登録を取り消す (確実に配送できなかった場合に再送を受け付けるため)"""
+        if self.seen is not None and key is not None:
+            self.seen.discard(key)
@@ -0,0 +1,144 @@
+import threading
+import time
+import logging
+from typing import Any, Dict, List, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from core.metrics import HTTP_RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+def retry_count(response: requests.Response) -> int:
+    """urllib3 の Retry が内部で行った再試行の回数を返す"""
+    retries = getattr(response.raw, 'retries', None)
+    history = getattr(retries, 'history', None)
+    return len(history) if isinstance(history, tuple) else 0
+
+
+class HttpTransport:
+    """
+    keep-alive 接続をプールして再利用する HTTP トランスポート。
+
+    同時実行数を pool_size で制限し、接続待ちに要した時間と
+    接続の再利用率を stats() で確認できるようにする。
+    """
+    session: requests.Session
+    pool_size: int
+    timeout: Tuple[float, float]
+
+    def __init__(
+        self,
+        pool_size: int,
+        connect_timeout: float,
+        read_timeout: float,
+        retries: int = 3,
+        backoff_factor: float = 1,
+        allowed_methods: Tuple[str, ...] = ("GET",),
+        status_forcelist: Tuple[int, ...] = (429, 500, 502, 503, 504),
+        retry_read: bool = True,
+        name: str = "http"
+    ) -> None:
+        self.name = name  # メトリクスのラベル (送信先の識別子)
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        retry_strategy = Retry(
+            total=retries,
+            status_forcelist=list(status_forcelist),
+            allowed_methods=list(allowed_methods),
+            backoff_factor=backoff_factor,
+            # 送信済みの可能性がある読み取りエラーは、重複投稿を避けるため再試行しない
+            read=None if retry_read else 0,
+            # 最終的なレスポンスをそのまま返し、raise_for_status で判定させる
+            raise_on_status=False
+        )
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry_strategy
+        )
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._in_flight = 0
+        self._retried = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """プール済み接続でリクエストを送信する (timeout 未指定時は既定値を使用)"""
+        kwargs.setdefault('timeout', self.timeout)
+
+        started = time.monotonic()
+        self._slots.acquire()
+        waited = time.monotonic() - started
+        with self._lock:
+            self._requests += 1
+            self._in_flight += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            response = self.session.request(method, url, **kwargs)
+            retries = retry_count(response)
+            if retries:
+                with self._lock:
+                    self._retried += retries
+                HTTP_RETRIES.inc(self.name, amount=retries)
+            return response
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """接続プールの統計情報 (再利用率・待ち時間) を返す"""
+        connections, pool_requests = self._pool_counters()
+        with self._lock:
+            requests_total = self._requests
+            in_flight = self._in_flight
+            retried = self._retried
+            wait_total = self._wait_total
+            wait_max = self._wait_max
+
+        reuse_ratio = 0.0
+        if pool_requests:
+            reuse_ratio = max(0.0, (pool_requests - connections) / pool_requests)
+
+        return {
+            "pool_size": self.pool_size,
+            "requests": requests_total,
+            "in_flight": in_flight,
+            "retries": retried,
+            "connections_opened": connections,
+            "reuse_ratio": round(reuse_ratio, 4),
+            "wait_avg_ms": round(wait_total / requests_total * 1000, 3) if requests_total else 0.0,
+            "wait_max_ms": round(wait_max * 1000, 3),
+        }
+
+    def _pool_counters(self) -> Tuple[int, int]:
+        """urllib3 の接続プールから新規接続数と送信リクエスト数を集計する"""
+        connections = 0
+        pool_requests = 0
+        pools: List[Any] = []
+        try:
+            container = self._adapter.poolmanager.pools
+            pools = [container[key] for key in container.keys()]
+        except Exception as e:
+            logger.debug("Unable to read connection pool counters: %s", e)
+        for pool in pools:
+            connections += int(getattr(pool, 'num_connections', 0))
+            pool_requests += int(getattr(pool, 'num_requests', 0))
+        return connections, pool_requests
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,81 @@
+import logging
+import threading
+from typing import Any, Dict, Optional
+import config
+from services.openproject import OpenProjectService
+
+logger = logging.getLogger(__name__)
+
+
+class UserCacheWarmer:
+    """
+    ユーザー名キャッシュを起動時に一括で埋め、以降は定期的に更新するバックグラウンドスレッド。
+
+    起動時のウォームアップはバックグラウンドで実行されるため /health は
+    ブロックされない。/ready は初回ウォームアップの完了 (または打ち切り) まで
+    準備未完了を返す。
+    """
+    op_service: OpenProjectService
+    page_size: int
+    timeout: float
+    refresh_interval: float
+
+    def __init__(
+        self,
+        op_service: OpenProjectService,
+        page_size: int = config.USER_CACHE_WARMUP_PAGE_SIZE,
+        timeout: float = config.USER_CACHE_WARMUP_TIMEOUT,
+        refresh_interval: float = config.USER_CACHE_REFRESH_INTERVAL
+    ) -> None:
+        self.op_service = op_service
+        self.page_size = page_size
+        self.timeout = timeout
+        self.refresh_interval = refresh_interval
+        self.state = "pending"
+        self.loaded = 0
+        self.last_error: Optional[str] = None
+        self._initial_done = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_warm(self) -> bool:
+        """初回ウォームアップが終了したか (失敗・打ち切りを含む)"""
+        return self._initial_done.is_set()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="user-cache-warmer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        self.warm()
+        self._initial_done.set()
+        while self.refresh_interval > 0 and not self._stop.wait(self.refresh_interval):
+            self.warm()
+
+    def warm(self) -> None:
+        """ウォームアップを 1 回実行する (例外は記録のみ)"""
+        self.state = "warming"
+        try:
+            self.loaded = self.op_service.warm_user_cache(self.page_size, self.timeout)
+            self.state = "ready"
+            self.last_error = None
+        except Exception as e:
+            logger.error(f"User cache warm-up failed: {e}")
+            self.state = "failed"
+            self.last_error = str(e)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "loaded": self.loaded,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,154 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+
+import httpx
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+def make_transport(handler, **kwargs):
+    """httpx.MockTransport で応答を差し替えた AsyncHttpTransport を作成する"""
+    from proxy.services.async_transport import AsyncHttpTransport
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    kwargs.setdefault('backoff_factor', 0)
+    return AsyncHttpTransport(pool_size=10, connect_timeout=1, read_timeout=1, client=client, **kwargs)
+
+
+@patch('proxy.services.async_rocketchat.config.RC_WEBHOOK_URL', 'http://rc.test/hooks/x')
+@patch('proxy.services.async_rocketchat.config.DEFAULT_CHANNEL', '#general')
+class TestAsyncRocketChatService(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        from proxy.services import async_rocketchat
+        self.AsyncRocketChatService = async_rocketchat.AsyncRocketChatService
+        self.limiter = async_rocketchat.RateLimiter(rate=0, burst=1, max_wait=5)
+        self.channels = []
+
+    def make_service(self, statuses, **kwargs):
+        statuses = list(statuses)
+
+        def handler(request):
+            import json
+            self.channels.append(json.loads(request.content)["channel"])
+            response = statuses.pop(0)
+            return response if isinstance(response, httpx.Response) else httpx.Response(response)
+
+        kwargs.setdefault('allowed_methods', ("POST",))
+        kwargs.setdefault('status_forcelist', (502, 503, 504))
+        return self.AsyncRocketChatService(transport=make_transport(handler, **kwargs), limiter=self.limiter)
+
+    async def test_send_message_success(self):
+        """メッセージ送信成功"""
+        service = self.make_service([200])
+        self.assertEqual(await service.send_message("#test", "hello"), (True, "#test"))
+
+    async def test_fallback_to_default_channel(self):
+        """400 の場合はデフォルトチャンネルに再送すること"""
+        service = self.make_service([400, 200])
+        self.assertEqual(await service.send_message("#missing", "hello"), (True, "#general"))
+        self.assertEqual(self.channels, ["#missing", "#general"])
+
+    async def test_retry_on_429(self):
+        """429 は Retry-After に従って再送し、500 は重複投稿を避けるため再試行しないこと"""
+        service = self.make_service([httpx.Response(429, headers={"Retry-After": "0"}), 200])
+        self.assertEqual(await service.send_message("#test", "hello"), (True, "#test"))
+        self.assertEqual(len(self.channels), 2)
+
+        self.channels.clear()
+        service = self.make_service([500, 200])
+        success, _ = await service.send_message("#test", "hello")
+        self.assertFalse(success)
+        self.assertEqual(len(self.channels), 1)
+
+    async def test_rate_limit_400_is_not_fallback(self):
+        """400 のレート制限エラーはデフォルトチャンネルへのフォールバックにしないこと"""
+        from proxy.services.rocketchat import RATE_LIMITED_RESULT
+        too_many = httpx.Response(400, json={
+            "success": False,
+            "error": "Error, too many requests. Please slow down. You must wait 10 seconds "
+                     "before trying this endpoint again. [error-too-many-requests]"
+        })
+        service = self.make_service([too_many])
+        self.assertEqual(await service.send_message("#test", "hello"), (False, RATE_LIMITED_RESULT))
+        self.assertEqual(self.channels, ["#test"])
+        # 指示された待ち時間の間は送信しない
+        self.assertGreater(service.retry_after(), 9)
+
+
+@patch('proxy.services.async_openproject.config.OP_API_KEY', 'test_key')
+class TestAsyncOpenProjectService(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        from proxy.services.async_openproject import AsyncOpenProjectService
+        self.calls = 0
+
+        async def handler(request):
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            if request.url.path.endswith('/1'):
+                return httpx.Response(200, json={"name": "Tanaka Taro"})
+            if request.url.path.endswith('/7'):
+                return httpx.Response(200, json={"name": "Suzuki Jiro", "login": "jsuzuki"})
+            return httpx.Response(404)
+
+        self.AsyncOpenProjectService = AsyncOpenProjectService
+        self.handler = handler
+        self.service = AsyncOpenProjectService(transport=make_transport(handler))
+
+    async def test_concurrent_lookups_are_coalesced(self):
+        """同一ユーザーの同時問い合わせは 1 回の API 呼び出しにまとめられること"""
+        names = await asyncio.gather(*(self.service.get_user_name("/api/v3/users/1") for _ in range(5)))
+        self.assertEqual(names, ["Tanaka Taro"] * 5)
+        self.assertEqual(self.calls, 1)
+        # 以降はキャッシュから返る
+        self.assertEqual(await self.service.get_user_name("/api/v3/users/1"), "Tanaka Taro")
+        self.assertEqual(self.calls, 1)
+
+    async def test_not_found_is_negative_cached(self):
+        """取得失敗は既定の名前を返し、短時間キャッシュされること"""
+        self.assertEqual(await self.service.get_user_name("/api/v3/users/999"), "OpenProject")
+        self.assertEqual(await self.service.get_user_name("/api/v3/users/999"), "OpenProject")
+        self.assertEqual(self.calls, 1)
+
+    @patch('proxy.services.async_openproject.config.MENTION_RESOLVE_RULE', 'login')
+    async def test_get_user_names_resolves_mentions(self):
+        """投稿者とメンション先をまとめて取得し、メンション先は以降キャッシュから返すこと"""
+        author, names = await self.service.get_user_names("/api/v3/users/1", ["7", "999"])
+        self.assertEqual((author, names), ("Tanaka Taro", {"7": "jsuzuki"}))
+        self.assertEqual(self.calls, 3)
+
+        self.assertEqual(await self.service.get_user_names("/api/v3/users/7", ["7", "999"]), ("Suzuki Jiro", {"7": "jsuzuki"}))
+        self.assertEqual(self.calls, 3)
+
+    @patch('proxy.services.async_openproject.config.MENTION_RESOLVE_RULE', 'login')
+    async def test_half_open_rejection_is_not_cached(self):
+        """半開状態で試行枠が無く問い合わせなかった場合は、取得失敗としてキャッシュしないこと"""
+        from proxy.core.circuit_breaker import CircuitBreaker
+        clock = MagicMock(return_value=1000.0)
+        shared_cache = MagicMock()
+        shared_cache.get.return_value = (False, None)
+        breaker = CircuitBreaker("openproject", minimum_calls=1, open_seconds=10, clock=clock)
+        self.service = self.AsyncOpenProjectService(
+            shared_cache=shared_cache, transport=make_transport(self.handler), breaker=breaker
+        )
+        breaker.record(False)
+        clock.return_value += 10
+        self.assertTrue(breaker.allow())  # 他のリクエストの試行が枠を使用中
+
+        # available() の確認後に試行枠が埋まった場合と同じ状況
+        with patch.object(breaker, 'available', return_value=True):
+            self.assertEqual(await self.service.get_user_names("/api/v3/users/1", ["7"]), ("OpenProject", {}))
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(self.service.mention_cache.lookup("7"), (False, None))
+        self.assertEqual(self.service.user_cache.lookup("/api/v3/users/1"), (False, None))
+        shared_cache.set.assert_not_called()
+
+        # 回復後は問い合わせて解決する
+        breaker.record(True)
+        self.assertEqual(
+            await self.service.get_user_names("/api/v3/users/1", ["7"]), ("Tanaka Taro", {"7": "jsuzuki"})
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.cache import TTLCache
+        self.TTLCache = TTLCache
+
+    def test_lru_eviction(self):
+        """サイズ上限を超えると最も古く使われたエントリが追い出されること"""
+        cache = self.TTLCache(maxsize=2, ttl=60, negative_ttl=5)
+        cache.set("a", "A")
+        cache.set("b", "B")
+        cache.lookup("a")  # a を最近使用済みにする
+        cache.set("c", "C")
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+
+    def test_ttl_expiry(self):
+        """有効期限切れのエントリはミスとなること"""
+        cache = self.TTLCache(maxsize=10, ttl=60, negative_ttl=5)
+        with patch('proxy.core.cache.time.monotonic', return_value=100.0):
+            cache.set("a", "A")
+        with patch('proxy.core.cache.time.monotonic', return_value=161.0):
+            self.assertEqual(cache.lookup("a"), (False, None))
+
+    def test_negative_entry(self):
+        """ロード結果が None の場合は negative エントリとして記憶されること"""
+        cache = self.TTLCache(maxsize=10, ttl=60, negative_ttl=5)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return None
+
+        self.assertIsNone(cache.get_or_load("a", loader))
+        self.assertIsNone(cache.get_or_load("a", loader))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.lookup("a"), (True, None))
+
+    def test_loader_error_not_cached(self):
+        """ロードが例外で終わった場合は何も記憶せず、次の呼び出しで再びロードすること"""
+        cache = self.TTLCache(maxsize=10, ttl=60, negative_ttl=5)
+
+        def failing():
+            raise RuntimeError("not called")
+
+        with self.assertRaises(RuntimeError):
+            cache.get_or_load("a", failing)
+        self.assertEqual(cache.lookup("a"), (False, None))
+        self.assertEqual(cache.get_or_load("a", lambda: "A"), "A")
+
+    def test_single_flight(self):
+        """同一キーの同時ロードが 1 回にまとめられること"""
+        cache = self.TTLCache(maxsize=10, ttl=60, negative_ttl=5)
+        calls = []
+        release = threading.Event()
+
+        def loader():
+            calls.append(1)
+            release.wait(2)
+            return "A"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_load("a", loader)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        release.set()
+        for t in threads:
+            t.join(2)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["A"] * 5)
+        self.assertEqual(cache.stats()["coalesced"], 4)
+
+
+class TestSharedCache(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.shared_cache import SharedCache
+        self.SharedCache = SharedCache
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'user_cache.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_shared_between_instances(self):
+        """別インスタンス (別ワーカー相当) から書き込んだ値を参照できること"""
+        writer = self.SharedCache(self.path)
+        reader = self.SharedCache(self.path)
+        writer.set("/api/v3/users/1", "Tanaka Taro", ttl=60)
+        self.assertEqual(reader.get("/api/v3/users/1"), (True, "Tanaka Taro"))
+        self.assertEqual(reader.get("/api/v3/users/2"), (False, None))
+        writer.close()
+        reader.close()
+
+    def test_expired_entry(self):
+        """期限切れのエントリはミスとなること"""
+        cache = self.SharedCache(self.path)
+        cache.set("/api/v3/users/1", "Tanaka Taro", ttl=-1)
+        self.assertEqual(cache.get("/api/v3/users/1"), (False, None))
+        cache.close()
+
+    def test_node_stats(self):
+        """ノード全体のヒット数が各ワーカーの合計となること"""
+        a = self.SharedCache(self.path)
+        b = self.SharedCache(self.path)
+        a.set("k", "v", ttl=60)
+        a.get("k")
+        b.get("k")
+        b.get("missing")
+        a.flush_stats()
+        stats = b.stats()
+        self.assertEqual(stats["worker"]["hits"], 1)
+        self.assertEqual(stats["node"]["hits"], 2)
+        self.assertEqual(stats["node"]["misses"], 1)
+        a.close()
+        b.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
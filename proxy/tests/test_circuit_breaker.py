@@ -0,0 +1,73 @@
+import unittest
+import sys
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.circuit_breaker import CircuitBreaker
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            "test", failure_rate=0.5, minimum_calls=4, window=4,
+            slow_call_seconds=1.0, open_seconds=30, clock=self.clock
+        )
+
+    def test_opens_on_failure_rate(self):
+        """直近の失敗率がしきい値を超えると open になり、呼び出しを拒否すること"""
+        for success in (True, True, False):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(success)
+        self.assertEqual(self.breaker.state, "closed")
+
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, "open")
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.retry_after(), 30)
+        self.assertEqual(self.breaker.stats()["rejected"], 1)
+
+    def test_slow_calls_count_as_failures(self):
+        """slow_call_seconds 以上かかった成功呼び出しも失敗として扱うこと"""
+        for _ in range(4):
+            self.breaker.record(True, elapsed=2.5)
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_half_open_probe(self):
+        """open_seconds 経過後は 1 件だけ試行し、結果に応じて closed / open に戻ること"""
+        for _ in range(4):
+            self.breaker.record(False)
+        self.clock.now += 30
+        self.assertEqual(self.breaker.state, "half_open")
+        self.assertTrue(self.breaker.allow())
+        # 試行中は他の呼び出しを通さない
+        self.assertFalse(self.breaker.available())
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, "open")
+
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(True)
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertTrue(self.breaker.allow())
+
+    def test_disabled_when_failure_rate_is_zero(self):
+        """failure_rate が 0 の場合は遮断しないこと"""
+        from proxy.core.circuit_breaker import CircuitBreaker
+        breaker = CircuitBreaker("disabled", failure_rate=0, minimum_calls=1)
+        for _ in range(10):
+            breaker.record(False)
+        self.assertTrue(breaker.allow())
+
+
+if __name__ == '__main__':
+    unittest.main()
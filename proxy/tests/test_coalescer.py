@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import threading
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+class TestMessageCoalescer(unittest.TestCase):
+    def setUp(self):
+        from proxy.services.coalescer import MessageCoalescer
+        self.sender = MagicMock()
+        self.sender.send_message.return_value = (True, "#test")
+        self.MessageCoalescer = MessageCoalescer
+
+    def send_concurrently(self, coalescer, messages):
+        results = []
+        threads = [
+            threading.Thread(target=lambda c=c, t=t, a=a: results.append(coalescer.send_message(c, t, alias=a)))
+            for c, t, a in messages
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        return results
+
+    def test_burst_is_combined(self):
+        """同一チャンネル宛ての連続したメッセージが 1 件にまとめられること"""
+        coalescer = self.MessageCoalescer(self.sender, window=0.2, max_messages=10, max_chars=10000)
+        results = self.send_concurrently(coalescer, [("#test", f"comment {i}", "Tanaka") for i in range(5)])
+
+        self.assertEqual(results, [(True, "#test")] * 5)
+        self.assertEqual(self.sender.send_message.call_count, 1)
+        channel, text = self.sender.send_message.call_args[0]
+        self.assertEqual(channel, "#test")
+        for i in range(5):
+            self.assertIn(f"comment {i}", text)
+        self.assertEqual(self.sender.send_message.call_args[1]['alias'], "Tanaka")
+
+    def test_channels_are_separate(self):
+        """チャンネルごとに別々に送信されること"""
+        coalescer = self.MessageCoalescer(self.sender, window=0.1, max_messages=10, max_chars=10000)
+        self.send_concurrently(coalescer, [("#a", "x", "Tanaka"), ("#b", "y", "Tanaka")])
+        self.assertEqual(self.sender.send_message.call_count, 2)
+
+    def test_max_messages_flushes_early(self):
+        """件数上限に達したら window を待たずに送信されること"""
+        coalescer = self.MessageCoalescer(self.sender, window=30, max_messages=2, max_chars=10000)
+        results = self.send_concurrently(coalescer, [("#test", "a", "Tanaka"), ("#test", "b", "Suzuki")])
+        self.assertEqual(len(results), 2)
+        self.assertEqual(self.sender.send_message.call_count, 1)
+        # 投稿者が異なる場合は各コメントに投稿者名が付くこと
+        text = self.sender.send_message.call_args[0][1]
+        self.assertIn("Tanaka", text)
+        self.assertIn("Suzuki", text)
+        self.assertEqual(self.sender.send_message.call_args[1]['alias'], "OpenProject")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,7 @@
+import io
+import json
+import logging
+import queue
 import unittest
 from unittest.mock import patch, MagicMock
 import sys
@@ -40,5 +44,99 @@ class TestConfigValidation(unittest.TestCase):
         self.assertGreater(len(errors), 0)
 
 
+def make_record(msg, *args, level=logging.INFO, exc_info=None):
+    return logging.LogRecord("test", level, __file__, 1, msg, args, exc_info)
+
+
+class TestLogRateLimiter(unittest.TestCase):
+    def setUp(self):
+        from proxy.config import LogRateLimiter
+        self.limiter = LogRateLimiter(limit=2, interval=60, sample_every=3)
+
+    def test_limit_and_sample(self):
+        """同じテンプレートのメッセージは上限を超えると間引き、見送った件数を付記すること"""
+        records = [make_record("Message sent successfully to %s", f"#ch{i}") for i in range(8)]
+        passed = [r for r in records if self.limiter.filter(r)]
+
+        # 2 件まではそのまま、以降は 3 件に 1 件
+        self.assertEqual(len(passed), 4)
+        self.assertEqual(passed[1].getMessage(), "Message sent successfully to #ch1")
+        self.assertEqual(passed[2].getMessage(), "Message sent successfully to #ch4 (2 similar messages suppressed)")
+        self.assertEqual(self.limiter.suppressed, 4)
+
+        # テンプレートが異なるメッセージは別に数える
+        self.assertTrue(self.limiter.filter(make_record("Other message")))
+
+    def test_errors_never_suppressed(self):
+        """WARNING 以上のメッセージは上限を超えても間引かないこと"""
+        for level in (logging.WARNING, logging.ERROR, logging.CRITICAL):
+            records = [make_record("Failed to send to %s", f"#ch{i}", level=level) for i in range(10)]
+            self.assertTrue(all(self.limiter.filter(r) for r in records))
+        self.assertEqual(self.limiter.suppressed, 0)
+
+
+class TestLogQueueHandler(unittest.TestCase):
+    def setUp(self):
+        from proxy.config import LogQueueHandler
+        self.handler = LogQueueHandler(queue.Queue(2))
+
+    def test_drop_when_full(self):
+        """キューが満杯の場合は待たずに捨て、次に入れられたときに件数を報告すること"""
+        for i in range(4):
+            self.handler.handle(make_record("message %d", i))
+        self.assertEqual(self.handler.dropped, 2)
+
+        self.handler.queue.get_nowait()
+        self.handler.queue.get_nowait()
+        self.handler.handle(make_record("after"))
+        report = self.handler.queue.get_nowait()
+        self.assertIn("2 log records dropped", report.getMessage())
+        self.assertEqual(self.handler.queue.get_nowait().getMessage(), "after")
+
+    def test_exception_kept_for_formatter(self):
+        """引数は展開し、例外は出力スレッドで整形できるよう残すこと"""
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            record = make_record("failed %s", "id-1", level=logging.ERROR, exc_info=sys.exc_info())
+        self.handler.handle(record)
+        queued = self.handler.queue.get_nowait()
+        self.assertEqual((queued.msg, queued.args), ("failed id-1", None))
+        self.assertIsNotNone(queued.exc_info)
+
+
+@patch('proxy.config.LOG_FORMAT', 'json')
+@patch('proxy.config.LOG_QUEUE_SIZE', 100)
+class TestSetupLogging(unittest.TestCase):
+    def setUp(self):
+        from proxy import config
+        self.config = config
+        self.stream = io.StringIO()
+        self.stderr = patch('sys.stderr', self.stream)
+        self.stderr.start()
+
+    def tearDown(self):
+        self.config._stop_log_listener()
+        logging.getLogger().handlers.clear()
+        self.stderr.stop()
+
+    def test_output_through_queue(self):
+        """ログはキュー経由で出力され、停止時に残りが書き出されること"""
+        self.config.setup_logging()
+        logger = logging.getLogger("proxy.test")
+        logger.info("Message sent successfully to %s", "#general")
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            logger.exception("Unexpected error")
+        self.config._stop_log_listener()
+
+        lines = [json.loads(line) for line in self.stream.getvalue().splitlines()]
+        self.assertEqual(lines[0]["message"], "Message sent successfully to #general")
+        self.assertEqual(lines[1]["message"], "Unexpected error")
+        self.assertIn("ValueError: bad", lines[1]["exception"])
+        self.assertEqual(self.config.logging_stats()["dropped"], 0)
+
+
 if __name__ == '__main__':
     unittest.main()
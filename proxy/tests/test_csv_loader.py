@@ -0,0 +1,49 @@
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+class TestCsvLoader(unittest.TestCase):
+    def setUp(self):
+        from proxy.core import csv_loader
+        self.csv_loader = csv_loader
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'users.csv')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, content):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def test_load_mapping(self):
+        """BOM・空行・空セルを含む CSV を読み込めること"""
+        self.write('\ufeffopenproject_user,rocketchat_user\n田中 太郎,tanaka.rc\n\nsuzuki_op,\n')
+        mapping = self.csv_loader.load_csv_mapping(self.path, 'openproject_user', 'rocketchat_user')
+        self.assertEqual(mapping, {'田中 太郎': 'tanaka.rc'})
+
+    def test_missing_columns(self):
+        """必須列が無い場合はエラーとなること"""
+        self.write('name,channel\na,b\n')
+        with self.assertRaises(self.csv_loader.CsvFormatError):
+            self.csv_loader.load_csv_mapping(self.path, 'openproject_user', 'rocketchat_user')
+
+    def test_empty_file(self):
+        """空ファイルはエラーとなること"""
+        self.write('')
+        with self.assertRaises(self.csv_loader.CsvFormatError):
+            self.csv_loader.load_csv_mapping(self.path, 'openproject_user', 'rocketchat_user')
+
+    def test_too_many_fields(self):
+        """ヘッダーより列数が多い行はエラーとなること"""
+        self.write('openproject_user,rocketchat_user\na,b,c\n')
+        with self.assertRaises(self.csv_loader.CsvFormatError):
+            self.csv_loader.load_csv_mapping(self.path, 'openproject_user', 'rocketchat_user')
+
+
+if __name__ == '__main__':
+    unittest.main()
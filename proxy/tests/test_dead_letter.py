@@ -0,0 +1,152 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+import sys
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+class TestDeadLetterStore(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.dead_letter import DeadLetterFilter, DeadLetterStore
+        self.DeadLetterFilter = DeadLetterFilter
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = DeadLetterStore(os.path.join(self.tmpdir.name, 'dead_letters.db'))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def add(self, key, channel="#dev", project="demo", error="Failed to send message"):
+        self.store.add(key, "webhook", channel, project, "Tanaka Taro", f"text {key}", error)
+
+    def test_same_event_is_merged(self):
+        """同じイベントの失敗は 1 件にまとめ、試行回数を加算すること"""
+        self.add("a")
+        self.store.add("a", "webhook", "#dev", "demo", "Tanaka Taro", "text a2", "Connection error", 2)
+        letters = self.store.claim(10)
+        self.assertEqual(len(letters), 1)
+        self.assertEqual((letters[0].text, letters[0].error, letters[0].attempts), ("text a2", "Connection error", 3))
+
+    def test_claim_filters_and_lease(self):
+        """条件で絞り込み、リース中・再送済みの通知は取り出さないこと"""
+        self.add("a", channel="#dev")
+        self.add("b", channel="#infra", project="infra")
+        self.add("c", channel="#dev", error="Timeout sending message")
+
+        filters = self.DeadLetterFilter(channels=["#dev"], exclude_errors=["Timeout sending message"])
+        self.assertEqual(self.store.count_by_channel(filters), [("#dev", 1)])
+        [letter] = self.store.claim(10, filters)
+        self.assertEqual(letter.key, "a")
+        self.assertEqual(self.store.claim(10, filters), [])  # リース中
+
+        self.store.mark_replayed(letter.id)
+        self.assertEqual([x.key for x in self.store.claim(10, self.DeadLetterFilter(projects=["infra"]))], ["b"])
+        self.assertEqual(self.store.claim(10, self.DeadLetterFilter(since=time.time() + 60)), [])
+        self.assertEqual(self.store.stats()["pending"], 2)
+
+
+class TestDeadLetterReplayer(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.dead_letter import DeadLetterStore
+        from proxy.core.dedup import LocalSeenSet
+        from proxy.services.replay import DeadLetterReplayer
+        self.DeadLetterReplayer = DeadLetterReplayer
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = DeadLetterStore(os.path.join(self.tmpdir.name, 'dead_letters.db'))
+        self.seen = LocalSeenSet(ttl=60, maxsize=100)
+        self.sender = MagicMock()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def slow_send(self, channel, text, alias="OpenProject"):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+        return True, channel
+
+    def test_concurrent_and_idempotent(self):
+        """並行して再送し、再実行しても再送済みの通知は送らないこと"""
+        for i in range(20):
+            self.store.add(f"k{i}", "spool", "#dev", "demo", "Tanaka Taro", f"text {i}", "Connection error", 5)
+        self.sender.send_message.side_effect = self.slow_send
+
+        replayer = self.DeadLetterReplayer(self.store, self.sender, concurrency=4)
+        self.assertEqual(replayer.run()["replayed"], 20)
+        self.assertEqual(self.sender.send_message.call_count, 20)
+        self.assertEqual(self.peak, 4)
+
+        self.assertEqual(replayer.run()["replayed"], 0)
+        self.assertEqual(self.sender.send_message.call_count, 20)
+
+    def test_failure_is_kept_and_circuit_open_stops(self):
+        """再送の失敗は残して次回に回し、Rocket.Chat が遮断中なら取り出しを止めること"""
+        from proxy.services.rocketchat import CIRCUIT_OPEN_RESULT
+        for i in range(30):
+            self.store.add(f"k{i}", "spool", "#dev", None, "Tanaka Taro", f"text {i}", "Connection error")
+        results = iter([(False, "Failed to send message")] + [(False, CIRCUIT_OPEN_RESULT)] * 100)
+        self.sender.send_message.side_effect = lambda *args, **kwargs: next(results)
+
+        replayer = self.DeadLetterReplayer(self.store, self.sender, concurrency=1)
+        counts = replayer.run()
+        self.assertTrue(replayer.halted)
+        self.assertEqual(counts["failed"], 1)
+        self.assertLess(self.sender.send_message.call_count, 30)
+        self.assertEqual(self.store.stats()["pending"], 30)
+        self.assertEqual(self.store.claim(1)[0].attempts, 2)
+
+    def test_rate_limited_is_not_reclaimed(self):
+        """レート制限で送らなかった通知は同じ再送処理では取り出さず、次回に回すこと"""
+        from proxy.services.rocketchat import RATE_LIMITED_RESULT
+        for i in range(3):
+            self.store.add(f"k{i}", "spool", "#dev", None, "Tanaka Taro", f"text {i}", "Connection error")
+        results = iter([(False, RATE_LIMITED_RESULT)] + [(True, "#dev")] * 10)
+        self.sender.send_message.side_effect = lambda *args, **kwargs: next(results)
+
+        replayer = self.DeadLetterReplayer(self.store, self.sender, concurrency=1)
+        counts = replayer.run()
+        self.assertEqual((counts["replayed"], counts["deferred"]), (2, 1))
+        self.assertEqual(self.sender.send_message.call_count, 3)
+
+        self.assertEqual(replayer.run()["replayed"], 1)
+        self.assertEqual(self.store.stats()["pending"], 0)
+
+    def test_skip_delivered_by_redelivery(self):
+        """同期モードの失敗後に OpenProject の再送で配送済みの通知は送らないこと"""
+        self.store.add("redelivered", "webhook", "#dev", "demo", "A", "text", "Connection error")
+        self.store.add("lost", "webhook", "#dev", "demo", "A", "text", "Connection error")
+        self.seen.add("redelivered")
+        self.sender.send_message.return_value = (True, "#dev")
+
+        counts = self.DeadLetterReplayer(self.store, self.sender, seen=self.seen).run()
+        self.assertEqual((counts["replayed"], counts["skipped"]), (1, 1))
+        self.sender.send_message.assert_called_once()
+        # 再送した通知は重複判定に登録され、以降の OpenProject の再送は抑止される
+        self.assertFalse(self.seen.add("lost"))
+
+    def test_instance_destination(self):
+        """追加の Rocket.Chat インスタンス宛ての通知はそのインスタンスへ再送すること"""
+        partner = MagicMock()
+        partner.send_message.return_value = (True, "#team")
+        self.store.add("k>partner:#team", "fanout", "#team", "demo", "A", "text", "Connection error", instance="partner")
+        self.store.add("k>other:#team", "fanout", "#team", "demo", "A", "text", "Connection error", instance="other")
+
+        counts = self.DeadLetterReplayer(self.store, self.sender, instances={"partner": partner}).run()
+        self.assertEqual((counts["replayed"], counts["failed"]), (1, 1))
+        partner.send_message.assert_called_once_with("#team", "text", alias="A")
+        self.sender.send_message.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import time
+import unittest
+import sys
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+def make_payload(activity_id=101, comment="Test comment"):
+    return {
+        "action": "work_package_comment:comment",
+        "activity": {
+            "id": activity_id,
+            "comment": {"raw": comment},
+            "_links": {"user": {"href": "/api/v3/users/1"}},
+            "_embedded": {"workPackage": {"id": 7, "subject": "Task"}}
+        }
+    }
+
+
+class TestIdempotencyKey(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.pipeline import idempotency_key, parse_comment_event
+        self.idempotency_key = idempotency_key
+        self.parse = lambda payload: parse_comment_event(payload)[0]
+
+    def test_same_activity_same_key(self):
+        """同じ activity の再送は同じキーになること"""
+        first = self.parse(make_payload())
+        retry = self.parse(make_payload())
+        self.assertEqual(first.activity_id, "101")
+        self.assertEqual(self.idempotency_key(first), self.idempotency_key(retry))
+
+    def test_different_activity_or_content(self):
+        """activity ID または内容が異なれば別のキーになること"""
+        base = self.idempotency_key(self.parse(make_payload()))
+        self.assertNotEqual(base, self.idempotency_key(self.parse(make_payload(activity_id=102))))
+        self.assertNotEqual(base, self.idempotency_key(self.parse(make_payload(comment="Edited"))))
+
+
+class TestSeenSet(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.dedup import LocalSeenSet, SharedSeenSet
+        self.LocalSeenSet = LocalSeenSet
+        self.SharedSeenSet = SharedSeenSet
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'seen.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_local_add_and_discard(self):
+        """2 回目の登録は重複となり、取り消し後は再び受け付けること"""
+        seen = self.LocalSeenSet(ttl=60, maxsize=10)
+        self.assertTrue(seen.add("a"))
+        self.assertFalse(seen.add("a"))
+        seen.discard("a")
+        self.assertTrue(seen.add("a"))
+
+    def test_shared_across_workers(self):
+        """同じファイルを使う別インスタンス (別ワーカー) 間で重複を検出すること"""
+        worker1 = self.SharedSeenSet(self.path, ttl=60, maxsize=100)
+        worker2 = self.SharedSeenSet(self.path, ttl=60, maxsize=100)
+        self.assertTrue(worker1.add("a"))
+        self.assertFalse(worker2.add("a"))
+        worker2.discard("a")
+        self.assertTrue(worker1.add("a"))
+        worker1.close()
+        worker2.close()
+
+    def test_shared_expiry(self):
+        """期限切れのエントリは新規として扱われること"""
+        seen = self.SharedSeenSet(self.path, ttl=0.05, maxsize=100)
+        self.assertTrue(seen.add("a"))
+        time.sleep(0.1)
+        self.assertTrue(seen.add("a"))
+        seen.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
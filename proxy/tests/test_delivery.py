@@ -0,0 +1,222 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import sys
+import tempfile
+import time
+
+# Mock dependencies
+sys.modules['pandas'] = MagicMock()
+sys.modules['requests'] = MagicMock()
+sys.modules['requests.adapters'] = MagicMock()
+sys.modules['urllib3'] = MagicMock()
+sys.modules['urllib3.util'] = MagicMock()
+sys.modules['urllib3.util.retry'] = MagicMock()
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+def make_event_dict(wp_id=1):
+    return {
+        "wp_id": wp_id,
+        "wp_subject": "Test WP",
+        "comment": "Test comment",
+        "project_title": "Test Project",
+        "project_href": "/api/v3/projects/demo",
+        "user_href": "/api/v3/users/1",
+    }
+
+
+class TestSpool(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.spool import Spool
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.spool = Spool(os.path.join(self.tmpdir.name, 'spool.db'))
+
+    def tearDown(self):
+        self.spool.close()
+        self.tmpdir.cleanup()
+
+    def test_enqueue_and_claim(self):
+        """書き込んだイベントを取り出せること"""
+        event_id = self.spool.enqueue(make_event_dict())
+        claimed = self.spool.claim()
+        self.assertIsNotNone(claimed)
+        self.assertEqual(claimed[0], event_id)
+        self.assertEqual(claimed[1]["wp_id"], 1)
+        # リース中のイベントは再取得されない
+        self.assertIsNone(self.spool.claim())
+
+    def test_ack_removes_event(self):
+        """ack したイベントはキューから消えること"""
+        event_id = self.spool.enqueue(make_event_dict())
+        self.spool.claim()
+        self.spool.ack(event_id)
+        self.assertEqual(self.spool.pending_count(), 0)
+
+    def test_persists_across_instances(self):
+        """再起動後もイベントが残っていること"""
+        from proxy.core.spool import Spool
+        self.spool.enqueue(make_event_dict())
+        reopened = Spool(self.spool.path)
+        self.assertEqual(reopened.pending_count(), 1)
+        reopened.close()
+
+
+class TestDeliveryWorkerPool(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.spool import Spool
+        from proxy.core.mapper import Destination
+        from proxy.core.pipeline import default_template
+        from proxy.services.delivery import DeliveryWorkerPool
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.spool = Spool(os.path.join(self.tmpdir.name, 'spool.db'))
+        self.mapper = MagicMock()
+        self.mapper.get_rc_user.return_value = None
+        self.mapper.get_destinations.return_value = (Destination("#test"),)
+        self.mapper.get_template.return_value = default_template()
+        self.op_service = MagicMock()
+        self.op_service.get_user_name.return_value = "Test User"
+        self.rc_service = MagicMock()
+        self.pool = DeliveryWorkerPool(
+            self.spool, self.mapper, self.op_service, self.rc_service,
+            workers=1, max_attempts=2, retry_backoff=0
+        )
+
+    def tearDown(self):
+        self.spool.close()
+        self.tmpdir.cleanup()
+
+    def test_process_success(self):
+        """配送成功時にイベントが削除されること"""
+        self.rc_service.send_message.return_value = (True, "#test")
+        self.spool.enqueue(make_event_dict())
+        self.assertTrue(self.pool.process_one())
+        self.assertEqual(self.spool.pending_count(), 0)
+        channel, text = self.rc_service.send_message.call_args[0]
+        self.assertEqual(channel, "#test")
+        self.assertIn("Test comment", text)
+
+    def test_process_retry_then_fail(self):
+        """失敗時は再試行され、上限到達で failed となること"""
+        self.rc_service.send_message.return_value = (False, "Connection error")
+        self.spool.enqueue(make_event_dict())
+        self.assertTrue(self.pool.process_one())
+        self.assertEqual(self.spool.pending_count(), 1)
+        self.assertTrue(self.pool.process_one())
+        self.assertEqual(self.spool.pending_count(), 0)
+        self.assertEqual(self.spool.failed_count(), 1)
+
+    def test_last_failure_is_dead_lettered(self):
+        """上限に達した失敗だけが組み立て済みのメッセージとともに保存されること"""
+        from proxy.core.dead_letter import DeadLetterStore
+        self.pool.dead_letters = DeadLetterStore(os.path.join(self.tmpdir.name, 'dead_letters.db'))
+        self.rc_service.send_message.return_value = (False, "Connection error")
+        self.spool.enqueue(make_event_dict())
+        self.pool.process_one()
+        self.assertEqual(self.pool.dead_letters.pending_count(), 0)
+        self.pool.process_one()
+        [letter] = self.pool.dead_letters.claim(10)
+        self.assertEqual((letter.source, letter.channel, letter.attempts), ("spool", "#test", 2))
+        self.assertIn("Test comment", letter.text)
+        self.pool.dead_letters.close()
+
+    def test_fallback_is_counted(self):
+        """デフォルトチャンネルへのフォールバックが配送結果として記録されること"""
+        from proxy.services import delivery
+        before = dict(delivery.OUTCOMES._values)
+        self.rc_service.send_message.return_value = (True, "#general")
+        self.spool.enqueue(make_event_dict())
+        self.assertTrue(self.pool.process_one())
+        after = delivery.OUTCOMES._values
+        self.assertEqual(after.get(("fallback",), 0) - before.get(("fallback",), 0), 1)
+        self.assertEqual(after.get(("delivered",), 0), before.get(("delivered",), 0))
+
+    def test_circuit_open_parks_without_attempt(self):
+        """Rocket.Chat の遮断中は試行回数を増やさずに保留されること"""
+        from proxy.services.rocketchat import CIRCUIT_OPEN_RESULT
+        self.rc_service.send_message.return_value = (False, CIRCUIT_OPEN_RESULT)
+        self.spool.enqueue(make_event_dict())
+        self.assertTrue(self.pool.process_one())
+        self.assertEqual(self.spool.pending_count(), 1)
+        self.assertEqual(self.spool.failed_count(), 0)
+        # 保留期間中は取り出されない
+        self.assertIsNone(self.spool.claim())
+
+    def test_process_empty(self):
+        """キューが空の場合"""
+        self.assertFalse(self.pool.process_one())
+
+
+class TestFanout(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.dead_letter import DeadLetterStore
+        from proxy.core.mapper import Destination
+        from proxy.core.pipeline import CommentEvent, default_template
+        from proxy.services.fanout import Fanout
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dead_letters = DeadLetterStore(os.path.join(self.tmpdir.name, 'dead_letters.db'))
+        self.event = CommentEvent.from_dict(make_event_dict())
+        self.mapper = MagicMock()
+        self.mapper.get_rc_user.return_value = None
+        self.mapper.get_destinations.return_value = (
+            Destination("#team"), Destination("#ops"), Destination("#team", "partner")
+        )
+        self.mapper.get_template.return_value = default_template()
+        self.op_service = MagicMock()
+        self.op_service.get_user_name.return_value = "Test User"
+        self.rc_service = MagicMock()
+        self.partner = MagicMock()
+        self.fanout = Fanout({"partner": self.partner}, concurrency=4)
+
+    def tearDown(self):
+        self.fanout.stop()
+        self.dead_letters.close()
+        self.tmpdir.cleanup()
+
+    def slow(self, success):
+        def send_message(channel, text, alias="OpenProject"):
+            time.sleep(0.1)
+            return (True, channel) if success else (False, "Connection error")
+        return send_message
+
+    def test_parallel_send_and_partial_result(self):
+        """送信先へ並行して送り、一部の失敗は partial として失敗した送信先だけを保存すること"""
+        from proxy.services.delivery import deliver_event
+        self.rc_service.send_message.side_effect = self.slow(True)
+        self.partner.send_message.side_effect = self.slow(False)
+
+        started = time.perf_counter()
+        delivery = deliver_event(
+            self.event, self.mapper, self.op_service, self.rc_service, self.dead_letters, fanout=self.fanout
+        )
+        self.assertLess(time.perf_counter() - started, 0.25)
+
+        self.assertTrue(delivery.success)
+        self.assertTrue(delivery.partial)
+        body = delivery.response_body()
+        self.assertEqual((body["status"], body["channel"]), ("partial", "#team"))
+        self.assertEqual(
+            [(d["channel"], d["instance"], d["status"]) for d in body["destinations"]],
+            [("#team", None, "delivered"), ("#ops", None, "delivered"), ("#team", "partner", "failed")]
+        )
+        [letter] = self.dead_letters.claim(10)
+        self.assertEqual((letter.source, letter.channel, letter.instance), ("fanout", "#team", "partner"))
+
+    def test_all_failed_in_spool_keeps_retrying(self):
+        """すべての送信先に失敗した場合は、再試行の上限まで保存せずに代表する失敗を返すこと"""
+        from proxy.services.delivery import deliver_event
+        from proxy.services.rocketchat import CIRCUIT_OPEN_RESULT
+        self.rc_service.send_message.return_value = (False, CIRCUIT_OPEN_RESULT)
+        self.partner.send_message.return_value = (False, "Connection error")
+
+        delivery = deliver_event(
+            self.event, self.mapper, self.op_service, self.rc_service, self.dead_letters,
+            source="spool", final=False, fanout=self.fanout
+        )
+        self.assertEqual((delivery.success, delivery.result), (False, "Connection error"))
+        self.assertEqual(self.dead_letters.pending_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestHealthMonitor(unittest.TestCase):
+    def setUp(self):
+        from proxy.services import health
+        self.health = health
+        self.clock = FakeClock()
+        self.session = MagicMock()
+        self.responses = {}
+        self.session.get.side_effect = self.get
+        probes = [
+            health.Probe(health.OPENPROJECT, 'http://openproject/api/v3', healthy=lambda status: status < 400),
+            health.Probe(health.ROCKETCHAT, 'http://rocketchat/api/info'),
+        ]
+        self.monitor = health.HealthMonitor(
+            probes, interval=10, timeout=1, failure_threshold=2, error_window=60, max_error_rate=0.5,
+            session=self.session, clock=self.clock
+        )
+        self.mapper = MagicMock()
+        self.mapper.last_reload_error = None
+        self.mapper.index_conflicts = []
+        validate = patch('proxy.services.health.validate_config', return_value=(True, []))
+        validate.start()
+        self.addCleanup(validate.stop)
+
+    def get(self, url, **kwargs):
+        result = self.responses.get(url, 200)
+        if isinstance(result, Exception):
+            raise result
+        response = MagicMock()
+        response.status_code = result
+        return response
+
+    def test_rocketchat_info_url(self):
+        """Webhook URL から同じ Rocket.Chat (サブパスを含む) の /api/info を求めること"""
+        self.assertEqual(
+            self.health.rocketchat_info_url('https://chat.example.com/chat/hooks/abc/def'),
+            'https://chat.example.com/chat/api/info'
+        )
+
+    def test_consecutive_failures_mark_down(self):
+        """連続して失敗した依存先だけを停止とし、1 回の成功で復旧すること"""
+        self.responses['http://rocketchat/api/info'] = ConnectionError()
+        self.responses['http://openproject/api/v3'] = 401
+        self.monitor.check()
+        self.assertEqual(self.monitor.snapshot.degraded, ())
+        snapshot = self.monitor.check()
+        self.assertEqual(snapshot.degraded, ('openproject', 'rocketchat'))
+        self.assertEqual(snapshot.dependencies['rocketchat']['last_error'], 'ConnectionError')
+        self.assertEqual(snapshot.dependencies['openproject']['last_error'], 'HTTP 401')
+
+        del self.responses['http://rocketchat/api/info']
+        snapshot = self.monitor.check()
+        self.assertEqual(snapshot.degraded, ('openproject',))
+        self.assertEqual(snapshot.dependencies['rocketchat']['consecutive_failures'], 0)
+
+    def test_delivery_error_rate_window(self):
+        """直近の期間の配送の失敗率が上限以上なら劣化とし、期間を過ぎれば戻ること"""
+        self.health.OUTCOMES.clear()
+        self.monitor.check()
+        for _ in range(6):
+            self.health.OUTCOMES.inc("failed")
+        for _ in range(4):
+            self.health.OUTCOMES.inc("delivered")
+        self.health.OUTCOMES.inc("duplicate")
+        self.clock.now += 10
+        snapshot = self.monitor.check()
+        self.assertEqual((snapshot.delivery['deliveries'], snapshot.delivery['failures']), (10, 6))
+        self.assertIn('delivery', snapshot.degraded)
+
+        self.clock.now += 61
+        self.monitor.check()
+        self.clock.now += 10
+        snapshot = self.monitor.check()
+        self.assertEqual(snapshot.delivery['deliveries'], 0)
+        self.assertNotIn('delivery', snapshot.degraded)
+
+    def test_ready_answers_from_snapshot(self):
+        """/ready は確認済みの結果を返して依存先・ファイルにアクセスせず、指定した依存先の劣化でのみ 503 とすること"""
+        from proxy.services.readiness import check_readiness
+        with patch('proxy.services.readiness.validate_config', return_value=(True, [])) as validate:
+            is_ready, checks = check_readiness(self.mapper, monitor=self.monitor)
+            self.assertFalse(is_ready)
+            self.assertIn('Health check in progress', checks['details'])
+
+            self.responses['http://rocketchat/api/info'] = 503
+            self.monitor.check()
+            self.monitor.check()
+            calls = self.session.get.call_count
+            validate.reset_mock()
+            for _ in range(5):
+                is_ready, checks = check_readiness(self.mapper, monitor=self.monitor)
+            self.assertEqual(self.session.get.call_count, calls)
+            validate.assert_not_called()
+
+        self.assertTrue(is_ready)
+        self.assertEqual(checks['dependencies']['rocketchat']['status'], 'down')
+        self.assertIn('Dependency rocketchat is degraded', checks['details'])
+        with patch('proxy.services.readiness.config.READY_SHED_DEPENDENCIES', ['rocketchat']):
+            is_ready, checks = check_readiness(self.mapper, monitor=self.monitor)
+        self.assertFalse(is_ready)
+        self.assertIn('Dependency rocketchat is degraded (shedding traffic)', checks['details'])
+
+        # 確認が止まった場合は準備未完了とする
+        self.clock.now += 60
+        is_ready, checks = check_readiness(self.mapper, monitor=self.monitor)
+        self.assertFalse(is_ready)
+        self.assertIn('Health monitor has stopped updating', checks['details'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+class TestMapperReload(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.users_path = os.path.join(self.tmpdir.name, 'users.csv')
+        self.projects_path = os.path.join(self.tmpdir.name, 'projects.csv')
+        self.templates_path = os.path.join(self.tmpdir.name, 'templates.csv')
+        self.write(self.users_path, 'openproject_user,rocketchat_user\nTanaka Taro,tanaka.rc\n')
+        self.write(self.projects_path, 'project_identifier,rc_channel\nデモプロジェクト,#dev-alerts\n')
+
+        patchers = [
+            patch('proxy.core.mapper.config.USERS_CSV_PATH', self.users_path),
+            patch('proxy.core.mapper.config.PROJECTS_CSV_PATH', self.projects_path),
+            patch('proxy.core.mapper.config.TEMPLATES_CSV_PATH', self.templates_path),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+        from proxy.core.mapper import Mapper
+        self.mapper = Mapper()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, path, content):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def test_no_reload_without_change(self):
+        """ファイルが変わっていなければ再読み込みしないこと"""
+        self.assertFalse(self.mapper.reload_if_changed())
+
+    def test_reload_swaps_mappings(self):
+        """ファイル更新後に新しいマッピングへ差し替わること"""
+        self.write(self.users_path, 'openproject_user,rocketchat_user\nTanaka Taro,tanaka.new\nSuzuki,suzuki.rc\n')
+        self.assertTrue(self.mapper.reload_if_changed())
+        self.assertEqual(self.mapper.get_rc_user('Tanaka Taro'), 'tanaka.new')
+        self.assertEqual(self.mapper.get_rc_user('Suzuki'), 'suzuki.rc')
+        self.assertEqual(self.mapper.get_channel('デモプロジェクト'), '#dev-alerts')
+
+    def test_invalid_csv_keeps_previous(self):
+        """不正な CSV の場合は直前のマッピングを維持してエラーを記録すること"""
+        self.write(self.users_path, 'name,channel\na,b\n')
+        self.assertFalse(self.mapper.reload_if_changed())
+        self.assertEqual(self.mapper.get_rc_user('Tanaka Taro'), 'tanaka.rc')
+        self.assertIn('missing required columns', self.mapper.last_reload_error)
+
+        # 修正されたら復旧すること
+        self.write(self.users_path, 'openproject_user,rocketchat_user\nTanaka Taro,tanaka.fixed\n')
+        self.assertTrue(self.mapper.reload_if_changed())
+        self.assertIsNone(self.mapper.last_reload_error)
+        self.assertEqual(self.mapper.get_rc_user('Tanaka Taro'), 'tanaka.fixed')
+
+    def test_templates_reload(self):
+        """templates.csv の追加を検知し、不正なテンプレートでは直前のテンプレートを維持すること"""
+        default = self.mapper.get_template('デモプロジェクト', '#dev-alerts')
+        self.write(self.templates_path, 'target,template\n#dev-alerts,{subject}\n')
+        self.assertTrue(self.mapper.reload_if_changed())
+        custom = self.mapper.get_template('デモプロジェクト', '#dev-alerts')
+        self.assertEqual(custom.source, '{subject}')
+        self.assertIs(self.mapper.get_template('other', '#general'), default)
+
+        self.write(self.templates_path, 'target,template\n#dev-alerts,{subjet}\n')
+        self.assertFalse(self.mapper.reload_if_changed())
+        self.assertIs(self.mapper.get_template('デモプロジェクト', '#dev-alerts'), custom)
+        self.assertIn('unknown field {subjet}', self.mapper.last_reload_error)
+
+    @patch('proxy.core.mapper.config.RC_INSTANCES', {'partner': 'https://partner.example.com/hooks/x'})
+    def test_multiple_destinations(self):
+        """同じプロジェクトの複数行をすべて送信先とし、未定義のインスタンスは読み込みエラーとすること"""
+        from proxy.core.mapper import Destination
+        self.write(
+            self.projects_path,
+            'project_identifier,rc_channel,rc_instance\n'
+            'デモプロジェクト,#dev-alerts,\nデモプロジェクト,#ops,\nデモプロジェクト,#dev-alerts,partner\n'
+            'デモプロジェクト,#ops,\n'
+        )
+        self.assertTrue(self.mapper.reload_if_changed())
+        self.assertEqual(self.mapper.get_destinations('デモプロジェクト'), (
+            Destination('#dev-alerts'), Destination('#ops'), Destination('#dev-alerts', 'partner')
+        ))
+        self.assertEqual(self.mapper.get_channel('デモプロジェクト'), '#dev-alerts')
+        self.assertEqual(self.mapper.get_destinations('other'), (Destination('#general'),))
+
+        self.write(self.projects_path, 'project_identifier,rc_channel,rc_instance\nデモプロジェクト,#ops,other\n')
+        self.assertFalse(self.mapper.reload_if_changed())
+        self.assertIn("unknown rc_instance 'other' in line 2", self.mapper.last_reload_error)
+        self.assertEqual(len(self.mapper.get_destinations('デモプロジェクト')), 3)
+
+    def test_normalized_lookup_and_aliases(self):
+        """全角・半角、空白、大文字小文字の違いと別名を吸収して検索できること"""
+        self.write(
+            self.users_path,
+            'openproject_user,rocketchat_user,aliases\nTanaka Taro,tanaka.rc,田中 太郎|Taro T.\nSuzuki,suzuki.rc,\n'
+        )
+        self.write(
+            self.projects_path,
+            'project_identifier,rc_channel,aliases\nデモプロジェクト,#dev-alerts,Demo Project\nＡＰＩ基盤,#api,\n'
+        )
+        self.assertTrue(self.mapper.reload_if_changed())
+
+        self.assertEqual(self.mapper.get_rc_user('Ｔａｎａｋａ　Ｔａｒｏ'), 'tanaka.rc')
+        self.assertEqual(self.mapper.get_rc_user(' tanaka  taro '), 'tanaka.rc')
+        self.assertEqual(self.mapper.get_rc_user('田中　太郎'), 'tanaka.rc')
+        self.assertEqual(self.mapper.get_rc_user('taro t.'), 'tanaka.rc')
+        self.assertIsNone(self.mapper.get_rc_user('Tanaka'))
+
+        self.assertEqual(self.mapper.get_channel('api基盤'), '#api')
+        self.assertEqual(self.mapper.get_destinations('demo project')[0].channel, '#dev-alerts')
+        self.assertEqual(self.mapper.get_channel('Unknown'), '#general')
+        self.assertEqual(self.mapper.index_conflicts, [])
+
+    def test_normalization_conflicts_are_reported(self):
+        """正規化すると一致するキーの対応先が異なる場合は完全一致でのみ使い、衝突を報告すること"""
+        self.write(
+            self.users_path,
+            'openproject_user,rocketchat_user,aliases\nTanaka Taro,tanaka.rc,\nＴＡＮＡＫＡ ＴＡＲＯ,tanaka2.rc,\n'
+            'Sato,sato.rc,suzuki\nSuzuki,suzuki.rc,\n'
+        )
+        self.assertTrue(self.mapper.reload_if_changed())
+        self.assertIsNone(self.mapper.last_reload_error)
+
+        self.assertEqual(self.mapper.get_rc_user('Tanaka Taro'), 'tanaka.rc')
+        self.assertEqual(self.mapper.get_rc_user('ＴＡＮＡＫＡ ＴＡＲＯ'), 'tanaka2.rc')
+        self.assertIsNone(self.mapper.get_rc_user('tanaka taro'))
+        self.assertEqual(self.mapper.get_rc_user('Suzuki'), 'suzuki.rc')
+        self.assertEqual(len(self.mapper.index_conflicts), 2)
+        self.assertIn("'Tanaka Taro', 'ＴＡＮＡＫＡ ＴＡＲＯ'", self.mapper.index_conflicts[0])
+
+    def test_compiled_users_snapshot(self):
+        """USERS_SNAPSHOT_PATH を設定するとコンパイル済みの対応表から引き、users.csv の更新時に作り直すこと"""
+        from proxy.core.compiled_map import CompiledMap
+        snapshot_path = os.path.join(self.tmpdir.name, 'data', 'users.map')
+        self.write(
+            self.users_path,
+            'openproject_user,rocketchat_user,aliases\nTanaka Taro,tanaka.rc,田中 太郎\nＳｕｚｕｋｉ,suzuki.rc,\n'
+            'Sato,sato.rc,suzuki\n'
+        )
+        with patch('proxy.core.mapper.config.USERS_SNAPSHOT_PATH', snapshot_path):
+            self.assertTrue(self.mapper.reload_if_changed())
+            self.assertIsInstance(self.mapper.users_map, CompiledMap)
+            self.assertEqual(self.mapper.get_rc_user('Tanaka Taro'), 'tanaka.rc')
+            self.assertEqual(self.mapper.get_rc_user('田中　太郎'), 'tanaka.rc')
+            self.assertEqual(self.mapper.get_rc_user('Ｓｕｚｕｋｉ'), 'suzuki.rc')
+            self.assertIsNone(self.mapper.get_rc_user('suzuki'))
+            self.assertEqual(len(self.mapper.index_conflicts), 1)
+
+            # 別のワーカーは作り直さずに同じファイルを開く
+            from proxy.core.mapper import Mapper
+            mtime = os.stat(snapshot_path).st_mtime_ns
+            self.assertEqual(Mapper().get_rc_user('tanaka taro'), 'tanaka.rc')
+            self.assertEqual(os.stat(snapshot_path).st_mtime_ns, mtime)
+
+            self.write(self.users_path, 'openproject_user,rocketchat_user\nTanaka Taro,tanaka.new\n')
+            self.assertTrue(self.mapper.reload_if_changed())
+            self.assertEqual(self.mapper.get_rc_user('TANAKA TARO'), 'tanaka.new')
+            self.assertEqual((len(self.mapper.users_map), self.mapper.index_conflicts), (1, []))
+
+    def test_broken_snapshot_is_rebuilt(self):
+        """コンパイル済みのファイルが壊れている場合は作り直すこと"""
+        snapshot_path = os.path.join(self.tmpdir.name, 'users.map')
+        self.write(snapshot_path, 'broken')
+        with patch('proxy.core.mapper.config.USERS_SNAPSHOT_PATH', snapshot_path):
+            from proxy.core.mapper import Mapper
+            mapper = Mapper()
+        self.assertEqual(mapper.get_rc_user('Tanaka Taro'), 'tanaka.rc')
+        self.assertIsNone(mapper.get_rc_user('Unknown'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.metrics import MetricsRegistry
+        self.tmpdir = tempfile.mkdtemp()
+        self.registry = MetricsRegistry()
+        self.requests = self.registry.counter("test_requests_total", "Requests", ("outcome",))
+        self.latency = self.registry.histogram("test_latency_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_render_prometheus_format(self):
+        """カウンターとヒストグラムが Prometheus テキスト形式で出力されること"""
+        self.requests.inc("delivered")
+        self.requests.inc("delivered")
+        self.latency.observe(0.05, "send")
+        self.latency.observe(0.5, "send")
+        self.latency.observe(5.0, "send")
+
+        text = self.registry.render()
+        self.assertIn("# TYPE test_requests_total counter", text)
+        self.assertIn('test_requests_total{outcome="delivered"} 2.0', text)
+        self.assertIn('test_latency_seconds_bucket{stage="send",le="0.1"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{stage="send",le="1.0"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{stage="send",le="+Inf"} 3', text)
+        self.assertIn('test_latency_seconds_count{stage="send"} 3', text)
+
+    def test_aggregates_other_workers(self):
+        """METRICS_DIR 内の他ワーカーのスナップショットと合算されること"""
+        self.registry.configure(self.tmpdir, flush_interval=0)
+        self.requests.inc("delivered")
+        self.latency.observe(0.05, "send")
+
+        # 別ワーカーが書き出したスナップショット
+        other = {
+            "test_requests_total": [[["delivered"], 3.0], [["failed"], 1.0]],
+            "test_latency_seconds": [[["send"], [0, 2, 0], 1.0, 2]],
+        }
+        with open(os.path.join(self.tmpdir, "metrics-999999.json"), 'w') as f:
+            json.dump(other, f)
+
+        text = self.registry.render()
+        self.assertIn('test_requests_total{outcome="delivered"} 4.0', text)
+        self.assertIn('test_requests_total{outcome="failed"} 1.0', text)
+        self.assertIn('test_latency_seconds_bucket{stage="send",le="1.0"} 3', text)
+        self.assertIn('test_latency_seconds_count{stage="send"} 3', text)
+
+        # 自プロセス分の書き出し
+        self.registry.flush()
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, f"metrics-{os.getpid()}.json")))
+
+    def test_dead_worker_archived(self):
+        """終了したワーカーのカウンターはアーカイブに合算して残し、ゲージは捨てること"""
+        workers = self.registry.gauge("test_workers", "Workers", ("state",))
+        self.registry.configure(self.tmpdir, flush_interval=0)
+        for pid, delivered in ((999998, 2.0), (999999, 3.0)):
+            snapshot = {
+                "test_requests_total": [[["delivered"], delivered]],
+                "test_latency_seconds": [[["send"], [1, 0, 0], 0.05, 1]],
+                "test_workers": [[["open"], 1.0]],
+            }
+            with open(os.path.join(self.tmpdir, f"metrics-{pid}.json"), 'w') as f:
+                json.dump(snapshot, f)
+            self.registry.mark_process_dead(pid)
+            self.assertFalse(os.path.exists(os.path.join(self.tmpdir, f"metrics-{pid}.json")))
+        # 既に移したワーカーは二重に数えない
+        self.registry.mark_process_dead(999999)
+
+        workers.set(1.0, "closed")
+        text = self.registry.render()
+        self.assertIn('test_requests_total{outcome="delivered"} 5.0', text)
+        self.assertIn('test_latency_seconds_count{stage="send"} 2', text)
+        self.assertIn('test_workers{state="closed"} 1.0', text)
+        self.assertNotIn('test_workers{state="open"}', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
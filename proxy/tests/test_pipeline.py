@@ -0,0 +1,70 @@
+import json
+import unittest
+import sys
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+def make_body(action="work_package_comment:comment", **extra):
+    payload = {
+        "action": action,
+        "activity": {
+            "id": 101,
+            "comment": {"raw": "Test comment"},
+            "_links": {"user": {"href": "/api/v3/users/1"}},
+            "_embedded": {"workPackage": {
+                "id": 7,
+                "subject": "Task",
+                "description": {"raw": "<p>" + "x" * 10000 + "</p>"},
+                "_links": {"project": {"href": "/api/v3/projects/demo", "title": "Demo"}}
+            }}
+        }
+    }
+    payload.update(extra)
+    return json.dumps(payload).encode('utf-8')
+
+
+class TestExtractCommentEvent(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.pipeline import extract_comment_event, parse_comment_event
+        self.extract = extract_comment_event
+        self.parse = parse_comment_event
+
+    def test_same_event_as_decoded_payload(self):
+        """ボディから抽出したイベントがデコード済みペイロードからの抽出結果と一致すること"""
+        body = make_body()
+        event, reason = self.extract(body)
+        self.assertIsNone(reason)
+        self.assertEqual(event, self.parse(json.loads(body))[0])
+        self.assertEqual(event.project_href, "/api/v3/projects/demo")
+        # 必要な項目のみを保持する
+        self.assertFalse(hasattr(event, '__dict__'))
+
+    def test_unsupported_action_not_decoded(self):
+        """対象外のアクションはボディ全体をデコードせずに除外すること"""
+        body = make_body(action="work_package:updated")[:200]  # 途中で切れていてもデコードしない
+        event, reason = self.extract(body)
+        self.assertIsNone(event)
+        self.assertEqual(reason, "unsupported action: work_package:updated")
+
+    def test_action_not_first_key(self):
+        """action が先頭のキーでない場合はデコードして判定すること"""
+        payload = json.loads(make_body())
+        body = json.dumps({"activity": payload["activity"], "action": payload["action"]}).encode('utf-8')
+        event, reason = self.extract(body)
+        self.assertIsNone(reason)
+        self.assertEqual(event.wp_id, 7)
+
+        body = json.dumps({"activity": {}, "action": "work_package:created"}).encode('utf-8')
+        self.assertEqual(self.extract(body), (None, "unsupported action: work_package:created"))
+
+    def test_invalid_body(self):
+        """JSON として不正、またはオブジェクトでないボディは ValueError とすること"""
+        with self.assertRaises(ValueError):
+            self.extract(make_body()[:200])
+        with self.assertRaises(ValueError):
+            self.extract(b'[1, 2]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import sys
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.rate_limit import RateLimiter
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(rate=10, burst=2, channel_rate=1, channel_burst=1, max_wait=1.5, clock=self.clock)
+
+    def test_burst_then_smoothed(self):
+        """バースト分は即時、それ以降は補充間隔に合わせて待ち時間が延びること"""
+        self.assertEqual(self.limiter.reserve("#a"), 0)
+        self.assertEqual(self.limiter.reserve("#b"), 0)
+        self.assertAlmostEqual(self.limiter.reserve("#c"), 0.1)
+        self.assertAlmostEqual(self.limiter.reserve("#d"), 0.2)
+
+    def test_per_channel_bucket(self):
+        """同じチャンネル宛ては channel_rate に制限され、max_wait を超える場合は予約しないこと"""
+        from proxy.core.rate_limit import RateLimitedError
+        self.assertEqual(self.limiter.reserve("#a"), 0)
+        self.assertAlmostEqual(self.limiter.reserve("#a"), 1.0)
+        with self.assertRaises(RateLimitedError) as ctx:
+            self.limiter.reserve("#a")
+        self.assertAlmostEqual(ctx.exception.retry_after, 2.0)
+        # 拒否された呼び出しは枠を消費しない
+        self.clock.now += 2.0
+        self.assertEqual(self.limiter.reserve("#a"), 0)
+
+    def test_pause(self):
+        """送信先から待機を指示された間は全チャンネルの送信を待たせること"""
+        from proxy.core.rate_limit import RateLimitedError
+        self.limiter.pause(1.0)
+        self.assertAlmostEqual(self.limiter.retry_after(), 1.0)
+        self.assertAlmostEqual(self.limiter.reserve("#a"), 1.0)
+        self.limiter.pause(10)
+        with self.assertRaises(RateLimitedError):
+            self.limiter.reserve("#b")
+
+
+class TestRateLimitDelay(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.rate_limit import rate_limit_delay
+        self.rate_limit_delay = rate_limit_delay
+
+    def response(self, status_code, headers=None, text=""):
+        from types import SimpleNamespace
+        return SimpleNamespace(status_code=status_code, headers=headers or {}, text=text)
+
+    def test_detects_rate_limit_responses(self):
+        """429 の Retry-After と Rocket.Chat の too-many-requests (400) を検出すること"""
+        self.assertEqual(self.rate_limit_delay(self.response(429, {"Retry-After": "3"})), 3.0)
+        self.assertEqual(self.rate_limit_delay(self.response(429)), 1.0)
+        text = '{"error": "Error, too many requests. You must wait 7 seconds [error-too-many-requests]"}'
+        self.assertEqual(self.rate_limit_delay(self.response(400, text=text)), 7.0)
+        self.assertIsNone(self.rate_limit_delay(self.response(400, text='{"error": "invalid-channel"}')))
+        self.assertIsNone(self.rate_limit_delay(self.response(200)))
+
+
+if __name__ == '__main__':
+    unittest.main()
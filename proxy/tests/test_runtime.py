@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+
+# Mock dependencies
+sys.modules['requests'] = MagicMock()
+sys.modules['requests.adapters'] = MagicMock()
+sys.modules['urllib3'] = MagicMock()
+sys.modules['urllib3.util'] = MagicMock()
+sys.modules['urllib3.util.retry'] = MagicMock()
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+@patch('proxy.services.runtime.config.DELIVERY_MODE', 'sync')
+@patch('proxy.services.runtime.config.USER_CACHE_WARMUP', False)
+@patch('proxy.services.runtime.config.METRICS_DIR', '')
+@patch('proxy.services.runtime.config.DEAD_LETTER_PATH', '')
+@patch('proxy.services.runtime.config.HEALTH_CHECK_INTERVAL', 0)
+class TestWorkerRuntime(unittest.TestCase):
+    def setUp(self):
+        from proxy.services import runtime
+        self.runtime_module = runtime
+        self.mapper = MagicMock()
+        self.runtime = runtime.WorkerRuntime(self.mapper)
+
+    def test_deferred_start(self):
+        """preload 時はマスターで何も作らず、ワーカーで最初に参照したときに作成すること"""
+        self.assertIsNone(self.runtime.pid)
+        self.mapper.start_auto_reload.assert_not_called()
+
+        rt = self.runtime.current()
+        self.assertIsNotNone(rt.op_service)
+        self.mapper.start_auto_reload.assert_called_once()
+        # 同じプロセスでは作り直さない
+        op_service = rt.op_service
+        self.assertIs(self.runtime.current().op_service, op_service)
+
+    def test_recreated_after_fork(self):
+        """fork (プロセス ID の変化) を検出すると、サービスを作り直しメトリクスを引き継がないこと"""
+        metrics = self.runtime_module.REGISTRY
+        counter = metrics.counter("test_runtime_fork_total", "test")
+        parent = self.runtime.current()
+        pid, op_service, rc_service = parent.pid, parent.op_service, parent.rc_service
+        counter.inc()
+
+        with patch('proxy.services.runtime.os.getpid', return_value=pid + 1):
+            child = self.runtime.current()
+            self.assertEqual(child.pid, pid + 1)
+
+        self.assertIsNot(child.op_service, op_service)
+        self.assertIsNot(child.rc_service, rc_service)
+        self.assertEqual(counter.samples(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,5 @@
+import threading
+import time
 import unittest
 from unittest.mock import patch, MagicMock
 import sys
@@ -36,6 +38,129 @@ class TestOpenProjectService(unittest.TestCase):
         result = self.service.get_user_name("/api/v3/users/1")
         self.assertEqual(result, "OpenProject")
 
+    @patch('proxy.services.openproject.config.OP_API_KEY', 'test_key')
+    def test_get_user_name_negative_cache(self):
+        """取得失敗 (404) は短時間キャッシュされ、再問い合わせしないこと"""
+        mock_response = MagicMock()
+        mock_response.status_code = 404
+        with patch.object(self.service.session, 'get', return_value=mock_response) as mock_get:
+            self.assertEqual(self.service.get_user_name("/api/v3/users/999"), "OpenProject")
+            self.assertEqual(self.service.get_user_name("/api/v3/users/999"), "OpenProject")
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('proxy.services.openproject.config.OP_API_KEY', 'test_key')
+    def test_get_user_name_circuit_open(self):
+        """遮断中は API を呼ばずに既定名を返し、回復後の取得を妨げないこと"""
+        for _ in range(self.service.breaker.minimum_calls):
+            self.service.breaker.record(False)
+        self.assertEqual(self.service.breaker.state, "open")
+        with patch.object(self.service.session, 'get') as mock_get:
+            self.assertEqual(self.service.get_user_name("/api/v3/users/5"), "OpenProject")
+        mock_get.assert_not_called()
+        # 既定名はキャッシュされない
+        self.assertEqual(self.service.user_cache.lookup("/api/v3/users/5"), (False, None))
+
+    @patch('proxy.services.openproject.config.OP_API_KEY', 'test_key')
+    def test_warm_user_cache_pages(self):
+        """ユーザー一覧をページ単位で取得してキャッシュを埋めること"""
+        def page(elements):
+            response = MagicMock()
+            response.status_code = 200
+            response.json.return_value = {
+                "total": 3,
+                "_embedded": {"elements": [
+                    {"name": name, "_links": {"self": {"href": f"/api/v3/users/{uid}"}}}
+                    for uid, name in elements
+                ]}
+            }
+            return response
+
+        responses = [page([(1, "User A"), (2, "User B")]), page([(3, "User C")])]
+        with patch.object(self.service.session, 'get', side_effect=responses) as mock_get:
+            loaded = self.service.warm_user_cache(page_size=2, timeout=10)
+
+        self.assertEqual(loaded, 3)
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(mock_get.call_args[1]['params'], {'offset': 2, 'pageSize': 2})
+        self.assertEqual(self.service.get_user_name("/api/v3/users/3"), "User C")
+
+
+@patch('proxy.services.openproject.config.OP_API_KEY', 'test_key')
+@patch('proxy.services.openproject.config.MENTION_RESOLVE_RULE', 'login')
+class TestMentionResolution(unittest.TestCase):
+    def setUp(self):
+        from proxy.services.openproject import OpenProjectService
+        self.OpenProjectService = OpenProjectService
+        self.service = OpenProjectService()
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def fake_get(self, url, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        response = MagicMock()
+        user_id = url.rsplit('/', 1)[1]
+        response.status_code = 200 if user_id != "404" else 404
+        response.json.return_value = {"name": f"User {user_id}", "login": f"user{user_id}"}
+        return response
+
+    def test_get_user_names_in_parallel(self):
+        """投稿者とメンション先を並行して問い合わせ、結果をキャッシュすること"""
+        with patch.object(self.service.session, 'get', side_effect=self.fake_get) as mock_get:
+            author, names = self.service.get_user_names("/api/v3/users/1", ["7", "8", "404"])
+            self.assertEqual(author, "User 1")
+            self.assertEqual(names, {"7": "user7", "8": "user8"})
+            self.assertEqual(self.peak, 4)
+
+            # 2 回目はキャッシュから返る (解決できなかった ID も再問い合わせしない)
+            self.assertEqual(self.service.get_user_names("/api/v3/users/1", ["7", "404"]), ("User 1", {"7": "user7"}))
+            # メンション先として取得した表示名は投稿者名のキャッシュにも入る
+            self.assertEqual(self.service.get_user_name("/api/v3/users/8"), "User 8")
+        self.assertEqual(mock_get.call_count, 4)
+
+    def test_get_user_names_circuit_open(self):
+        """遮断中はメンション先を問い合わせないこと"""
+        for _ in range(self.service.breaker.minimum_calls):
+            self.service.breaker.record(False)
+        with patch.object(self.service.session, 'get') as mock_get:
+            self.assertEqual(self.service.get_user_names("/api/v3/users/1", ["7"]), ("OpenProject", {}))
+        mock_get.assert_not_called()
+
+    def test_half_open_rejection_is_not_cached(self):
+        """半開状態で試行枠が無く問い合わせなかった場合は、取得失敗としてキャッシュしないこと"""
+        from proxy.core.circuit_breaker import CircuitBreaker
+        clock = MagicMock(return_value=1000.0)
+        shared_cache = MagicMock()
+        shared_cache.get.return_value = (False, None)
+        breaker = CircuitBreaker("openproject", minimum_calls=1, open_seconds=10, clock=clock)
+        self.service = self.OpenProjectService(shared_cache=shared_cache, breaker=breaker)
+        breaker.record(False)
+        clock.return_value += 10
+        self.assertTrue(breaker.allow())  # 他のリクエストの試行が枠を使用中
+
+        # available() の確認後に試行枠が埋まった場合と同じ状況
+        with patch.object(breaker, 'available', return_value=True), \
+                patch.object(self.service.session, 'get', side_effect=self.fake_get) as mock_get:
+            self.assertEqual(self.service.get_user_names("/api/v3/users/1", ["2", "3"]), ("OpenProject", {}))
+        mock_get.assert_not_called()
+        for user_id in ("2", "3"):
+            self.assertEqual(self.service.mention_cache.lookup(user_id), (False, None))
+        self.assertEqual(self.service.user_cache.lookup("/api/v3/users/1"), (False, None))
+        shared_cache.set.assert_not_called()
+
+        # 回復後は問い合わせて解決する
+        breaker.record(True)
+        with patch.object(self.service.session, 'get', side_effect=self.fake_get):
+            self.assertEqual(
+                self.service.get_user_names("/api/v3/users/1", ["2", "3"]),
+                ("User 1", {"2": "user2", "3": "user3"})
+            )
+
 
 class TestRocketChatService(unittest.TestCase):
     def setUp(self):
@@ -49,17 +174,34 @@ class TestRocketChatService(unittest.TestCase):
         self.assertFalse(success)
         self.assertEqual(message, "Server misconfiguration")
 
-    @patch('proxy.services.rocketchat.requests.post')
     @patch('proxy.services.rocketchat.config.RC_WEBHOOK_URL', 'http://rc/webhook')
-    def test_send_message_success(self, mock_post):
+    def test_send_message_success(self):
         """正常にメッセージ送信"""
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_post.return_value = mock_response
 
-        success, channel = self.service.send_message("#test", "message")
+        with patch.object(self.service.transport, 'post', return_value=mock_response) as mock_post:
+            success, channel = self.service.send_message("#test", "message")
+
         self.assertTrue(success)
         self.assertEqual(channel, "#test")
+        # 共有トランスポート経由で送信されていること
+        mock_post.assert_called_once()
+        self.assertEqual(mock_post.call_args[0][0], 'http://rc/webhook')
+
+    @patch('proxy.services.rocketchat.config.RC_WEBHOOK_URL', 'http://rc/webhook')
+    def test_send_message_circuit_open(self):
+        """遮断中はタイムアウトを待たずに送信を打ち切ること"""
+        from proxy.services.rocketchat import CIRCUIT_OPEN_RESULT
+        for _ in range(self.service.breaker.minimum_calls):
+            self.service.breaker.record(False)
+
+        with patch.object(self.service.transport, 'post') as mock_post:
+            success, message = self.service.send_message("#test", "message")
+
+        self.assertFalse(success)
+        self.assertEqual(message, CIRCUIT_OPEN_RESULT)
+        mock_post.assert_not_called()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+import sys
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+
+def make_event(**kwargs):
+    from proxy.core.pipeline import CommentEvent
+    fields = dict(
+        wp_id=1234, wp_subject="ログイン画面の改修", comment="raw",
+        project_title="デモプロジェクト", project_href="/api/v3/projects/demo/"
+    )
+    fields.update(kwargs)
+    return CommentEvent(**fields)
+
+
+class TestMessageTemplate(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.templates import TemplateError, compile_template, load_templates
+        self.TemplateError = TemplateError
+        self.compile_template = compile_template
+        self.load_templates = load_templates
+
+    def test_default_layout(self):
+        """既定のテンプレートは従来と同じメッセージを組み立てること"""
+        from proxy import config
+        template = self.compile_template(config.MESSAGE_TEMPLATE, "http://op.example/")
+        self.assertEqual(
+            template.render(make_event(), "コメント"),
+            "### [ログイン画面の改修] (#1234)\n🔗 [OpenProjectで表示](http://op.example/projects/demo/work_packages/1234)\n\nコメント"
+        )
+        # プロジェクトのリンクが無い場合は単純な URL にする
+        self.assertIn("(http://op.example/work_packages/1234)", template.render(make_event(project_href=None), ""))
+
+    def test_custom_fields(self):
+        """フィールドの埋め込みと波括弧のエスケープ、\\n の改行への変換"""
+        template = self.compile_template("{{{project}}} {author}: {subject}\\n{comment}", "http://op")
+        self.assertEqual(template.render(make_event(), "本文", "Tanaka Taro"), "{デモプロジェクト} Tanaka Taro: ログイン画面の改修\n本文")
+        # 引用符やバックスラッシュを含む固定文字列もそのまま出力する
+        template = self.compile_template('"{subject}" \'\\ {wp_id}\'', "http://op")
+        self.assertEqual(template.render(make_event(), ""), '"ログイン画面の改修" \'\\ 1234\'')
+
+    def test_invalid_template(self):
+        """未知のフィールドや属性参照、書式指定は解析時にエラーとすること"""
+        for source in ("{unknown}", "{event.__class__}", "{subject:>10}", "{comment!r}", "{subject"):
+            with self.subTest(source=source):
+                with self.assertRaises(self.TemplateError):
+                    self.compile_template(source, "http://op")
+
+    def test_select_by_project_then_channel(self):
+        """プロジェクト、チャンネル、既定の順にテンプレートを選ぶこと"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'templates.csv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('target,template\nデモプロジェクト,P {wp_id}\n#infra-log,C {wp_id}\n')
+            templates = self.load_templates(path, "D {wp_id}", "http://op")
+
+        event = make_event()
+        self.assertEqual(templates.select("デモプロジェクト", "#infra-log").render(event, ""), "P 1234")
+        self.assertEqual(templates.select("other", "#infra-log").render(event, ""), "C 1234")
+        self.assertEqual(templates.select(None, "#general").render(event, ""), "D 1234")
+
+
+if __name__ == '__main__':
+    unittest.main()
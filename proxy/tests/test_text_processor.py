@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import MagicMock
+import re
+import sys
+
+sys.path.insert(0, '/home/ibuki/workspace/chatbot')
+
+# 旧実装の正規表現 (出力が一致することの確認用)
+LEGACY_PATTERN = r'<mention\s+[^>]*data-text="@([^"]+)"[^>]*>.*?</mention>(?:&nbsp;|\u00a0)?'
+
+
+class TestConvertMentions(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.text_processor import convert_mentions
+        self.convert_mentions = convert_mentions
+        self.mapper = MagicMock()
+        users_map = {'OpenProject Admin': 'admin.rc', 'Tanaka Taro': 'tanaka.rc'}
+        self.mapper.get_rc_user.side_effect = users_map.get
+
+    def legacy(self, text):
+        def replace(match):
+            rc_user = self.mapper.get_rc_user(match.group(1))
+            return f"@{rc_user}" if rc_user else f"@{match.group(1)}"
+        return re.sub(LEGACY_PATTERN, replace, text)
+
+    def test_mapped_user(self):
+        """マッピングのあるユーザーは Rocket.Chat のユーザー名に変換されること"""
+        text = '<mention class="mention" data-id="4" data-type="user" data-text="@OpenProject Admin">@OpenProject Admin</mention>&nbsp;\n\nメンション付きコメント'
+        self.assertEqual(self.convert_mentions(text, self.mapper), "@admin.rc\n\nメンション付きコメント")
+
+    def test_unmapped_user(self):
+        """マッピングの無いユーザーは表示名のまま残ること"""
+        text = '<mention class="mention" data-id="5" data-type="user" data-text="@Unknown User">@Unknown User</mention> Hello'
+        self.assertEqual(self.convert_mentions(text, self.mapper), "@Unknown User Hello")
+
+    def test_unclosed_tag_is_left_as_is(self):
+        """閉じタグの無いメンションは変換しないこと"""
+        text = '<mention data-text="@Tanaka Taro">@Tanaka Taro\n</mention>'
+        self.assertEqual(self.convert_mentions(text, self.mapper), text)
+
+    def test_matches_legacy_regex(self):
+        """様々な入力で旧実装の正規表現と同じ結果になること"""
+        samples = [
+            '',
+            'no mentions here',
+            '<mention data-text="@Tanaka Taro">x</mention>\u00a0<mention  data-text="@A">y</mention>',
+            '<mention data-text="@A" data-text="@Tanaka Taro">x</mention>',
+            '<mention data-text="@A>B">x</mention>',
+            '<mention data-text="@">x</mention><mention data-text="@B">y</mention>',
+            '<mention <mention data-text="@A">x</mention>',
+            '<mentiondata-text="@A">x</mention>',
+            '<mention data-text="@A">x\n</mention><mention data-text="@B">y</mention>&nbsp;z',
+        ]
+        for text in samples:
+            with self.subTest(text=text):
+                self.assertEqual(self.convert_mentions(text, self.mapper), self.legacy(text))
+
+
+class TestMentionResolution(unittest.TestCase):
+    def setUp(self):
+        from proxy.core.text_processor import convert_mentions, rc_username, unmapped_mention_ids
+        self.convert_mentions = convert_mentions
+        self.rc_username = rc_username
+        self.unmapped_mention_ids = unmapped_mention_ids
+        self.mapper = MagicMock()
+        self.mapper.get_rc_user.side_effect = {'Tanaka Taro': 'tanaka.rc'}.get
+        self.text = (
+            '<mention data-id="7" data-type="user" data-text="@Suzuki Jiro">@Suzuki Jiro</mention> '
+            '<mention data-id="3" data-type="user" data-text="@Tanaka Taro">@Tanaka Taro</mention> '
+            '<mention data-id="9" data-type="group" data-text="@Dev Team">@Dev Team</mention> '
+            '<mention data-id="7" data-type="user" data-text="@Suzuki Jiro">@Suzuki Jiro</mention> '
+            '<mention data-id="../8" data-text="@Sato">@Sato</mention> '
+            '<mention data-id="8" data-text="@Sato Hanako">@Sato Hanako</mention>'
+        )
+
+    def test_unmapped_mention_ids(self):
+        """users.csv に無いユーザーの ID だけを重複なく返し、グループや不正な ID は含めないこと"""
+        self.assertEqual(self.unmapped_mention_ids(self.text, self.mapper, 20), ["7", "8"])
+        self.assertEqual(self.unmapped_mention_ids(self.text, self.mapper, 1), ["7"])
+        self.assertEqual(self.unmapped_mention_ids("no mentions", self.mapper, 20), [])
+
+    def test_convert_with_resolved_names(self):
+        """users.csv に無いユーザーは解決済みの名前を使い、csv のマッピングを優先すること"""
+        result = self.convert_mentions(self.text, self.mapper, {"7": "suzuki", "3": "other", "9": "team"})
+        self.assertEqual(result, "@suzuki @tanaka.rc @Dev Team @suzuki @Sato @Sato Hanako")
+
+    def test_rc_username_rules(self):
+        """ログイン名またはメールアドレスのローカル部から Rocket.Chat のユーザー名を決めること"""
+        user = {"login": "jsuzuki", "email": "jiro.suzuki@example.com"}
+        self.assertEqual(self.rc_username(user, "login"), "jsuzuki")
+        self.assertEqual(self.rc_username(user, "email"), "jiro.suzuki")
+        # 管理者以外の API キーでは email が返らない
+        self.assertIsNone(self.rc_username({"login": "jsuzuki"}, "email"))
+
+
+if __name__ == '__main__':
+    unittest.main()